@@ -0,0 +1,209 @@
+"""
+Approximate nearest-neighbour search over embeddings (IVF-flat).
+
+Vectors are partitioned into `n_lists` inverted lists around k-means centroids.
+A query is compared with the centroids first and then only with the vectors in
+the `nprobe` closest lists, so the cost per query is roughly
+`n_lists + nprobe * N / n_lists` dot products instead of `N`.
+
+Tuning knobs:
+    n_lists   number of partitions (default ~ sqrt(N)); more lists = faster, lower recall
+    nprobe    lists scanned per query; higher = better recall, slower
+    min_train_size  below this many vectors the index is a single exact list
+"""
+import os
+
+import numpy as np
+
+
+def _normalise(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def kmeans(vectors, n_clusters, n_iter=20, seed=0):
+    """Spherical k-means on L2-normalised vectors. Returns (n_clusters, dim) centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        new_centroids = np.zeros_like(centroids)
+        np.add.at(new_centroids, assignment, vectors)
+        counts = np.bincount(assignment, minlength=n_clusters)
+
+        # Re-seed empty clusters with random points so every list stays usable
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            new_centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+
+        new_centroids = _normalise(new_centroids)
+        if np.allclose(new_centroids, centroids, atol=1e-5):
+            centroids = new_centroids
+            break
+        centroids = new_centroids
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    IVF-flat index with incremental inserts, updates and deletes by chunk id.
+    Scores are cosine similarities (vectors are normalised on insert).
+    """
+
+    def __init__(self, dim, n_lists=None, nprobe=8, min_train_size=1024, seed=0):
+        self.dim = dim
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.seed = seed
+        # embeddings_version of the table this index reflects (set by StorageHandler)
+        self.version = None
+        self.trained_size = 0
+        self._reset_lists(np.empty((0, dim), dtype=np.float32))
+
+    def _reset_lists(self, centroids):
+        self.centroids = centroids
+        n = max(1, len(centroids))
+        self.list_ids = [[] for _ in range(n)]
+        self.list_vectors = [np.empty((0, self.dim), dtype=np.float32) for _ in range(n)]
+        self.location = {}
+
+    def __len__(self):
+        return len(self.location)
+
+    @property
+    def is_trained(self):
+        return len(self.centroids) > 0
+
+    def _assign(self, vectors):
+        if not self.is_trained:
+            return np.zeros(len(vectors), dtype=np.int64)
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def train(self, chunk_ids, vectors):
+        """(Re)build the index from scratch around new k-means centroids."""
+        vectors = _normalise(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        n = len(vectors)
+        if n >= self.min_train_size:
+            n_lists = self.n_lists or max(1, int(np.sqrt(n)))
+            centroids = kmeans(vectors, min(n_lists, n), seed=self.seed)
+        else:
+            centroids = np.empty((0, self.dim), dtype=np.float32)
+
+        self._reset_lists(centroids)
+        self.trained_size = n
+        self.add(chunk_ids, vectors)
+
+    @property
+    def needs_retrain(self):
+        """True once the corpus has outgrown the current partitioning."""
+        if not self.is_trained:
+            return len(self) >= self.min_train_size
+        return len(self) > 4 * self.trained_size
+
+    def add(self, chunk_ids, vectors):
+        """Insert or replace vectors. Existing chunk ids are moved to their new list."""
+        vectors = _normalise(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        self.remove(chunk_ids)
+
+        assignment = self._assign(vectors)
+        for list_no in np.unique(assignment):
+            rows = np.flatnonzero(assignment == list_no)
+            ids = self.list_ids[list_no]
+            for row in rows:
+                self.location[chunk_ids[row]] = list_no
+                ids.append(chunk_ids[row])
+            self.list_vectors[list_no] = np.vstack([self.list_vectors[list_no], vectors[rows]])
+
+    def remove(self, chunk_ids):
+        """Delete vectors by chunk id; unknown ids are ignored."""
+        by_list = {}
+        for chunk_id in chunk_ids:
+            list_no = self.location.pop(chunk_id, None)
+            if list_no is not None:
+                by_list.setdefault(list_no, set()).add(chunk_id)
+
+        for list_no, doomed in by_list.items():
+            ids = self.list_ids[list_no]
+            keep = [i for i, chunk_id in enumerate(ids) if chunk_id not in doomed]
+            self.list_ids[list_no] = [ids[i] for i in keep]
+            self.list_vectors[list_no] = self.list_vectors[list_no][keep]
+
+    def search(self, query_vector, k=5, nprobe=None):
+        """Return up to `k` (chunk_id, cosine score) pairs, best first."""
+        if not self.location or k <= 0:
+            return []
+
+        query = _normalise(np.asarray(query_vector, dtype=np.float32).ravel())
+        if self.is_trained:
+            nprobe = min(nprobe or self.nprobe, len(self.centroids))
+            probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        else:
+            probe = [0]
+
+        ids = []
+        blocks = []
+        for list_no in probe:
+            if self.list_ids[list_no]:
+                ids.extend(self.list_ids[list_no])
+                blocks.append(self.list_vectors[list_no])
+        if not ids:
+            return []
+
+        scores = np.vstack(blocks) @ query
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[i], float(scores[i])) for i in top]
+
+    def save(self, path):
+        """Persist the index as a single .npz file (written atomically)."""
+        sizes = np.array([len(ids) for ids in self.list_ids], dtype=np.int64)
+        all_ids = [chunk_id for ids in self.list_ids for chunk_id in ids]
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            dim=self.dim,
+            n_lists=self.n_lists or 0,
+            nprobe=self.nprobe,
+            min_train_size=self.min_train_size,
+            seed=self.seed,
+            version=-1 if self.version is None else self.version,
+            trained_size=self.trained_size,
+            centroids=self.centroids,
+            sizes=sizes,
+            ids=np.array(all_ids, dtype=np.str_),
+            vectors=np.vstack(self.list_vectors) if all_ids else np.empty((0, self.dim), dtype=np.float32),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load an index written by save()."""
+        data = np.load(path)
+        index = cls(
+            int(data["dim"]),
+            n_lists=int(data["n_lists"]) or None,
+            nprobe=int(data["nprobe"]),
+            min_train_size=int(data["min_train_size"]),
+            seed=int(data["seed"]),
+        )
+        version = int(data["version"])
+        index.version = None if version < 0 else version
+        index.trained_size = int(data["trained_size"])
+        index._reset_lists(data["centroids"].astype(np.float32))
+
+        ids = data["ids"].tolist()
+        vectors = data["vectors"].astype(np.float32)
+        start = 0
+        for list_no, size in enumerate(data["sizes"]):
+            end = start + int(size)
+            index.list_ids[list_no] = ids[start:end]
+            index.list_vectors[list_no] = vectors[start:end]
+            for chunk_id in index.list_ids[list_no]:
+                index.location[chunk_id] = list_no
+            start = end
+        return index
@@ -0,0 +1,73 @@
+"""
+Client for the HTTP API in server.py.
+
+EngineClient has the same stream_answer()/stats() interface as
+engine.QueryEngine, so the Streamlit app can run the pipeline in-process or
+against a pool of API workers (set VADILAL_API_URL).
+"""
+import json
+
+import requests
+
+from http_client import get_session
+from llm_providers import iter_sse, describe_http_error
+from engine import RETRIEVAL_TOKEN_BUDGET
+from history import history_budget
+
+
+class EngineClient:
+    """
+    Remote QueryEngine. The server keeps no session state: with a
+    HistoryWindow the history is folded here and only its summary and the
+    recent turns are sent, otherwise the full history is sent each time.
+    """
+
+    def __init__(self, base_url, timeout=(5, 120)):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def stream_answer(self, question, provider, api_key, model, history=(), history_window=None,
+                      enable_web_search=False, serp_api_key=None, token_budget=RETRIEVAL_TOKEN_BUDGET,
+                      fallbacks=()):
+        """Yield the server's engine events; transport failures become an error event."""
+        summary = ""
+        history = list(history)
+        if history_window is not None:
+            # Folded here, so the session can drop folded messages and they are not resent
+            summary, history = history_window.window(history, history_budget(model))
+        payload = {
+            "question": question,
+            "provider": provider,
+            "api_key": api_key,
+            "model": model,
+            "history": history,
+            "history_summary": summary,
+            "web_search": enable_web_search,
+            "serp_api_key": serp_api_key,
+            "token_budget": token_budget,
+            "fallbacks": list(fallbacks),
+        }
+        try:
+            response = get_session().post(f"{self.base_url}/v1/answer/stream", json=payload,
+                                          stream=True, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            yield {"type": "error", "message": describe_http_error(e)}
+            yield {"type": "done", "answer": ""}
+            return
+
+        with response:
+            try:
+                for _, data in iter_sse(response):
+                    yield json.loads(data)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                yield {"type": "error", "message": f"Connection to the assistant API lost: {e}"}
+                yield {"type": "done", "answer": ""}
+
+    def stats(self):
+        try:
+            response = get_session().get(f"{self.base_url}/stats", timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.RequestException, ValueError):
+            return {}
@@ -1,12 +1,15 @@
 import streamlit as st
-import requests
-import json
 import os
-from datetime import datetime
+import time
 
-import requests
-from bs4 import BeautifulSoup
-import re
+from engine import QueryEngine, DB_PATH, MODEL_OPTIONS, RETRIEVAL_TOKEN_BUDGET, equivalent_model
+from api_client import EngineClient
+from chat_store import ChatSession, CHAT_RETENTION
+from storage_handler import StorageHandler
+from llm_providers import empty_usage
+
+# Start of this script run; the render time is reported to the tracer at the end
+render_started = time.perf_counter()
 
 # Page configuration
 st.set_page_config(
@@ -56,435 +59,116 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-def search_web(query, num_results=5):
-    """Enhanced web search function using DuckDuckGo"""
-    try:
-        # Make search more specific to Vadilal
-        search_query = f"Vadilal Industries {query} latest information"
-        search_query = search_query.replace(' ', '+')
-        url = f"https://html.duckduckgo.com/html/?q={search_query}"
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        response = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        results = soup.find_all('div', class_='result__body')
-        
-        if not results:
-            return "No search results found."
-            
-        formatted_results = "Here are the latest search results about Vadilal:\n\n"
-        for i, result in enumerate(results[:num_results]):
-            title_elem = result.find('a', class_='result__a')
-            snippet_elem = result.find('a', class_='result__snippet')
-            
-            title = title_elem.text.strip() if title_elem else "No title found"
-            snippet = snippet_elem.text.strip() if snippet_elem else "No snippet found"
-            
-            formatted_results += f"RESULT {i+1}:\nTitle: {title}\nInfo: {snippet}\n\n"
-        
-        return formatted_results
-    except Exception as e:
-        return f"Error searching the web: {str(e)}"
+# Run the pipeline against a remote API (server.py) instead of in-process when set
+API_URL = os.getenv("VADILAL_API_URL")
 
+PROVIDER_LABELS = {"openrouter": "OpenRouter", "anthropic": "Anthropic"}
 
-# Vadilal company data (publicly available)
-VADILAL_DATA = """
-Vadilal Group: A Comprehensive Overview of Operations and Market Position
-1. COMPANY OVERVIEW
-Vadilal Industries traces its origins back to 1907 when Vadilal Gandhi established the business in Ahmedabad.1 Initially, the company's foray into the ice cream sector involved traditional methods, utilizing a hand-cranked machine to produce its first offerings.1 This humble beginning marked the foundation for a company that would eventually become a significant player in the Indian ice cream market.
-Over the subsequent decades, Vadilal demonstrated a commitment to growth and innovation. In 1926, the company took a significant step by introducing its first dedicated ice cream parlors and initiating a home delivery service, a move that proved popular among consumers.1 This early focus on direct customer engagement and convenience laid the groundwork for a customer-centric approach. The year 1950 saw the introduction of the cassata to the Indian market by Vadilal.1 This multi-layered, multi-flavored ice cream was a novel product for its time, showcasing the company's inclination towards product diversification and understanding local preferences.
-The mid-1980s marked a period of significant expansion for Vadilal. In 1985, the company broadened its operational scope and subsequently introduced India's first automated ice cream candy line machinery.1 This adoption of advanced technology underscored a strategic move towards enhancing production efficiency and meeting the increasing demand for their products. By 1989, Vadilal achieved another major milestone by going public and launching its Initial Public Offering (IPO).1 This transition to a publicly traded company provided access to capital markets, fueling further growth and expansion initiatives.
-The company continued its geographical expansion in 1993 with the opening of its first ice cream plant in Bareilly, Uttar Pradesh.1 Establishing a manufacturing presence in this region, known for its reliable cold chain, was a strategic decision to cater to the northern Indian market and ensure product quality through an efficient supply network.2 In 1995, Vadilal ventured into international markets, commencing the export of its sub-brands to over 26 countries.1 This step demonstrated the company's ambition to extend its reach beyond India and establish a global footprint.
-The early 2010s saw further technological advancements at Vadilal. In 2012, the company invested in new machinery, including an extrusion machine and what was then India's fastest cone-making machine.1 These investments enhanced their production capabilities, allowing for greater product variety and increased output. In 2013, Vadilal received a significant certification, meeting global food safety standards as recognized by Bureau Veritas.1 This achievement underscored the company's commitment to maintaining high quality standards, particularly important for its growing international presence.
-Vadilal refreshed its brand identity in 2017 with the unveiling of a new logo and the adoption of the tagline, "Dil Bole Waah Waah Waah".1 This rebranding effort aimed to modernize the company's image and resonate with contemporary consumer sentiments.2 The year 2021 marked further product innovation with the release of new ice cream ranges, including Flingo cones and Badabite bars, as well as a premium line of ice cream tubs under the Gourmet Premium Ice Creams banner.1 Additionally, they introduced the Gourmet Natural Tub line, which focused on traditional Indian dessert flavors, catering to a specific segment of the market.1 In the same year, Vadilal also entered the cafe business with the launch of the Vadilal Now For Ever cafe in Ahmedabad, Gujarat.1 This diversification into a new format of customer engagement indicated a broader strategy to enhance brand experience. By 2023, Vadilal had established a substantial distribution network comprising over 125,000 dealers across India, highlighting its extensive market reach.1 Furthermore, industry reports indicate that Vadilal holds the position of the third-largest ice cream manufacturer in India.5
-Corporate Structure (Parent Company, Subsidiaries)
-Vadilal Industries operates as part of the larger Vadilal Group.1 As a public company, Vadilal Industries Limited is listed and traded on both the Bombay Stock Exchange (BSE) under the symbol 519156 and the National Stock Exchange of India (NSE) with the symbol VADILALIND.1 The leadership of the company includes key individuals such as Ramchandrabhai Gandhi, who serves as chairman emeritus, Virendra R Gandhi, the chairman and managing director, and Rajesh Gandhi and Devanshu Gandhi, both holding the position of managing director.1 Vadilal Industries Limited functions as the parent organization overseeing a diverse set of subsidiaries.6
-The company's subsidiary network includes Vadilal Industries (USA) Inc., which expanded its operations in June 2022 through the acquisition of 100% stake in Krishna Krupa Corporation, USA (KKC). KKC operates an ice cream parlor in Illinois, USA, providing Vadilal USA with valuable insights into the US parlor business model.7 Other subsidiaries contributing to the Vadilal Group's operations include Vadilal Cold Storage, Vadilal Delights Limited, and Varood Industries.7 Vadilal Dairy International Ltd. is also a part of the group.10 Furthermore, Vadilal Chemicals Ltd. represents a significant diversification for the group, engaging in the supply of various industrial gases and chemicals since 1970. This subsidiary operates through 12 depots across India, catering to a wide range of clients.14 Vadilal Enterprises Ltd. serves as the marketing and distribution arm for the group, responsible for selling and distributing ice cream, dairy products, frozen desserts, and processed food products manufactured by Vadilal Industries within India. This subsidiary owns a fleet of deep freezers and freezer-equipped vehicles to support its distribution activities.17
-Manufacturing Facilities (Locations, Capacities)
-Vadilal Group operates three primary manufacturing plants located strategically across India.23 These include the Bareilly Plant in Uttar Pradesh, the Dharampur Plant in Gujarat, and the Pundhra Plant, also situated in Gujarat, in the Gandhinagar district.23
-The Bareilly Plant focuses on ice cream production and has undergone capacity enhancements over the years. As of March 2012, its ice cream production capacity was reported to be 1.75 lakh liters per day.24 Currently, the plant has a production capacity of 100 metric tons per day and can manufacture 300,000 ice cream cones daily. Additionally, its candy manufacturing capacity is approximately 800,000 units per day. On average, the Bareilly plant utilizes around 450 kilograms of dry fruits daily in its production processes.23 Demonstrating environmental consciousness, the facility also houses a 300,000-liter effluent treatment plant.23 The plant provides employment to approximately 770 workers, primarily from nearby villages, and has established a milk procurement network similar to the Amul model, offering benefits like farmer and cattle insurance along with technical assistance to local milk farmers.23
-The Dharampur Plant operates as Vadilal's Quick Treat facility, specializing in frozen foods. This plant has a production capacity of 110 metric tons per day for frozen products and an equal capacity for canning. Its ready-to-eat product line has a capacity of about 10 metric tons per day. The Dharampur facility processes over 300 metric tons of fruits and vegetables daily and includes a significant area of 50,000 square feet dedicated to tree plantation and a green belt.23 The plant also implements a rigorous quality control process with six stages of checks before products are deemed ready for consumption.23 For its processed foods division, the Dharampur plant has an installed capacity of 5400 tons per annum and is equipped to process two tons of material per hour for freezing.25
-The Pundhra Plant is a fully automated ice cream mix production facility, recognized as one of the most advanced in India.23 This plant emphasizes sustainability by recycling water, utilizing cold storage defrost water in its cooling tower system. It also features a modern Effluent Treatment Plant (ETP) with a capacity of 500,000 liters per day. The Pundhra plant maintains stringent quality standards, conducting fifteen quality checks on its products before they are released for consumption.23
-Historically, the combined processing capacity of Vadilal's three plants, including the Dudheshwar plant in Ahmedabad, was reported as 20,046 kiloliters per annum as of the fiscal year 2000-01.26 The total ice cream production capacity across Vadilal's facilities has increased from 225,000 liters per day to 325,000 liters per day, reflecting the company's growth in the ice cream market.5 Vadilal's ice cream division comprises three plants in total, with two located in Gujarat (Pundhra and Dudheshwar) and one in Uttar Pradesh (Bareilly).26
-Distribution Network
-Vadilal has established a robust and extensive distribution network across India to ensure its products reach a wide consumer base. This network includes a strong presence in the retail sector with 60,000 retailers, supported by 750 distributors and a fleet of 300 distribution vehicles.27 The company's marketing efforts extend across 28 states in India, facilitated by 70 carrying and forwarding (C&F) agents and over 1,500 distributors, along with the same fleet of 300 distribution vehicles.28 Overall, Vadilal's network encompasses more than 125,000 dealers throughout the country.1 Additionally, the company has tie-ups with over 70 C&F agencies, 1,500 distributors, and approximately 70,000 retail points for its regular sales operations.29
-Vadilal Enterprises Ltd. plays a crucial role in the group's distribution strategy, handling the marketing and distribution of ice cream, dairy products, frozen desserts, and processed food products manufactured by Vadilal Industries within India.17 To support these activities, Vadilal Enterprises owns a significant number of deep freezers and freezer-equipped vehicles, ensuring the cold chain is maintained effectively.17 In recent years, Vadilal has also seen substantial growth in its online distribution channels, experiencing a remarkable 125% growth in 2023, indicating a successful adaptation to the increasing trend of online shopping.30 The company also employs a franchise model as a strategy to further expand its distribution network and enhance its brand presence by partnering with local entrepreneurs across India.4
-International Presence and Export Markets
-Vadilal has established a significant international presence, exporting its products to over 20 countries, including key markets such as the USA, Canada, and Australia.31 The company's products reach a total of 45 countries across four continents, with a strong focus on markets like the US, Canada, UK, Middle East, Australia, and New Zealand.32 Vadilal began its export operations in 1995, initially reaching over 26 countries with its sub-brands.1 The company exports a diverse range of products, including processed food items, ice creams, and frozen desserts.32 To support its international market penetration, Vadilal has engaged in brand franchise and supermarket promotions in several key regions, including the USA, Canada, UK, Australia, New Zealand, Japan, and the Gulf Countries.34
-The United States represents a substantial portion of Vadilal's export revenue.29 Overall, exports contribute significantly to the company's financial performance, accounting for approximately 18-19% of its total revenue.36 The international business segment has shown strong growth, now contributing over 25% of Vadilal's total revenues, driven by robust demand for its high-quality ice creams and other products, particularly within the sizeable Indian diaspora communities in the U.S. and other regions.32 The company's export business enjoys healthy EBITDA margins exceeding 30%.36 Projections indicate a continued focus on international expansion, with export revenue for FY25 expected to grow by around 27%.36 Vadilal USA operates as a subsidiary to manage the company's interests in the American market.37 The company exports a wide array of products, numbering around 175, including canned and frozen vegetables, ready-to-eat curried vegetables, ready-to-cook frozen items like parathas and samosas, as well as mango and other tropical fruit pulps, slices, and dices. These products are marketed under the 'Vadilal Quick Treat' brand across nearly 45 countries, highlighting their global acceptance.34
-2. FINANCIAL PERFORMANCE (Last 3 Years: FY 2021-22, 2022-23, 2023-24)
-Annual Revenue Figures in INR Crores
-Vadilal Industries has demonstrated consistent growth in its annual revenue over the past three fiscal years. In FY 2021-22, the company's consolidated annual revenue stood at ₹ 698 crore.38 This represents a significant increase compared to the previous year, indicating a strong market recovery and sales performance. The standalone revenue for the same period was reported as ₹ 544.12 crore.39
-The growth trend continued into FY 2022-23, with the consolidated annual revenue reaching ₹ 1058 crore.38 This substantial increase of over 50% from the previous fiscal year highlights sustained market demand and effective business operations. The standalone revenue for FY 2022-23 was ₹ 896.71 crore.40
-In FY 2023-24, Vadilal Industries maintained its growth trajectory, although at a more moderate pace. The consolidated annual revenue for this period was ₹ 1125.33 crore.41 This represents an approximate 6% increase over the previous fiscal year, suggesting a possible market stabilization or increased competitive pressures. The standalone revenue for FY 2023-24 was ₹ 912.57 crore.41
-Net Profit/Loss
-Along with revenue growth, Vadilal Industries has also shown improvement in its net profitability over the last three fiscal years. In FY 2021-22, the company recorded a consolidated net profit of ₹ 45 crore.38 This marked a significant turnaround and improvement in profitability compared to previous periods. The standalone net profit for the same year was ₹ 10.34 crore.39
-The net profit more than doubled in FY 2022-23, with the consolidated figure reaching ₹ 96 crore.1 This substantial growth underscores enhanced operational efficiency and potentially better cost management. The standalone net profit for FY 2022-23 was ₹ 70.67 crore.40
-The positive trend in net profit continued into FY 2023-24, with the consolidated net profit reported as ₹ 145.95 crore.41 This further increase indicates a strengthening financial performance and improved profitability for the company. The standalone net profit for FY 2023-24 was ₹ 95.84 crore.41
-EBITDA and Profit Margins
-Vadilal Industries' operational profitability, as reflected by its EBITDA and profit margins, has also shown positive trends over the past three fiscal years. In FY 2021-22, the company's EBITDA was reported as ₹ 98.8 crore, with an EBITDA margin of 14.2%.42 However, another source reported a lower EBITDA of ₹ 42.5 crore and an EBITDA margin of 7.8% for the same period.29 The net profit margin for FY 2021-22 was 6.4%.42
-In FY 2022-23, the company's EBITDA increased to ₹ 159.2 crore, with a slightly improved EBITDA margin of 15.0%.43 Another report indicated an EBITDA of ₹ 129.59 crore for this period.44 The net profit margin for FY 2022-23 also saw growth, reaching 9.1%.43
-The trend of improved operational profitability continued in FY 2023-24. The company's EBITDA reached ₹ 219.9 crore, with a notable increase in the EBITDA margin to 19.5%.46 Another source reported an EBITDA of ₹ 165.69 crore for this fiscal year.44 The net profit margin for FY 2023-24 further improved to 13.0%.46
-Segment-wise Revenue Breakdown
-Detailed segment-wise revenue breakdown for Vadilal Industries across the last three fiscal years was not consistently available within the provided snippets. To obtain precise figures for the revenue contribution from different segments such as ice cream, processed foods, and chemicals for FY 2021-22, FY 2022-23, and FY 2023-24, a review of the company's annual reports filed with the BSE and NSE would be necessary.
-Capital Expenditure and Debt Information
-Vadilal Industries' capital expenditure and debt management provide insights into its growth strategies and financial health. In FY 2021-22, the company incurred a capital expenditure of ₹ 18.8 crore.29 Its long-term debt stood at ₹ 77.3 crore, resulting in a debt-to-equity ratio of 0.3.42
-For FY 2022-23, the company had intentions to make a significant capital expenditure of around ₹ 60 crore, primarily aimed at expanding its manufacturing capacity.29 The long-term debt decreased to ₹ 59.7 crore, and the debt-to-equity ratio further improved to 0.2.43
-In FY 2023-24, Vadilal Industries reported a capital expenditure of ₹ 34.9 crore.46 The company continued to reduce its long-term debt, which stood at ₹ 37.6 crore. The debt-to-equity ratio saw a significant improvement, falling to 0.1.46 This trend indicates a strengthening financial position with reduced leverage.
-3. SHAREHOLDING PATTERN
-Latest Promoter Holding Percentage
-As of the latest available data, specifically for March 31, 2025, December 31, 2024, and September 30, 2024, the promoter and promoter group held a consistent percentage of 64.73% of the shares in Vadilal Industries.36 This indicates a strong and stable level of control and ownership by the company's promoters.
-Public Shareholding Breakdown
-The remaining portion of Vadilal Industries' shares is held by the public. As of March 31, 2025, December 31, 2024, and September 30, 2024, the public shareholding stood at 35.27%.47 Within this public holding, a significant portion is held by retail investors with holdings of less than ₹2 lakh. This category accounted for 17.72% of the total shares in March 2025, 18.51% in December 2024, and 17.43% in March 2024.36
-Institutional Investor Holdings
-The holdings by institutional investors in Vadilal Industries have shown some fluctuations over the past year. Foreign Institutional Investors (FIIs) held 0.23% of the shares as of March 2025 and 0.38% as of December 2024. Their holding was 0.68% in March 2024, 0.3% in December 2024, and 0.45% in March 2023.36 This indicates a relatively minor but varying interest from foreign institutional investors. Domestic Institutional Investors (DIIs), on the other hand, held 0.0% of the shares across the periods of March 2025, December 2024, and March 2024.36
-Any Significant Changes in the Past 2 Years
-Over the past two years, the promoter holding in Vadilal Industries has remained remarkably stable at 64.73%.36 This consistency suggests a long-term commitment and confidence from the promoters. The holding by Foreign Institutional Investors (FIIs) has experienced minor fluctuations, showing a slight increase in recent quarters compared to the previous year, though their overall stake remains below 1%.36 Similarly, the retail public holding has also seen some minor variations within a relatively narrow range.36 A notable change occurred in the promoter pledged holding. It was at 7.57% in both March 2024 and December 2024, then significantly decreased to 0.04% in March 2023, before increasing again to 7.53% in March 2025.36 This substantial reduction in pledged shares followed by a subsequent increase could reflect strategic financial maneuvers by the promoters.
-4. COMPETITOR ANALYSIS
-Current Market Share Data of Vadilal vs Competitors (Amul, Kwality Wall's, Mother Dairy, etc.)
-The Indian ice cream market is characterized by the dominance of a few major players. Amul holds the largest market share, estimated to be between 40-45% by some sources and specifically at 40% by another.48 Vadilal Industries is the second-largest player in the market, with a reported market share of 16% by some accounts and between 15-20% according to another.38 Cream Bell, owned by Varun Beverages, holds a smaller but significant share of 3%.49 Other prominent competitors in the Indian ice cream market include Kwality Wall's (part of Hindustan Unilever - HUL) and Mother Dairy, although precise current market share figures for these entities were not consistently available in the provided snippets. Additionally, regional players like Hangyo and various emerging and startup brands contribute to the competitive landscape.48
-Competitive Positioning
-The competitive landscape of the Indian ice cream market sees players positioning themselves through various strategies. Amul, a well-established Indian brand, is known for its wide range of dairy products, including ice cream, and competes on affordability and a strong presence in both urban and rural markets, often emphasizing its health-focused offerings.48 Kwality Wall's (HUL) is recognized for its diverse portfolio of ice cream products, ranging from popular family options to premium selections, backed by strong marketing and a wide distribution network.48 Vadilal, with its long history in the Indian market, has positioned itself through a wide array of flavors and a particularly strong presence in western India.48 Mother Dairy, a trusted brand in both urban and rural areas, offers a broad spectrum of dairy products, including ice cream, with a range that includes traditional, sugar-free, and premium options.48 Hangyo has carved a niche by dominating the South Indian market with its affordable yet high-quality ice creams and is now looking to expand its reach nationally following recent investments.48
-Relative Strengths and Weaknesses of Major Players
-Each of the major players in the Indian ice cream market possesses distinct strengths and potential weaknesses. Amul's strengths lie in its strong brand recognition across India, its extensive distribution network reaching both urban and rural consumers, its competitive pricing strategy, and its robust dairy product base. A potential area of weakness might be a comparatively lesser focus on the premium or niche segments of the market. Kwality Wall's (HUL) benefits from a diverse product portfolio, powerful marketing and distribution capabilities, and the recognition of an international brand. However, its ice cream division is currently under consideration for potential sale, which could introduce uncertainty. Vadilal's key strengths include its long-standing history in the Indian market, a wide variety of flavors catering to different tastes, a strong foothold in western India, and an established distribution network. Its market share is lower than Amul's, and there might be opportunities to further strengthen its presence in other regions. Mother Dairy is known as a trusted brand with a broad range of dairy offerings, including health-conscious ice cream options, and has a significant presence in both urban and rural areas. However, ice cream might represent a smaller fraction of its overall business compared to companies primarily focused on frozen desserts. Hangyo's strengths include its dominance in the South Indian market, its reputation for affordable and quality products, and recent financial backing that supports its expansion plans. Its primary weakness is its currently limited national presence.
-Recent Competitor Movements Affecting Market Dynamics
-Several recent movements by competitors are shaping the dynamics of the Indian ice cream market. Hangyo secured a substantial investment of US$25 million, indicating strong investor confidence and providing the capital for potential expansion beyond its traditional stronghold in South India.49 RS Business Ventures LLP, known for its Iceberg Ice Cream brand, announced plans to launch a premium brand named 'Organic Creamery,' signaling a move towards catering to the growing demand for healthier and organic options.51 Hindustan Unilever (Kwality Wall's) has seen significant traction in the quick commerce channel, with over 10% of its ice cream business originating from this segment in 2023, highlighting the increasing importance of rapid delivery services.50 Hocco, an Ahmedabad-based brand, recently raised ₹100 crore (approximately $12 million) at a valuation of ₹600 crore, with a strategic focus on appealing to Gen Z and millennial consumers through innovative offerings.48 Havmor has announced a significant investment of Rs 450 crore over the next five years, starting in 2023, aimed at expanding its production capacity, indicating an anticipation of market growth and a drive to increase its market share.52
-5. INDIAN ICE CREAM INDUSTRY TRENDS (2024-2025)
-Market Size and Growth Projections
-The Indian ice cream market is currently experiencing significant growth and is projected to continue on this trajectory in the coming years. In FY2024, the market was valued at USD 3.68 billion and is expected to reach USD 11.11 billion by FY2032, exhibiting a compound annual growth rate (CAGR) of 14.79% during the forecast period of FY2025-FY2032.51 Another report valued the market at approximately USD 3.46 Billion in 2024, with projections indicating a CAGR of 15.00% between 2025 and 2034, reaching a value of around USD 14.00 Billion by 2034.50 Similarly, the market size was estimated at USD 5.27 billion in 2023 and is expected to grow to USD 10.37 billion by 2035, with a CAGR of 5.854% from 2025 to 2035.53 Furthermore, the Indian Ice Cream Manufacturing Association (IICMA) anticipates the market to touch Rs 45,000 crore within the next three years.54 These projections collectively point towards a robust and expanding market for ice cream in India.
-Key Consumer Trends
-Several key consumer trends are shaping the Indian ice cream industry. There is a rising preference for organic and vegan products, reflecting a growing health consciousness among consumers.51 Notably, ice cream consumption is increasing even during the winter months, suggesting a shift away from its traditional seasonality.49 Consumers are also showing a greater interest in unique and seasonal flavored ice creams, indicating a demand for novelty and variety.51 This trend is further supported by a growing consumer inclination towards healthier options made with natural ingredients.48 The demand for premium and artisanal ice creams is also on the rise, with consumers seeking higher quality and more indulgent experiences.48 This includes a specific increase in demand for low-sugar, low-fat, dairy-free, and vegan ice cream varieties.48 Consumers are becoming more adventurous, exploring new and exciting flavors, including regional and ethnic options.48 This is also evident in the increasing popularity of vegan and exotic flavors like matcha and salted caramel.49 Overall, there is a growing focus on wellness in indulgent choices, with a rising awareness of sugar content.55 Interestingly, Indian consumers are showing a fondness for 'newstalgia,' where familiar flavors are highly preferred.55 The visual appeal of food is also becoming increasingly important, driven by social media trends.55 Top reasons for consuming ice cream include mood enhancement, celebrations, the need for refreshment, and family bonding.55 There is also a growing openness among Indian consumers to replace traditional sweets with ice cream.55
-Emerging Product Categories
-The Indian ice cream market is witnessing the emergence and growth of several product categories. Gourmet Natural Tubs, focusing on traditional Indian dessert flavors, have gained traction.1 There is an increasing availability and demand for low-sugar and dairy-free/lactose-free ice creams, catering to health-conscious consumers and those with dietary restrictions.48 Vegan ice creams are also becoming more prominent, aligning with the rising trend of plant-based diets.48 Protein-rich ice creams are emerging as a niche category appealing to fitness enthusiasts.48 The artisanal ice cream market is expanding, emphasizing high-quality ingredients, unique flavors, and smaller production batches.48 Functional ice creams, which offer added health benefits such as probiotics or nutrients, represent another growing category.48
-Technological and Distribution Innovations
-Technological and distribution innovations are significantly impacting the Indian ice cream industry. The growth of online sales and quick commerce platforms is making ice cream more accessible to consumers, providing convenience and rapid delivery.48 Advances in cold chain logistics and temperature-controlled storage are crucial for maintaining the quality of ice cream throughout the supply chain and enabling market expansion into both urban and rural areas.52 Enhanced distribution strategies now include a greater emphasis on online sales and e-commerce platforms to reach a wider customer base.48 Innovative delivery systems are transforming ice cream from a primarily seasonal treat to a year-round indulgence by ensuring quick and efficient delivery to meet consumer demand for instant gratification.49
-Industry Challenges and Opportunities
-The Indian ice cream industry faces both challenges and opportunities in its growth trajectory. A significant challenge is the need for a robust and efficient cold chain and logistics infrastructure to maintain product quality, especially in a country with diverse climates and geographies.52 The high capital investment required for establishing and maintaining this infrastructure can be a barrier, particularly for reaching remote areas.56 The industry also faces competition from other dessert categories such as bakery products, chocolate confectionery, and traditional dairy sweets.57 However, the opportunities for growth are substantial. India presents a vast untapped potential due to its relatively low per capita ice cream consumption compared to global averages.33 Rising disposable incomes and increasing discretionary spending are driving secular demand growth for indulgent treats like ice cream.33 Rapid urbanization, particularly in tier-1 and tier-2 cities, is fueling demand for a variety of ice cream options.48 Government initiatives and incentives aimed at boosting the food processing sector also create a favorable environment for industry growth.54 The increasing consumer demand for nutrition-rich and vegan ice cream presents a specific opportunity for product innovation and market expansion.56 Additionally, India's hot and tropical climate naturally drives high ice cream consumption, especially during the extended summer months.48 The expansion of modern retail formats like supermarkets and hypermarkets also enhances the accessibility and availability of a wide range of ice cream products.48
-Sustainability Initiatives
-Sustainability is becoming an increasingly important consideration in the Indian ice cream industry. Consumers are showing a greater preference for brands that demonstrate ethical and sustainable practices in their operations.48 This includes a growing demand for brands that utilize sustainable sourcing methods for their ingredients and adopt eco-friendly packaging practices to minimize their environmental impact.48
-6. SPECIFIC ANSWERS TO THESE QUESTIONS:
-What is the exact shareholding breakdown of Vadilal Group as per the latest filings?
-As per the latest available information (March 31, 2025):
-Promoter & Promoter Group: 64.73% 47
-Public: 35.27% 47
-Retail < ₹2L: 17.72% 36
-Institutional Investors:
-FII: 0.23% 36
-DII: 0.0% 36
-Who are the biggest direct competitors with their approximate market shares?
-Amul: 40-45% 48 / 40% 49
-Vadilal: 16% 38 / 15-20% 48
-Cream Bell (Varun Beverages): 3% 49
-Other significant competitors include Kwality Wall's (HUL) and Mother Dairy.
-What has been the financial performance over the last 3 financial years with precise figures?
-FY 2021-22 (Consolidated):
-Annual Revenue: ₹ 698 crore 38
-Net Profit: ₹ 45 crore 38
-EBITDA: ₹ 98.8 crore 42
-FY 2022-23 (Consolidated):
-Annual Revenue: ₹ 1058 crore 38
-Net Profit: ₹ 96 crore 1
-EBITDA: ₹ 159.2 crore 43
-FY 2023-24 (Consolidated):
-Annual Revenue: ₹ 1125.33 crore 41
-Net Profit: ₹ 145.95 crore 41
-EBITDA: ₹ 219.9 crore 46
-What are the key trends driving the Indian ice cream industry in 2025?
-Growing demand for healthier options (low-sugar, low-fat, dairy-free, vegan).48
-Increasing preference for premium and artisanal ice creams.48
-Rising popularity of unique and innovative flavors.48
-Significant growth in online sales and quick commerce platforms.48
-Increasing consumer awareness and demand for sustainable products.48
-Continued market expansion due to rising disposable incomes and urbanization.48
-Conclusions
-Vadilal Group, through its primary entity Vadilal Industries Ltd., has established itself as a significant player in the Indian ice cream market with a history spanning over a century. The company has demonstrated a consistent growth trajectory in both revenue and profitability over the last three fiscal years, reflecting its strong market presence and operational efficiency. Its extensive manufacturing infrastructure, comprising three main plants with increasing production capacities, supports a wide-reaching distribution network across India. The company's foray into international markets, with exports contributing a substantial portion of its revenue, highlights its global ambitions.
-The shareholding pattern indicates strong promoter confidence and a significant public holding, with minor but fluctuating interest from institutional investors. In the competitive landscape, Vadilal holds the position of the second-largest player, competing with industry giants like Amul and Kwality Wall's, each with their unique strengths and market positioning. Recent movements within the competitive environment, including funding for emerging players and strategic expansions, suggest a dynamic and evolving market.
-The Indian ice cream industry is poised for continued growth, driven by evolving consumer preferences towards healthier and premium options, the rise of online distribution channels, and increasing disposable incomes. While challenges related to cold chain infrastructure persist, the opportunities for expansion and innovation remain substantial for companies like Vadilal Group. The increasing consumer focus on sustainability also presents a key area for future strategic development.
-Table 1: Financial Performance Summary (FY 2021-22 to FY 2023-24) (Consolidated Figures)
-Table 2: Shareholding Pattern (Latest - March 31, 2025)
-Works cited
-Vadilal - Wikipedia, accessed on April 23, 2025, https://en.wikipedia.org/wiki/Vadilal
-Vadilal, accessed on April 23, 2025, https://www.vadilalicecreams.com/
-Brand Story - Vadilal, accessed on April 23, 2025, https://www.vadilalicecreams.com/brand-story
-Franchise - Vadilal, accessed on April 23, 2025, https://www.vadilalicecreams.com/franchise
-Vadilal Industries - Space Food Club, accessed on April 23, 2025, https://spacefoodclub.com/blogs/jobs-blog/vadilal-industries
-Vadilal Industries Share Price Today - Stocks - Groww, accessed on April 23, 2025, https://groww.in/stocks/vadilal-industries-ltd
-www.google.com, accessed on April 23, 2025, https://www.google.com/search?q=Vadilal+Industries+Ltd+subsidiaries
-Vadilal Industries subsidiary buys 100% stake in US-based Krishna Krupa Corp, accessed on April 23, 2025, https://www.business-standard.com/article/news-cm/vadilal-industries-subsidiary-buys-100-stake-in-us-based-krishna-krupa-corp-122062000635_1.html
-Vadilal Group » VIL Reports, accessed on April 23, 2025, https://vadilalgroup.com/?page_id=904
-Contact - Vadilal Icecream India, accessed on April 23, 2025, https://www.vadilalicecream.com/contact.html
-VADILAL DAIRY INTERNATIONAL LIMITED - BSE, accessed on April 23, 2025, https://www.bseindia.com/xml-data/corpfiling/AttachHis/eaf29ca9-4e7e-44f2-beb8-e158d738b2a0.pdf
-VADILAL DAIRY INTERNATIONAL LIMITED, accessed on April 23, 2025, https://vadilalicecream.com/pdf/Annual%20Report_Vadilal%202023-24.pdf
-Vadilal Dairy International Annual Reports, Balance Sheet and Financials - Unlisted Shares, accessed on April 23, 2025, https://wwipl.com/unlisted-shares/vadilal-dairy-international-share-price/financial
-Our Business - Vadilal Group, accessed on April 23, 2025, https://vadilalgroup.com/?page_id=12
-Vadilalgases, accessed on April 23, 2025, https://www.vadilalchemicals.in/
-Vadilal Chemicals Annual Report | Balance Sheet | Financials | Revenue - Unlisted Shares, accessed on April 23, 2025, https://wwipl.com/unlisted-shares/vadilal-chemicals-share-price/financial
-Vadilal Enterprises Ltd share price | About Vadilal Enterp. | Key Insights - Screener, accessed on April 23, 2025, https://www.screener.in/company/519152/
-The Road Ahead for Vadilal Enterprises Post 200%+ Gains in a Year - Equitymaster, accessed on April 23, 2025, https://www.equitymaster.com/detail.asp?date=04/06/2025&story=2&title=Rs-4000-to-Rs-13000-The-Road-Ahead-for-Vadilal-Enterprises-Post-200-Gains-in-a-Year
-06"" September, 2022 we are submitting here with the Annual Report for the Financial Year 2021-22 of Vadilal NPS - BSE, accessed on April 23, 2025, https://www.bseindia.com/bseplus/AnnualReport/519152/77297519152.pdf
-M N 0 N - Vadilal Group, accessed on April 23, 2025, https://vadilalgroup.com/wp-content/uploads/2023/08/VEL_Annual-Report_22-23.pdf
-Vadilal Group » VEL Reports, accessed on April 23, 2025, https://vadilalgroup.com/?page_id=944
-VADILAL ENT 2023-24 Annual Report Analysis - Equitymaster, accessed on April 23, 2025, https://www.equitymaster.com/research-it/annual-results-analysis/VLEN/VADILAL-ENT-2023-24-Annual-Report-Analysis/11937
-Plants - Vadilal Group, accessed on April 23, 2025, https://vadilalgroup.com/?page_id=111
-Vadilal Industries augments capacity in Uttar Pradesh - Projects Today, accessed on April 23, 2025, https://www.projectstoday.com/News/Vadilal-Industries-augments-capacity-in-Uttar-Pradesh
-Vadilal Group, accessed on April 23, 2025, https://www.vadilalgroup.com/pfd/processing.html
-Vadilal Industries Ltd Summary | IIFL Capital, accessed on April 23, 2025, https://www.indiainfoline.com/company/vadilal-industries-ltd/summary
-Mediakit - Vadilal Group, accessed on April 23, 2025, https://vadilalgroup.com/?page_id=115
-Vadilal Industries Limited - CARE Ratings, accessed on April 23, 2025, https://www.careratings.com/upload/CompanyFiles/PR/202401130127_Vadilal_Industries_Limited.pdf
-India Ratings Upgrades Vadilal Industries to 'IND BBB+'/Stable, accessed on April 23, 2025, https://www.indiaratings.co.in/pressrelease/59701
-23 Vadilal Ice Creams are consumed in India every second - YouTube, accessed on April 23, 2025, https://www.youtube.com/watch?v=7M1n6WWXH58
-Vadilal Reinvigorating the Ice Cream and Frozen Food Market - The Interview World, accessed on April 23, 2025, https://theinterview.world/vadilal-reinvigorating-the-ice-cream-and-frozen-food-market/
-FY19 & Q1FY20 Results Presentation - Vadilal Group, accessed on April 23, 2025, https://vadilalgroup.com/wp-content/uploads/2020/04/Q1-Presentation.pdf
-vadilal industries - AWS, accessed on April 23, 2025, https://stockdiscovery.s3.amazonaws.com/insight/india/2057/Investor%20Presentation/IP-Sep17.pdf
-Vadilal Group, accessed on April 23, 2025, https://www.vadilalgroup.com/pfd/processed_food.html
-Vadilal Industries Ltd Company Profile: Products, Promoters and Clients - Sovrenn, accessed on April 23, 2025, https://www.sovrenn.com/knowledge/vadilal-industries-ltd-company-profile-products-promoters-and-clients
-Vadilal Industries Ltd. | Tijori Finance, accessed on April 23, 2025, https://www.tijorifinance.com/company/vadilal-industries-limited/
-Contact - Vadilal Quick Treat, accessed on April 23, 2025, https://vadilalglobal.com/pages/contact
-Vadilal Industries Ltd share price | About Vadilal Inds. | Key Insights - Screener, accessed on April 23, 2025, https://www.screener.in/company/VADILALIND/consolidated/
-Submission of Audited Financial Results (Standalone & Consolidated) for the quarter/ year ended on 31* March, 2022 along - BSE, accessed on April 23, 2025, https://www.bseindia.com/xml-data/corpfiling/AttachHis/a0ad4c39-462e-4eaa-997d-aa2d5ca39fcb.pdf
-Submission of Audited Financial Results (Standalone & Consolidated) for the quarter/ year ended on 31st - NSE, accessed on April 23, 2025, https://nsearchives.nseindia.com/corporate/VADILALIND_29052023174601_VILResults.pdf
-vadilalgroup.com, accessed on April 23, 2025, https://vadilalgroup.com/wp-content/uploads/2024/08/Annual-Report-2023-2024-1.pdf
-VADILAL INDUSTRIES 2021-22 Annual Report Analysis, accessed on April 23, 2025, https://www.equitymaster.com/research-it/annual-results-analysis/VLIN/VADILAL-INDUSTRIES-2021-22-Annual-Report-Analysis/4107
-VADILAL INDUSTRIES 2022-23 Annual Report Analysis - Equitymaster, accessed on April 23, 2025, https://www.equitymaster.com/research-it/annual-results-analysis/VLIN/VADILAL-INDUSTRIES-2022-23-Annual-Report-Analysis/5403
-Vadilal Industries Ltd Directors Report - India Infoline, accessed on April 23, 2025, https://www.indiainfoline.com/company/vadilal-industries-ltd/reports/directors-report
-Vadilal Industries Ltd - Directors Report | Capital Market, accessed on April 23, 2025, https://www.capitalmarket.com/markets/CompanyInformation/Directors-Reports/vadilal-industries-to-declare-quarterly-result/1524
-VADILAL INDUSTRIES 2023-24 Annual Report Analysis - Equitymaster, accessed on April 23, 2025, https://www.equitymaster.com/research-it/annual-results-analysis/VLIN/VADILAL-INDUSTRIES-2023-24-Annual-Report-Analysis/11522
-Vadilal Industries Limited Share Price Today, Stock Price, Live NSE News, Quotes, Tips – NSE India, accessed on April 23, 2025, https://www.nseindia.com/get-quotes/equity?symbol=VADILALIND
-Indian Ice Cream Market in 2024: Key Players, Trends and Drivers, accessed on April 23, 2025, https://www.technopak.com/indian-ice-cream-market-in-2024-key-players-trends-and-drivers/
-India's ice cream market booms with US$26.5M in 2024 funding ..., accessed on April 23, 2025, https://dairybusinessafrica.com/2025/04/10/indias-ice-cream-market-booms-with-us26-5m-in-2024-funding-drawing-investor-interest/
-India Ice Cream Market Regional Analysis 2025-2034, accessed on April 23, 2025, https://www.expertmarketresearch.com/reports/india-ice-cream-market/regional-analysis
-UIndia Ice Cream Market - HackMD, accessed on April 23, 2025, https://hackmd.io/@marketsandata/India-Ice-Cream-Market
-India Ice Cream Market Trends - Expert Market Research, accessed on April 23, 2025, https://www.expertmarketresearch.com/reports/india-ice-cream-market/market-trends
-India Ice Cream Market Size, Trends, and Global Analysis to 2032, accessed on April 23, 2025, https://www.marketresearchfuture.com/reports/india-ice-cream-market-44449
-India ice cream market expected to touch Rs 45,000 cr in next 3 ..., accessed on April 23, 2025, https://m.economictimes.com/industry/cons-products/food/india-ice-cream-market-expected-to-touch-rs-45000-cr-in-next-3-years-iicma/articleshow/119651598.cms
-India Ice Cream Market Report 2024 - Mintel Store, accessed on April 23, 2025, https://store.mintel.com/report/india-ice-cream-market-report
-India Ice Cream Market Size, Share, Sales and Growth Statistics, 2030, accessed on April 23, 2025, https://www.marknteladvisors.com/research-library/india-ice-cream-market.html
-[Watch] What Indian consumers seek in ice cream? - Mintel, accessed on April 23, 2025, https://www.mintel.com/insights/food-and-drink/what-indian-consumers-seek-in-ice-cream/
-Fiscal Year
-Annual Revenue (INR Crores)
-Net Profit (INR Crores)
-EBITDA (INR Crores)
-EBITDA Margin (%)
-Net Profit Margin (%)
-Capital Expenditure (INR Crores)
-Long-term Debt (INR Crores)
-FY 2021-22
-698
-45
-98.8
-14.2
-6.4
-18.8
-77.3
-FY 2022-23
-1058
-96
-159.2
-15.0
-9.1
-~60
-59.7
-FY 2023-24
-1125.33
-145.95
-219.9
-19.5
-13.0
-34.9
-37.6
-Shareholder Category
-Holding Percentage (%)
-Promoter & Promoter Group
-64.73
-Public
-35.27
-FII
-0.23
-DII
-0.0
-"""
+@st.cache_resource
+def get_engine():
+    """The answer pipeline, shared by all sessions of this process."""
+    if API_URL:
+        return EngineClient(API_URL)
+    return QueryEngine()
 
-# Initialize session state for chat history
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
+@st.cache_resource
+def get_storage():
+    """SQLite storage for chat transcripts (the in-process engine's own handle when there is one)."""
+    engine = get_engine()
+    storage = engine.storage if isinstance(engine, QueryEngine) else StorageHandler(DB_PATH)
+    storage.purge_chat_sessions(CHAT_RETENTION)
+    return storage
 
-# Function to call the LLM API (OpenRouter)
-def query_llm(prompt, api_key, model, enable_web_search=False, serp_api_key=None):
-    web_search_results = ""
-    
-    if enable_web_search and serp_api_key:
-        with st.status("Searching the web for information..."):
-            web_search_results = search_serp_api(prompt, serp_api_key)
-            
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "HTTP-Referer": "https://vadilal-chat-agent.streamlit.app/",
-        "X-Title": "Vadilal Assistant"
-    }
-    
-    # Make the web results more prominent in the system message
-    if web_search_results and "No search results found" not in web_search_results:
-        system_message = f"""You are a helpful AI assistant for Vadilal Group, an Indian ice cream company.
-        
-        IMPORTANT: I have searched the web for the user's query and found the following RECENT INFORMATION. 
-        This information is current and should be used to answer the question:
-        
-        {web_search_results}
-        
-        Additionally, here is background information about Vadilal:
-        {VADILAL_DATA}
-        
-        Current date: {datetime.now().strftime('%B %d, %Y')}
-        
-        When answering the user's question, prioritize the recent web search results over your built-in knowledge.
-        If the web search results contain relevant information to the query, be sure to mention that you found this information online.
-        """
-    else:
-        # Default system message when no web results
-        system_message = f"""You are a helpful AI assistant for Vadilal Group, an Indian ice cream company. 
-    Answer questions based on the following information about Vadilal. 
-    If you don't know the answer, politely say so without making up information.
-    
-    VADILAL INFORMATION:
-    {VADILAL_DATA}
-    
-    Current date: {datetime.now().strftime('%B %d, %Y')}
-    """
-    
-    # Add web results to system message when available
-    if web_search_results:
-        system_message += f"\n\nRECENT WEB SEARCH RESULTS ABOUT VADILAL:\n{web_search_results}\n"
-        system_message += "Use the web search results to supplement your knowledge, especially for recent information."
+@st.cache_data(ttl=10, show_spinner=False)
+def get_engine_stats():
+    """Cache counters for the sidebar; refreshed at most every 10s (one HTTP call in API mode)."""
+    return get_engine().stats()
 
+def message_html(role, content):
+    """Chat bubble markup for one message."""
+    if role == "user":
+        return f'<div class="chat-message user-message">👤 <div class="message-content">{content}</div></div>'
+    return f'<div class="chat-message assistant-message">🍦 <div class="message-content">{content}</div></div>'
 
-    messages = [
-        {"role": "system", "content": system_message},
-    ]
-    
-    # Add conversation history
-    for message in st.session_state.messages:
-        messages.append({"role": message["role"], "content": message["content"]})
-    
-    # Add current prompt
-    messages.append({"role": "user", "content": prompt})
-    
-    data = {
-        "model": model_options[selected_model], # Uses selected model from dropdown
-        "messages": messages,
-        "temperature": 0.7,
-        "max_tokens": 1000
-    }
-    
-    try:
-        response = requests.post(url, headers=headers, json=data, timeout=60)
-        response.raise_for_status()  # Raise exception for 4XX/5XX errors
-        
-        result = response.json()
-        if "choices" in result and len(result["choices"]) > 0:
-            return result["choices"][0]["message"]["content"]
-        else:
-            return "Error: Unexpected response format from API"
-    except requests.exceptions.RequestException as e:
-        # Improved error handling with specific details
-        error_msg = f"API Error: {str(e)}"
-        if hasattr(e, 'response') and e.response is not None:
-            if e.response.status_code == 400:
-                error_msg = "Error 400: Bad request. Please check your API key and parameters."
-            elif e.response.status_code == 401:
-                error_msg = "Error 401: Authentication failed. Please check your API key."
-            elif e.response.status_code == 429:
-                error_msg = "Error 429: Too many requests. Please try again later."
-            
-            # Try to get more details from response
-            try:
-                response_json = e.response.json()
-                if "error" in response_json and "message" in response_json["error"]:
-                    error_msg += f"\nDetails: {response_json['error']['message']}"
-            except:
-                pass
-        
-        return f"{error_msg}\n\nTry an alternative approach: check your API connection settings or try a different LLM provider."
+# Initialize the chat session; its id is kept in the URL so the conversation
+# can be resumed from SQLite after a reload or restart
+if 'chat' not in st.session_state:
+    st.session_state.chat = ChatSession(get_storage(), st.query_params.get("session"))
+    st.query_params["session"] = st.session_state.chat.session_id
+chat = st.session_state.chat
 
-# Alternative function using direct Anthropic API (in case OpenRouter continues to fail)
-def query_anthropic(prompt, anthropic_api_key, model, enable_web_search=False):
-    web_search_results = ""
-    
-    if enable_web_search:
-        with st.status("Searching the web for information..."):
-            web_search_results = search_web(f"Vadilal ice cream {prompt}")
-    
-    url = "https://api.anthropic.com/v1/messages"
-    
-    headers = {
-        "x-api-key": anthropic_api_key,
-        "anthropic-version": "2023-06-01",
-        "content-type": "application/json"
-    }
-    
-    # Similar improvement in how we structure the system message
-    if web_search_results and "No search results found" not in web_search_results:
-        system_message = f"""You are a helpful AI assistant for Vadilal Group, an Indian ice cream company.
-        
-        IMPORTANT: I have searched the web for the user's query and found the following RECENT INFORMATION. 
-        This information is current and should be used to answer the question:
-        
-        {web_search_results}
-        
-        Additionally, here is background information about Vadilal:
-        {VADILAL_DATA}
-        
-        Current date: {datetime.now().strftime('%B %d, %Y')}
-        
-        When answering the user's question, prioritize the recent web search results over your built-in knowledge.
-        If the web search results contain relevant information to the query, be sure to mention that you found this information online.
-        """
-    else:
-        # Default system message when no web results
-        system_message = f"""You are a helpful AI assistant for Vadilal Group, an Indian ice cream company.
-        Answer questions based on the following information about Vadilal. 
-        If you don't know the answer, politely say so without making up information.
-        
-        VADILAL INFORMATION:
-        {VADILAL_DATA}
-        
-        Current date: {datetime.now().strftime('%B %d, %Y')}
-        """
-    
-    # Format history in Anthropic's format
-    messages = []
-    for message in st.session_state.messages[-10:]:
-        if message["role"] == "user":
-            messages.append({"role": "user", "content": message["content"]})
-        else:
-            messages.append({"role": "assistant", "content": message["content"]})
-    
-    # Add current prompt
-    messages.append({"role": "user", "content": prompt})
-    
-    data = {
-        "model": model,
-        "system": system_message,  # This is where the system message with web results is used
-        "messages": messages,
-        "max_tokens": 1000
-    }
+def report_usage(usage):
+    """Show this call's prompt-cache numbers and add them to the session totals."""
+    totals = st.session_state.setdefault("token_usage", empty_usage())
+    for key, value in usage.items():
+        totals[key] += value or 0
+    st.caption(f"Tokens: {usage['input_tokens']} input, {usage['cache_read_tokens']} read from prompt cache, "
+               f"{usage['cache_write_tokens']} written to prompt cache, {usage['output_tokens']} output")
+
+def render_answer(events, provider, refresh_interval=0.05):
+    """
+    Render the engine's events: search status, the answer streamed into one
+    assistant bubble and token usage. Redraws are throttled to
+    `refresh_interval` seconds. If the script is stopped mid-stream, the
+    partial answer is still saved to history.
+    """
+    placeholder = st.empty()
+    placeholder.markdown(message_html("assistant", "Thinking..."), unsafe_allow_html=True)
     
+    status = None
+    parts = []
+    last_draw = 0.0
+    completed = False
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=60)
-        response.raise_for_status()
-        
-        result = response.json()
-        if "content" in result and len(result["content"]) > 0:
-            return result["content"][0]["text"]
-        else:
-            return "Error: Unexpected response format from API"
-    except requests.exceptions.RequestException as e:
-        return f"API Error: {str(e)}"
+        for event in events:
+            kind = event["type"]
+            if kind == "status":
+                status = st.status("Searching the web for information...")
+            elif kind == "sources" and status is not None:
+                with status:
+                    for name, outcome in event["sources"].items():
+                        detail = f": {outcome['error']}" if outcome.get("error") else ""
+                        st.write(f"{name}: {outcome['status']} in {outcome['seconds']:.1f}s{detail}")
+                status.update(state="complete")
+            elif kind == "text":
+                parts.append(event["text"])
+                now = time.monotonic()
+                if now - last_draw >= refresh_interval:
+                    placeholder.markdown(message_html("assistant", "".join(parts) + "▌"), unsafe_allow_html=True)
+                    last_draw = now
+            elif kind == "error":
+                parts.append(f"\n\n{event['message']}")
+                if provider == "openrouter":
+                    parts.append("\n\nTry an alternative approach: check your API connection settings or try a different LLM provider.")
+            elif kind == "route" and event["provider"] != provider:
+                if event["failed_over"]:
+                    reason = f"{PROVIDER_LABELS[provider]} failed"
+                elif event["hedged"]:
+                    reason = f"{PROVIDER_LABELS[provider]} was slow to respond"
+                else:
+                    reason = f"{PROVIDER_LABELS[provider]} is paused after repeated failures"
+                st.caption(f"Answered by {PROVIDER_LABELS[event['provider']]} ({event['model']}): {reason}")
+            elif kind == "context":
+                context = event["context"]
+                st.caption(f"Knowledge context: {context['tokens_after']} tokens, {context['tokens_before']} before "
+                           f"compression ({context['sources']} sources cited)")
+            elif kind == "facts":
+                st.caption("Answered from the financial facts table, without an LLM call")
+            elif kind == "faq":
+                st.caption(f"Precomputed answer to the FAQ \"{event['question']}\"")
+            elif kind == "usage":
+                report_usage(event["usage"])
+        completed = True
+    finally:
+        # Closing the generator closes the HTTP stream and cancels generation
+        events.close()
+        response = "".join(parts).strip()
+        if not completed:
+            response += " …[stopped]"
+        chat.append("assistant", response)
+    
+    placeholder.markdown(message_html("assistant", response), unsafe_allow_html=True)
+    return response
 
 # Main app interface
 st.markdown('<div class="vadilal-logo"><h1 class="main-header">🍦 Vadilal AI Assistant</h1></div>', unsafe_allow_html=True)
@@ -493,6 +177,7 @@ st.markdown('<div class="vadilal-logo"><h1 class="main-header">🍦 Vadilal AI A
 with st.sidebar:
     st.header("API Configuration")
     api_option = st.radio("Select API Provider:", ["OpenRouter", "Anthropic Direct"])
+    provider = "openrouter" if api_option == "OpenRouter" else "anthropic"
     
     if api_option == "OpenRouter":
         api_key = st.text_input("OpenRouter API Key", type="password", 
@@ -502,24 +187,41 @@ with st.sidebar:
                                help="Enter your Anthropic API key. Keep it confidential.")
     
     # Model selection based on provider
-    if api_option == "OpenRouter":
-        model_options = {
-            "Claude 3 Haiku": "anthropic/claude-3-haiku",
-            "Claude 3 Sonnet": "anthropic/claude-3-sonnet",
-            "Claude 3 Opus": "anthropic/claude-3-opus",
-            "GPT-3.5 Turbo": "openai/gpt-3.5-turbo",
-            "Llama 3 70B": "meta-llama/llama-3-70b-instruct",
-            "Llama 4 Maverick (Free)": "meta-llama/llama-4-maverick:free"
-        }
-    else:
-        model_options = {
-            "Claude 3 Haiku": "claude-3-haiku-20240307",
-            "Claude 3 Sonnet": "claude-3-sonnet-20240229",
-            "Claude 3 Opus": "claude-3-opus-20240229"
-        }
+    model_options = MODEL_OPTIONS[provider]
     
     selected_model = st.selectbox("Select Model:", list(model_options.keys()))
     
+    # Optional key for the other provider: slow or failing calls are raced against / moved to it
+    other_provider = "anthropic" if provider == "openrouter" else "openrouter"
+    fallback_api_key = st.text_input(f"{PROVIDER_LABELS[other_provider]} API Key (optional, for failover)",
+                                     type="password",
+                                     help=f"If {PROVIDER_LABELS[provider]} is failing or unusually slow to start answering, the question is also sent to {PROVIDER_LABELS[other_provider]} and the first answer wins.")
+    
+    # How much of the knowledge base is sent with each question (0 = everything)
+    context_token_budget = st.slider("Knowledge Context Budget (tokens)", 0, 4000, RETRIEVAL_TOKEN_BUDGET, step=250,
+                                     help="Only the most relevant parts of the Vadilal data are sent, up to this many tokens. Set to 0 to send the full knowledge base; it is then identical for every question, so Claude models read it from the prompt cache after the first call.")
+    
+    engine_stats = get_engine_stats()
+    if "response_cache" in engine_stats:
+        answer_stats = engine_stats["response_cache"]
+        st.caption(f"Answer cache: {answer_stats['exact_hits'] + answer_stats['similar_hits']} hits, "
+                   f"{answer_stats['misses']} misses ({answer_stats['hit_rate']:.0%} hit rate)")
+    if "token_usage" in st.session_state:
+        totals = st.session_state.token_usage
+        st.caption(f"Prompt cache this session: {totals['cache_read_tokens']} tokens read, "
+                   f"{totals['cache_write_tokens']} written, {totals['input_tokens']} uncached input")
+    
+    # Latency of the pipeline stages and the last few requests, from the engine's tracer
+    tracing = engine_stats.get("tracing")
+    if tracing and tracing["spans"]:
+        with st.expander("Diagnostics"):
+            st.caption("Timings over recent requests (ms)")
+            st.table([{"Stage": name, "Count": span["count"], "p50": span["p50_ms"], "p95": span["p95_ms"]}
+                      for name, span in sorted(tracing["spans"].items())])
+            for trace in tracing["recent"]:
+                stages = ", ".join(f"{name} {ms:.0f}" for name, ms in trace["spans"] if not name.startswith("storage."))
+                st.caption(f"{trace['attributes'].get('outcome', 'unfinished')} in {trace['duration_ms']:.0f} ms: {stages}")
+    
     # Add search mode selection
     st.header("Search Options")
 search_mode = st.radio(
@@ -531,7 +233,11 @@ search_mode = st.radio(
 # Show SERP API key input only if web search is enabled
 if search_mode == "Web Search Enabled":
     serp_api_key = st.text_input("SERP API Key", type="password", 
-                          help="Enter your SERP API key for web search functionality. Get one at serpapi.com")
+                          help="Optional: with a SERP API key, Google results are searched alongside DuckDuckGo. Get one at serpapi.com")
+    if "search_cache" in engine_stats:
+        stats = engine_stats["search_cache"]
+        st.caption(f"Search cache: {stats['memory_hits'] + stats['db_hits']} hits, {stats['misses']} misses "
+                   f"({stats['hit_rate']:.0%} hit rate)")
 else:
     serp_api_key = ""
     
@@ -541,15 +247,17 @@ else:
     
     # Add clear conversation button
     if st.button("Clear Conversation"):
-        st.session_state.messages = []
+        chat.clear()
         st.rerun()
 
-# Display chat history
-for message in st.session_state.messages:
-    if message["role"] == "user":
-        st.markdown(f'<div class="chat-message user-message">👤 <div class="message-content">{message["content"]}</div></div>', unsafe_allow_html=True)
-    else:
-        st.markdown(f'<div class="chat-message assistant-message">🍦 <div class="message-content">{message["content"]}</div></div>', unsafe_allow_html=True)
+# Display the latest page of the chat history as a single element; earlier
+# pages are loaded from SQLite on request
+if chat.has_earlier and st.button("Load earlier messages"):
+    chat.load_earlier()
+visible_messages = chat.visible_messages()
+if visible_messages:
+    st.markdown("".join(message_html(m["role"], m["content"]) for m in visible_messages),
+                unsafe_allow_html=True)
 
 # Chat input
 with st.container():
@@ -557,74 +265,43 @@ with st.container():
     
     if user_input:
         # Display user message
-        st.markdown(f'<div class="chat-message user-message">👤 <div class="message-content">{user_input}</div></div>', unsafe_allow_html=True)
+        st.markdown(message_html("user", user_input), unsafe_allow_html=True)
         
         # Save to history
-        st.session_state.messages.append({"role": "user", "content": user_input})
+        chat.append("user", user_input)
         
-        # Get response from selected API
-        # Get response from selected API
-    with st.spinner('Thinking...'):
+        # Get response from selected API, streamed into the chat as it is generated
         if api_key:
             # Check if web search is enabled
             enable_web_search = (search_mode == "Web Search Enabled")
             
-            if api_option == "OpenRouter":
-                response = query_llm(user_input, api_key, model_options[selected_model], enable_web_search)
-            else:
-                response = query_anthropic(user_input, api_key, model_options[selected_model], enable_web_search)
+            events = get_engine().stream_answer(
+                user_input, provider, api_key, model_options[selected_model],
+                # The current question is already the last entry of the chat history
+                history=chat.history(),
+                # Folded in-process, or by EngineClient before the request (the API server is stateless)
+                history_window=chat.history_window,
+                enable_web_search=enable_web_search,
+                serp_api_key=serp_api_key,
+                token_budget=context_token_budget,
+                fallbacks=[{
+                    "provider": other_provider,
+                    "api_key": fallback_api_key,
+                    "model": equivalent_model(model_options[selected_model], provider, other_provider)
+                }] if fallback_api_key else []
+            )
+            render_answer(events, provider)
         else:
             response = "⚠️ Please enter an API key in the sidebar to continue."
-        
-        # Display assistant response
-        st.markdown(f'<div class="chat-message assistant-message">🍦 <div class="message-content">{response}</div></div>', unsafe_allow_html=True)
-        
-        # Save to history
-        st.session_state.messages.append({"role": "assistant", "content": response})
-
-def search_serp_api(query, api_key, num_results=5):
-    """
-    Search the web using SERP API
-    """
-    try:
-        # Build the search URL with the query and API key
-        search_query = f"Vadilal Industries {query}"
-        params = {
-            "q": search_query,
-            "api_key": api_key,
-            "num": str(num_results)
-        }
-        
-        # Make the API request
-        base_url = "https://serpapi.com/search"
-        response = requests.get(base_url, params=params, timeout=15)
-        response.raise_for_status()
-        
-        # Parse the JSON response
-        results = response.json()
-        
-        if "error" in results:
-            return f"SERP API Error: {results['error']}"
             
-        # Format the results
-        formatted_results = "Web search results:\n\n"
-        
-        # Add organic results
-        if "organic_results" in results and results["organic_results"]:
-            for i, result in enumerate(results["organic_results"][:num_results]):
-                title = result.get("title", "No title")
-                snippet = result.get("snippet", "No description available")
-                link = result.get("link", "")
-                
-                formatted_results += f"SOURCE {i+1}: {title}\n"
-                formatted_results += f"Description: {snippet}\n\n"
-        else:
-            formatted_results += "No relevant search results found.\n\n"
+            # Display assistant response
+            st.markdown(message_html("assistant", response), unsafe_allow_html=True)
             
-        return formatted_results
-    except Exception as e:
-        return f"Error searching with SERP API: {str(e)}"
+            # Save to history
+            chat.append("assistant", response)
 
 # Footer
 st.markdown('<div class="footer">Vadilal AI Assistant - Using publicly available information only</div>', unsafe_allow_html=True)
 
+if isinstance(get_engine(), QueryEngine):
+    get_engine().tracer.observe("app.render", time.perf_counter() - render_started)
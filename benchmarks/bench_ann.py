@@ -0,0 +1,72 @@
+"""
+Benchmark: recall@k and query latency of the IVF index vs. exact search.
+
+Synthetic embeddings are drawn around random topic centres so that the data
+has the cluster structure real text embeddings have.
+
+Usage:
+    python benchmarks/bench_ann.py --rows 100000 --dim 256 --k 10
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ann_index import IVFIndex, _normalise
+
+
+def make_corpus(rows, dim, topics, seed):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((topics, dim)).astype(np.float32)
+    labels = rng.integers(0, topics, rows)
+    vectors = centres[labels] + 1.2 * rng.standard_normal((rows, dim)).astype(np.float32)
+    queries = centres[rng.integers(0, topics, 200)] + 1.2 * rng.standard_normal((200, dim)).astype(np.float32)
+    return _normalise(vectors), _normalise(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--n-lists", type=int, default=None, help="default: sqrt(rows)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    vectors, queries = make_corpus(args.rows, args.dim, args.topics, seed=0)
+    chunk_ids = [f"chunk-{i}" for i in range(args.rows)]
+
+    # Exact ground truth with one matrix product per query
+    start = time.perf_counter()
+    truth = []
+    for query in queries:
+        scores = vectors @ query
+        truth.append(set(np.argpartition(-scores, args.k - 1)[:args.k]))
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    index = IVFIndex(args.dim, n_lists=args.n_lists, min_train_size=1)
+    index.train(chunk_ids, vectors)
+    train_s = time.perf_counter() - start
+
+    print(f"rows={args.rows} dim={args.dim} k={args.k} lists={len(index.centroids)} train={train_s:.1f}s")
+    print(f"exact search: {exact_ms:7.2f} ms/query  recall@{args.k}=1.000")
+
+    for nprobe in args.nprobe:
+        hits = 0
+        start = time.perf_counter()
+        results = [index.search(query, args.k, nprobe=nprobe) for query in queries]
+        ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        for expected, result in zip(truth, results):
+            hits += len(expected & {int(chunk_id.split("-")[1]) for chunk_id, _ in result})
+        recall = hits / (args.k * len(queries))
+        print(f"ivf nprobe={nprobe:<3}: {ann_ms:7.2f} ms/query  recall@{args.k}={recall:.3f}  "
+              f"speedup={exact_ms / ann_ms:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
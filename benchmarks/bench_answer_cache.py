@@ -0,0 +1,75 @@
+"""
+Benchmark: answer-cache hits for repeated, re-cased and reworded questions.
+
+Asks each question of a pair once, then its variant, through
+QueryEngine.answer() against a local stub LLM, with the full knowledge base
+(--budget 0, the same context for every question) and with retrieval. Prints
+exact and similar hits and the upstream calls saved. Exits non-zero when a
+variant misses with the full knowledge base, where only the question
+differs, so it guards the cache keys against the question leaking into the
+cache scope. No network or API key needed.
+
+Usage:
+    python benchmarks/bench_answer_cache.py
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine import QueryEngine, RETRIEVAL_TOKEN_BUDGET
+from stub_servers import StubProfile, start_stub_server
+
+MODEL = "anthropic/claude-3-haiku"
+# (first question, re-cased or reworded variant)
+PAIRS = (
+    ("Who founded Vadilal and when?", "who founded vadilal and when"),
+    ("What is Vadilal's export strategy?", "What is Vadilal's export strategy"),
+    ("What are the key trends in the Indian ice cream industry?", "Key trends in the Indian ice cream industry?"),
+    ("How strong is Vadilal's distribution network in India?",
+     "How strong is Vadilal's distribution network in India today?"),
+)
+
+
+def run(base_url, budget):
+    engine = QueryEngine(":memory:", provider_urls={"openrouter": f"{base_url}/api/v1/chat/completions"},
+                         faq_warmup=False)
+    missed = []
+    for question, variant in PAIRS:
+        engine.answer(question, "openrouter", "key", MODEL, token_budget=budget, use_precomputed=False)
+        before = engine.response_cache.stats()
+        engine.answer(variant, "openrouter", "key", MODEL, token_budget=budget, use_precomputed=False)
+        if engine.response_cache.stats()["misses"] > before["misses"]:
+            missed.append(variant)
+    stats = engine.response_cache.stats()
+    engine.close()
+    return stats, missed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=int, default=RETRIEVAL_TOKEN_BUDGET, help="retrieval budget to compare")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(profile=StubProfile(first_token_delay=0.01, token_interval=0.001,
+                                                             tokens=10))
+    failed = False
+    for budget in (0, args.budget):
+        calls = len(server.requests)
+        stats, missed = run(base_url, budget)
+        label = "full knowledge base" if not budget else f"budget {budget}"
+        print(f"{label:20s} exact hits {stats['exact_hits']} | similar hits {stats['similar_hits']} "
+              f"| misses {stats['misses']} | upstream calls {len(server.requests) - calls} for {2 * len(PAIRS)} questions")
+        for variant in missed:
+            print(f"  miss: {variant}")
+        # With retrieval a reworded question may select other chunks, i.e. another context
+        failed |= not budget and bool(missed)
+
+    server.shutdown()
+    if failed:
+        print("FAIL: a re-cased or reworded question missed the answer cache with an identical context")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: knowledge context size with and without context compression.
+
+Builds the retriever over the built-in knowledge twice, uncompressed and
+compressed, and for a set of questions prints the estimated tokens of the
+knowledge context each one sends, for retrieval within --budget and for the
+full knowledge base (budget 0), plus how many contexts still contain the
+fact the question asks about. No network or API key needed.
+
+Usage:
+    python benchmarks/bench_compression.py --budget 1500
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from knowledge_base import load_documents
+from retrieval import KnowledgeRetriever, estimate_tokens
+
+# Question -> text the context must contain to answer it
+QUESTIONS = {
+    "When was Vadilal founded and by whom?": "Vadilal Gandhi",
+    "Where are Vadilal's manufacturing plants?": "Pundhra",
+    "What is the production capacity of the Bareilly plant?": "100 metric tons per day",
+    "What was the consolidated revenue in FY 2023-24?": "1125.33",
+    "What is the promoter holding?": "64.73",
+    "Who are Vadilal's competitors and their market shares?": "Amul",
+    "How many countries does Vadilal export to?": "45 countries",
+    "What is the size of the Indian ice cream market?": "USD 3.68 billion",
+    "What did Hocco raise?": "100 crore",
+    "How big is Vadilal's distribution network?": "125,000 dealers",
+    "What sustainability initiatives are there in the industry?": "sustainable",
+    "What is the debt-to-equity ratio?": "debt-to-equity ratio",
+}
+
+
+def measure(retriever, budget):
+    sizes = []
+    covered = 0
+    for question, fact in QUESTIONS.items():
+        text = retriever.build_context(question, token_budget=budget)
+        sizes.append(estimate_tokens(text))
+        covered += fact in text
+    return sorted(sizes), covered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=int, default=1500)
+    args = parser.parse_args()
+
+    documents = load_documents()
+    retrievers = {}
+    for name, compress in (("uncompressed", False), ("compressed", True)):
+        started = time.perf_counter()
+        retrievers[name] = KnowledgeRetriever(documents, compress=compress)
+        print(f"{name:12s} index: {len(retrievers[name].chunks)} chunks in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    report = retrievers["compressed"].compression
+    print(f"compression: {report['references']} reference lines moved to the lookup table, "
+          f"{report['duplicate_sentences']} duplicate sentences dropped")
+
+    for budget in (args.budget, 0):
+        label = f"budget {budget}" if budget else "full knowledge base"
+        for name, retriever in retrievers.items():
+            sizes, covered = measure(retriever, budget)
+            print(f"{label:20s} {name:12s} context tokens median {sizes[len(sizes) // 2]:6d} | "
+                  f"total {sum(sizes):7d} | facts present {covered}/{len(QUESTIONS)}")
+
+    compressed = retrievers["compressed"]
+    reports = [compressed.context(question, token_budget=args.budget) for question in QUESTIONS]
+    before = sum(report["tokens_before"] for report in reports)
+    after = sum(report["tokens_after"] for report in reports)
+    print(f"per-request report, budget {args.budget}: {before} -> {after} tokens ({1 - after / before:.0%} saved), "
+          f"{sum(report['sources'] for report in reports) / len(reports):.1f} sources per request")
+
+
+if __name__ == "__main__":
+    main()
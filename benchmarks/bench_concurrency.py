@@ -0,0 +1,108 @@
+"""
+Load test: many simulated Streamlit sessions sharing one StorageHandler.
+
+Each session thread mixes reads (get_text_data, search, get_cached_embeddings)
+with occasional writes (save_embeddings) and checks every result it gets
+back, so cross-thread corruption shows up as errors rather than bad answers.
+--serialize wraps every call in one global lock to compare with the old
+"serialise all storage access" alternative.
+
+Usage:
+    python benchmarks/bench_concurrency.py --sessions 64 --ops 200
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage_handler import StorageHandler
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--ops", type=int, default=200, help="operations per session")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    parser.add_argument("--serialize", action="store_true")
+    parser.add_argument("--snapshot", action="store_true", help="search through the mmap snapshot")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.rows, args.dim)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = StorageHandler(os.path.join(tmp, "load.db"), use_snapshot=args.snapshot)
+        storage.save_text_data("Vadilal knowledge base")
+        storage.save_embeddings_bulk((f"chunk-{i}", f"content {i}", v) for i, v in enumerate(vectors))
+
+        global_lock = threading.Lock() if args.serialize else None
+        latencies = []
+        errors = []
+        results_lock = threading.Lock()
+        start_barrier = threading.Barrier(args.sessions)
+
+        def call(fn, *fn_args):
+            if global_lock:
+                with global_lock:
+                    return fn(*fn_args)
+            return fn(*fn_args)
+
+        def session(session_no):
+            local_rng = random.Random(session_no)
+            local_latencies = []
+            start_barrier.wait()
+            for op in range(args.ops):
+                row = local_rng.randrange(args.rows)
+                started = time.perf_counter()
+                try:
+                    if local_rng.random() < args.write_ratio:
+                        call(storage.save_embeddings, f"session-{session_no}-{op}", f"note {op}", vectors[row])
+                    elif op % 3 == 0:
+                        if call(storage.get_text_data) != "Vadilal knowledge base":
+                            raise AssertionError("wrong text data")
+                    else:
+                        hits = call(storage.search, vectors[row], 3)
+                        if hits[0]["score"] < 0.999:
+                            raise AssertionError(f"wrong top hit for chunk-{row}: {hits[0]}")
+                except Exception as e:
+                    with results_lock:
+                        errors.append(repr(e))
+                local_latencies.append(time.perf_counter() - started)
+            with results_lock:
+                latencies.extend(local_latencies)
+
+        threads = [threading.Thread(target=session, args=(i,)) for i in range(args.sessions)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        storage.close()
+
+    total = args.sessions * args.ops
+    mode = "serialized" if args.serialize else "pooled"
+    print(f"{mode}: {args.sessions} sessions x {args.ops} ops in {elapsed:.2f}s -> {total / elapsed:,.0f} ops/s")
+    print(f"latency p50={percentile(latencies, 50) * 1000:.2f} ms  "
+          f"p95={percentile(latencies, 95) * 1000:.2f} ms  p99={percentile(latencies, 99) * 1000:.2f} ms")
+    print(f"errors: {len(errors)}")
+    for error in errors[:5]:
+        print("  ", error)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+End-to-end offline benchmark of the query pipeline, with a stored baseline.
+
+Local stubs stand in for the LLM provider and for SerpAPI / DuckDuckGo (see
+stub_servers.py for the latency, streaming and failure profiles). A fresh
+QueryEngine on a temporary database answers a fixed, seeded workload of
+questions (some repeated, some with web search) at each concurrency level,
+headlessly through stream_answer(). Per level it reports:
+    latency and time-to-first-token p50/p95/p99, throughput, errors
+    prompt bytes and prompt tokens per LLM call
+    answer-cache and search-cache hit rates, fast-path (facts/FAQ) answers
+plus StorageHandler throughput (chat message writes through the writer
+queue and reads on per-thread connections).
+
+The scheduler's rate limits are lifted so the numbers measure the pipeline,
+not the providers' quotas (bench_scheduler.py covers those).
+
+Results are compared with benchmarks/baseline_e2e.json when it was recorded
+with the same settings; any metric worse than its tolerance is reported as
+a REGRESSION and the script exits non-zero. Timings depend on the machine:
+record the baseline (--save-baseline) where the check runs, and again after
+an intended change.
+
+Usage:
+    python benchmarks/bench_e2e.py
+    python benchmarks/bench_e2e.py --concurrency 1,4,16 --requests 40 --save-baseline
+    python benchmarks/bench_e2e.py --llm-fail mid_stream --search-fail http_500
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine import QueryEngine, MODEL_OPTIONS
+from scheduler import RequestScheduler, DEFAULT_LIMITS
+from storage_handler import StorageHandler
+from stub_servers import StubProfile, SearchStubHandler, start_stub_server
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_e2e.json")
+
+QUESTIONS = (
+    "What is the history of Vadilal?",
+    "Where are Vadilal's manufacturing plants?",
+    "Who are Vadilal's main competitors?",
+    "How has Vadilal's revenue grown over the last three years?",
+    "Why did Vadilal's net profit increase in FY 2023-24?",
+    "What is Vadilal's export strategy?",
+    "How does Vadilal compete with Amul?",
+    "What are the key trends in the Indian ice cream industry?",
+    "What are Vadilal's sustainability initiatives?",
+    "How strong is Vadilal's distribution network?",
+    "What risks does Vadilal face?",
+    "What is Vadilal's segment-wise revenue breakdown?",
+    "net profit FY 2022-23",
+    "promoter holding",
+)
+# Questions asked with web search enabled
+WEB_QUESTIONS = (
+    "What is the latest news about Vadilal?",
+    "Has Vadilal announced any new plants recently?",
+    "What is Vadilal's current share price?",
+)
+
+# metric -> (better direction, relative tolerance, absolute slack)
+METRIC_RULES = {
+    "latency_p50_ms": ("lower", 0.25, 10.0),
+    "latency_p95_ms": ("lower", 0.25, 20.0),
+    "latency_p99_ms": ("lower", 0.25, 20.0),
+    "ttft_p50_ms": ("lower", 0.25, 10.0),
+    "ttft_p95_ms": ("lower", 0.25, 20.0),
+    "ttft_p99_ms": ("lower", 0.25, 20.0),
+    "throughput_rps": ("higher", 0.25, 0.0),
+    "errors": ("lower", 0.0, 0.0),
+    "llm_calls": ("lower", 0.1, 2.0),
+    "prompt_bytes": ("lower", 0.05, 0.0),
+    "prompt_tokens": ("lower", 0.05, 0.0),
+    "response_cache_hit_rate": ("higher", 0.0, 0.05),
+    "search_cache_hit_rate": ("higher", 0.0, 0.05),
+    "storage_writes_per_s": ("higher", 0.4, 0.0),
+    "storage_reads_per_s": ("higher", 0.4, 0.0),
+}
+# Under concurrency, identical questions race: whether a repeat hits the
+# cache or is coalesced with the call in flight varies from run to run
+# (llm_calls covers both), so hit rates are only compared at the lowest level
+ORDER_DEPENDENT = {"response_cache_hit_rate", "search_cache_hit_rate"}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def workload(n, web_ratio, seed):
+    """Seeded list of (question, web search) pairs; repeats are what the caches can hit."""
+    rng = random.Random(seed)
+    return [(rng.choice(WEB_QUESTIONS), True) if rng.random() < web_ratio else (rng.choice(QUESTIONS), False)
+            for _ in range(n)]
+
+
+def ask(engine, model, question, web_search):
+    """Run one question; returns its timings, prompt tokens and outcome."""
+    started = time.perf_counter()
+    result = {"ttft": None, "prompt_tokens": 0, "error": False, "fast_path": False}
+    for event in engine.stream_answer(question, "openrouter", "key", model, enable_web_search=web_search,
+                                      serp_api_key="key"):
+        if event["type"] == "text" and result["ttft"] is None:
+            result["ttft"] = time.perf_counter() - started
+        elif event["type"] in ("facts", "faq"):
+            result["fast_path"] = True
+        elif event["type"] == "usage":
+            # OpenRouter's prompt_tokens already include the cached ones
+            result["prompt_tokens"] += event["usage"]["input_tokens"]
+        elif event["type"] == "error":
+            result["error"] = True
+    result["latency"] = time.perf_counter() - started
+    return result
+
+
+def run_level(concurrency, jobs, urls, llm, model):
+    """Answer `jobs` with `concurrency` workers on a fresh engine; returns the level's metrics."""
+    with tempfile.TemporaryDirectory() as tmp:
+        scheduler = RequestScheduler(limits={provider: (1000.0, 1000) for provider in DEFAULT_LIMITS})
+        engine = QueryEngine(os.path.join(tmp, "bench.db"), provider_urls=urls, scheduler=scheduler,
+                             faq_warmup=False)
+        calls_before = len(llm.requests)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda job: ask(engine, model, *job), jobs))
+        elapsed = time.perf_counter() - started
+        stats = engine.stats()
+        engine.close()
+
+    llm_calls = llm.requests[calls_before:]
+    latencies = [r["latency"] * 1000 for r in results]
+    ttfts = [r["ttft"] * 1000 for r in results if r["ttft"] is not None]
+    metrics = {
+        "requests": len(results),
+        "errors": sum(r["error"] for r in results),
+        "throughput_rps": len(results) / elapsed,
+        "llm_calls": len(llm_calls),
+        "fast_path": sum(r["fast_path"] for r in results),
+        "prompt_bytes": sum(len(json.dumps(call["body"])) for call in llm_calls) / len(llm_calls) if llm_calls else 0,
+        "prompt_tokens": sum(r["prompt_tokens"] for r in results) / len(llm_calls) if llm_calls else 0,
+        "response_cache_hit_rate": stats["response_cache"]["hit_rate"],
+        "search_cache_hit_rate": stats["search_cache"]["hit_rate"],
+    }
+    for pct in (50, 95, 99):
+        metrics[f"latency_p{pct}_ms"] = percentile(latencies, pct)
+        metrics[f"ttft_p{pct}_ms"] = percentile(ttfts, pct)
+    return metrics
+
+
+def storage_throughput(threads, operations):
+    """Chat message writes/s (through the writer queue) and reads/s (per-thread connections)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = StorageHandler(os.path.join(tmp, "storage.db"))
+        per_thread = max(1, operations // threads)
+
+        def timed(fn):
+            barrier = threading.Barrier(threads)
+
+            def worker(i):
+                barrier.wait()
+                for n in range(per_thread):
+                    fn(i, n)
+
+            started = time.perf_counter()
+            workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            return threads * per_thread / (time.perf_counter() - started)
+
+        writes = timed(lambda i, n: storage.append_chat_message(f"session-{i}", "user", f"message {n} " * 20))
+        reads = timed(lambda i, n: storage.get_chat_messages(f"session-{i}", 20, before_id=per_thread * threads - n))
+        storage.close()
+    return {"storage_writes_per_s": writes, "storage_reads_per_s": reads}
+
+
+def compare(results, baseline, tolerance, serial_section):
+    """Regression messages for metrics worse than the baseline beyond their tolerance."""
+    regressions = []
+    for section, metrics in results.items():
+        for name, value in metrics.items():
+            reference = baseline.get(section, {}).get(name)
+            if reference is None or name not in METRIC_RULES:
+                continue
+            if name in ORDER_DEPENDENT and section != serial_section:
+                continue
+            direction, relative, slack = METRIC_RULES[name]
+            if direction == "lower":
+                limit = reference * (1 + relative * tolerance) + slack * tolerance
+                worse = value > limit
+            else:
+                limit = reference * (1 - relative * tolerance) - slack * tolerance
+                worse = value < limit
+            if worse:
+                regressions.append(f"{section} {name}: {value:.3f} vs baseline {reference:.3f} (limit {limit:.3f})")
+    return regressions
+
+
+def print_level(name, metrics):
+    print(f"{name:>15s}: {metrics['throughput_rps']:6.1f} req/s | latency p50/p95/p99 "
+          f"{metrics['latency_p50_ms']:6.0f}/{metrics['latency_p95_ms']:6.0f}/{metrics['latency_p99_ms']:6.0f} ms "
+          f"| TTFT p50/p95/p99 {metrics['ttft_p50_ms']:5.0f}/{metrics['ttft_p95_ms']:5.0f}/{metrics['ttft_p99_ms']:5.0f} ms "
+          f"| errors {metrics['errors']}")
+    print(f"{'':>15s}  {metrics['llm_calls']} LLM calls, {metrics['prompt_bytes']:.0f} prompt bytes / "
+          f"{metrics['prompt_tokens']:.0f} tokens per call | answer cache {metrics['response_cache_hit_rate']:.0%} "
+          f"| search cache {metrics['search_cache_hit_rate']:.0%} | fast path {metrics['fast_path']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=40, help="questions per level")
+    parser.add_argument("--web-ratio", type=float, default=0.2, help="share of questions with web search")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--token-interval", type=float, default=0.005)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--search-delay", type=float, default=0.15)
+    parser.add_argument("--llm-fail", choices=("http_429", "http_500", "mid_stream"), default=None)
+    parser.add_argument("--search-fail", choices=("http_429", "http_500"), default=None)
+    parser.add_argument("--storage-ops", type=int, default=2000)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="scale every metric's allowed regression")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    config = {key: getattr(args, key) for key in ("requests", "web_ratio", "seed", "first_token_delay",
+                                                  "token_interval", "tokens", "search_delay", "llm_fail",
+                                                  "search_fail", "storage_ops")}
+    model = MODEL_OPTIONS["openrouter"]["Claude 3 Haiku"]
+
+    llm, llm_url = start_stub_server(profile=StubProfile(
+        first_token_delay=args.first_token_delay, token_interval=args.token_interval, tokens=args.tokens,
+        fail=args.llm_fail))
+    search, search_url = start_stub_server(SearchStubHandler, StubProfile(
+        first_token_delay=args.search_delay, fail=args.search_fail))
+    urls = {"openrouter": f"{llm_url}/api/v1/chat/completions", "serpapi": f"{search_url}/search",
+            "duckduckgo": f"{search_url}/html/"}
+
+    jobs = workload(args.requests, args.web_ratio, args.seed)
+    results = {}
+    for concurrency in levels:
+        name = f"concurrency {concurrency}"
+        results[name] = run_level(concurrency, jobs, urls, llm, model)
+        print_level(name, results[name])
+    results["storage"] = storage_throughput(max(levels), args.storage_ops)
+    print(f"{'storage':>15s}: {results['storage']['storage_writes_per_s']:8.0f} writes/s | "
+          f"{results['storage']['storage_reads_per_s']:8.0f} reads/s ({max(levels)} threads)")
+    llm.shutdown()
+    search.shutdown()
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "results": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("no baseline yet; record one with --save-baseline")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("config") != config:
+        print("baseline was recorded with different settings; not compared")
+        return
+    regressions = compare(results, baseline["results"], args.tolerance, f"concurrency {min(levels)}")
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if regressions:
+        sys.exit(f"{len(regressions)} metric(s) regressed against {args.baseline}")
+    print("no regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: legacy base64/JSON embedding decode loop vs. packed float32 blobs
+and the vectorized StorageHandler.search().
+
+Usage:
+    python benchmarks/bench_embeddings.py --rows 20000 --dim 384
+"""
+import os
+import sys
+import json
+import time
+import base64
+import sqlite3
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage_handler import StorageHandler
+
+
+def legacy_load_and_search(db_path, query, k):
+    """Today's path: decode every row into Python lists, then score in a loop."""
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT chunk_id, chunk_content, embedding FROM legacy_embeddings").fetchall()
+    conn.close()
+
+    embeddings = {}
+    for chunk_id, chunk_content, embedding_binary in rows:
+        embeddings[chunk_id] = {
+            "content": chunk_content,
+            "embedding": json.loads(base64.b64decode(embedding_binary))
+        }
+
+    q_norm = sum(x * x for x in query) ** 0.5
+    scored = []
+    for chunk_id, item in embeddings.items():
+        vec = item["embedding"]
+        dot = sum(a * b for a, b in zip(vec, query))
+        v_norm = sum(x * x for x in vec) ** 0.5
+        scored.append((dot / (q_norm * v_norm or 1.0), chunk_id))
+    scored.sort(reverse=True)
+    return scored[:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.rows, args.dim)).astype(np.float32)
+    query = vectors[42] + 0.01 * rng.standard_normal(args.dim).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        storage = StorageHandler(db_path)
+
+        # Populate both layouts with the same data
+        def populate(conn):
+            conn.execute("CREATE TABLE legacy_embeddings (chunk_id TEXT, chunk_content TEXT, embedding BLOB)")
+            conn.executemany(
+                "INSERT INTO legacy_embeddings VALUES (?, ?, ?)",
+                ((f"chunk-{i}", f"content {i}", base64.b64encode(json.dumps(v.tolist()).encode()))
+                 for i, v in enumerate(vectors))
+            )
+            conn.executemany(
+                "INSERT INTO embeddings (chunk_id, chunk_content, embedding, dim) VALUES (?, ?, ?, ?)",
+                ((f"chunk-{i}", f"content {i}", v.tobytes(), args.dim) for i, v in enumerate(vectors))
+            )
+        storage.run_write(populate)
+
+        legacy_bytes, packed_bytes = storage.conn.execute(
+            "SELECT (SELECT SUM(LENGTH(embedding)) FROM legacy_embeddings), "
+            "(SELECT SUM(LENGTH(embedding)) FROM embeddings)"
+        ).fetchone()
+
+        start = time.perf_counter()
+        legacy = legacy_load_and_search(db_path, query.tolist(), args.k)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = storage.search(query, args.k)
+        cold_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        storage.search(query, args.k)
+        warm_time = time.perf_counter() - start
+
+        storage.close()
+
+    assert legacy[0][1] == results[0]["chunk_id"], "top hit differs between implementations"
+
+    print(f"rows={args.rows} dim={args.dim} k={args.k}")
+    print(f"storage   legacy base64/JSON: {legacy_bytes / 1e6:8.1f} MB")
+    print(f"storage   packed float32    : {packed_bytes / 1e6:8.1f} MB  ({legacy_bytes / packed_bytes:.1f}x smaller)")
+    print(f"load+search legacy loop     : {legacy_time * 1000:8.1f} ms")
+    print(f"load+search matrix (cold)   : {cold_time * 1000:8.1f} ms  ({legacy_time / cold_time:.0f}x faster)")
+    print(f"search matrix (warm)        : {warm_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
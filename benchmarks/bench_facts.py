@@ -0,0 +1,88 @@
+"""
+Benchmark: direct metric lookups from the financial facts table versus the
+full LLM path.
+
+Times the intent matcher alone (lookups it answers and questions it passes
+on), then runs the same lookup questions through QueryEngine.answer() twice:
+with the facts fast path and with it disabled, against a local stub LLM
+(--first-token-delay), so no network or API key is needed.
+
+Usage:
+    python benchmarks/bench_facts.py --first-token-delay 0.3
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine import QueryEngine
+from financial_facts import FactIndex
+from stub_servers import StubProfile, start_stub_server
+
+LOOKUPS = (
+    "net profit FY 2022-23",
+    "promoter holding",
+    "What was Vadilal's revenue in FY 2023-24?",
+    "net profit margin FY23",
+    "capex FY 2022-23",
+    "What is the EBITDA margin?",
+    "How much long-term debt did Vadilal have in FY 2021-22?",
+    "FII holding",
+)
+NOT_LOOKUPS = (
+    "Why did Vadilal's net profit grow so much in FY 2022-23?",
+    "Compare revenue in FY23 and FY24",
+    "Who are the promoters of Vadilal?",
+    "What are Vadilal's sales channels?",
+)
+
+
+def time_matcher(index, questions, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for question in questions:
+            index.answer(question)
+    return (time.perf_counter() - started) / (repeat * len(questions)) * 1e6
+
+
+def time_answers(engine):
+    timings = []
+    for question in LOOKUPS:
+        started = time.perf_counter()
+        result = engine.answer(question, "openrouter", "key", "anthropic/claude-3-haiku")
+        timings.append(time.perf_counter() - started)
+        assert result["answer"] and not result["error"], result
+    return sorted(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(profile=StubProfile(
+        first_token_delay=args.first_token_delay, token_interval=0.01, tokens=30))
+    urls = {"openrouter": f"{base_url}/api/v1/chat/completions"}
+
+    engine = QueryEngine(":memory:", provider_urls=urls)
+    answered = sum(engine.facts.answer(question) is not None for question in LOOKUPS)
+    passed_on = sum(engine.facts.answer(question) is None for question in NOT_LOOKUPS)
+    print(f"facts stored {len(engine.facts)} | lookups answered {answered}/{len(LOOKUPS)} "
+          f"| other questions passed on {passed_on}/{len(NOT_LOOKUPS)}")
+    print(f"matcher: lookup {time_matcher(engine.facts, LOOKUPS, args.repeat):6.1f} us "
+          f"| pass-on {time_matcher(engine.facts, NOT_LOOKUPS, args.repeat):6.1f} us")
+
+    for name, facts in (("facts fast path", engine.facts), ("LLM path", FactIndex([]))):
+        engine.facts = facts
+        timings = time_answers(engine)
+        print(f"{name:16s} answer median {timings[len(timings) // 2] * 1000:8.2f} ms "
+              f"| max {timings[-1] * 1000:8.2f} ms | upstream calls so far {len(server.requests)}")
+
+    engine.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
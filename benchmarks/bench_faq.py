@@ -0,0 +1,90 @@
+"""
+Benchmark: precomputed FAQ answers versus the full LLM path.
+
+Warms the FAQ answers up against a local stub LLM (--first-token-delay),
+then asks paraphrases of the FAQ questions with the precomputed answers
+and without them, and finally changes the stored knowledge text to show
+that the answers are regenerated for the new knowledge version. No network
+or API key needed.
+
+Usage:
+    python benchmarks/bench_faq.py --first-token-delay 0.3
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine import QueryEngine
+from stub_servers import StubProfile, start_stub_server
+
+MODEL = "anthropic/claude-3-haiku"
+PARAPHRASES = (
+    "Where are Vadilal's factories?",
+    "who founded vadilal",
+    "What's Vadilal's market share in India?",
+    "Who are Vadilal's competitors?",
+    "What products does Vadilal make?",
+    "What is the distribution network of Vadilal?",
+    "What are the ice cream industry trends?",
+    "Who owns Vadilal?",
+)
+
+
+def wait_for_warm_up(engine):
+    started = time.perf_counter()
+    # The warm-up thread may not have picked up a version change yet
+    engine.faq.refresh()
+    while engine.faq.stats()["warming"]:
+        time.sleep(0.01)
+    return time.perf_counter() - started
+
+
+def time_answers(engine, use_precomputed):
+    timings = []
+    hits = 0
+    for question in PARAPHRASES:
+        started = time.perf_counter()
+        result = engine.answer(question, "openrouter", "key", MODEL, use_precomputed=use_precomputed)
+        timings.append(time.perf_counter() - started)
+        hits += result["faq"] is not None
+    return sorted(timings), hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(profile=StubProfile(
+        first_token_delay=args.first_token_delay, token_interval=0.01, tokens=30))
+    engine = QueryEngine(":memory:", provider_urls={"openrouter": f"{base_url}/api/v1/chat/completions"},
+                         faq_settings={"provider": "openrouter", "api_key": "key", "model": MODEL})
+    # Answers to the paraphrases must not come from the answer cache either
+    engine.response_cache.similarity_threshold = None
+
+    seconds = wait_for_warm_up(engine)
+    stats = engine.faq.stats()
+    print(f"warm-up: {stats['answered']}/{stats['questions']} answers in {seconds:.2f}s "
+          f"({len(server.requests)} upstream calls)")
+
+    for name, use_precomputed in (("precomputed", True), ("LLM path", False)):
+        calls = len(server.requests)
+        timings, hits = time_answers(engine, use_precomputed)
+        print(f"{name:12s} answer median {timings[len(timings) // 2] * 1000:8.2f} ms | max {timings[-1] * 1000:8.2f} ms "
+              f"| FAQ hits {hits}/{len(PARAPHRASES)} | upstream calls {len(server.requests) - calls}")
+
+    calls = len(server.requests)
+    engine.storage.save_text_data("Updated knowledge text")
+    seconds = wait_for_warm_up(engine)
+    stats = engine.faq.stats()
+    print(f"knowledge changed: {stats['answered']}/{stats['questions']} answers regenerated in {seconds:.2f}s "
+          f"({len(server.requests) - calls} upstream calls)")
+
+    engine.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
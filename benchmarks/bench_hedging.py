@@ -0,0 +1,98 @@
+"""
+Benchmark: hedged requests and failover with the provider router.
+
+Two local stub LLM servers stand in for OpenRouter (primary) and Anthropic
+(secondary). The primary has a latency tail: --tail-probability of its
+requests wait --tail-delay seconds for the first token. Questions are asked
+one after another and time-to-first-token percentiles are compared between
+calling the primary alone and routing with hedging. A second run makes the
+primary fail with HTTP 500 to show failover and the circuit breaker (the
+primary stops being called once its circuit opens).
+
+Usage:
+    python benchmarks/bench_hedging.py --questions 200 --tail-probability 0.05 --tail-delay 3
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_providers import ProviderError, stream_openrouter, stream_anthropic
+from provider_router import ProviderRouter
+from stub_servers import StubProfile, start_stub_server
+from bench_ttft import measure_stream
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def candidates(primary_url, secondary_url, question):
+    messages = [{"role": "user", "content": question}]
+    return [
+        ("openrouter", "anthropic/claude-3-haiku",
+         lambda: stream_openrouter("key", "anthropic/claude-3-haiku", messages,
+                                   url=f"{primary_url}/api/v1/chat/completions")),
+        ("anthropic", "claude-3-haiku-20240307",
+         lambda: stream_anthropic("key", "claude-3-haiku-20240307", "", messages,
+                                  url=f"{secondary_url}/v1/messages")),
+    ]
+
+
+def run(name, questions, ask):
+    ttfts = []
+    failures = 0
+    hedged = failed_over = 0
+    for i in range(questions):
+        route = {}
+        try:
+            ttft, _, _ = measure_stream(ask(f"question {i}", route))
+            ttfts.append(ttft)
+        except ProviderError:
+            failures += 1
+        hedged += bool(route.get("hedged"))
+        failed_over += bool(route.get("failed_over"))
+    line = f"{name:16s}"
+    if ttfts:
+        line += (f" TTFT p50 {percentile(ttfts, 50) * 1000:6.0f} ms | p95 {percentile(ttfts, 95) * 1000:6.0f} ms"
+                 f" | p99 {percentile(ttfts, 99) * 1000:6.0f} ms")
+    print(f"{line} | failed {failures} | hedged {hedged} | failed over {failed_over}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--first-token-delay", type=float, default=0.1)
+    parser.add_argument("--tail-probability", type=float, default=0.05)
+    parser.add_argument("--tail-delay", type=float, default=3.0)
+    args = parser.parse_args()
+
+    primary, primary_url = start_stub_server(profile=StubProfile(
+        first_token_delay=args.first_token_delay, token_interval=0.0, tokens=5,
+        tail_probability=args.tail_probability, tail_delay=args.tail_delay))
+    secondary, secondary_url = start_stub_server(profile=StubProfile(
+        first_token_delay=args.first_token_delay * 1.5, token_interval=0.0, tokens=5))
+
+    run("primary only", args.questions,
+        lambda question, route: candidates(primary_url, secondary_url, question)[0][2]())
+
+    router = ProviderRouter(min_hedge_delay=args.first_token_delay * 2)
+    run("hedged", args.questions,
+        lambda question, route: router.stream(candidates(primary_url, secondary_url, question), route))
+    print(f"{'':16s} upstream calls: primary {len(primary.requests)}, secondary {len(secondary.requests)}")
+
+    # Failover: the primary starts failing; its circuit opens after a few errors
+    primary.profile.fail = "http_500"
+    calls_before = len(primary.requests)
+    run("primary failing", 50,
+        lambda question, route: router.stream(candidates(primary_url, secondary_url, question), route))
+    print(f"{'':16s} calls to the failing primary: {len(primary.requests) - calls_before} of 50 "
+          f"(circuit {router.stats()['openrouter/anthropic/claude-3-haiku']['state']})")
+
+    primary.shutdown()
+    secondary.shutdown()
+
+
+if __name__ == "__main__":
+    main()
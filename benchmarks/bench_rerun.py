@@ -0,0 +1,80 @@
+"""
+Benchmark: wall time of one Streamlit rerun of app.py.
+
+Every widget interaction reruns the whole script, so this is the latency a
+user feels on each click. The app is driven headlessly with AppTest: one cold
+run (builds the engine: retriever, SQLite, caches), then repeated reruns with
+a long stored conversation and no question asked. Exits non-zero
+when the median rerun exceeds the target, so it can guard against
+regressions (something heavy creeping back into the script body).
+
+Usage:
+    python benchmarks/bench_rerun.py
+    python benchmarks/bench_rerun.py --messages 500 --runs 30 --target-ms 100
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from chat_store import ChatSession
+from history import DEFAULT_HISTORY_BUDGET
+from storage_handler import StorageHandler
+
+APP_PATH = os.path.join(ROOT, "app.py")
+
+# Median wall time of a warm rerun with the default conversation length
+RERUN_TARGET_MS = 75
+
+
+def conversation(n_messages, words=40):
+    """A stored chat session with `n_messages` messages (in a throwaway in-memory database)."""
+    chat = ChatSession(StorageHandler(":memory:"))
+    for i in range(n_messages):
+        chat.append("user" if i % 2 == 0 else "assistant", " ".join([f"message {i}"] * words))
+        if i % 2:
+            # Fold history as answering the next question would
+            chat.history_window.window(chat.messages, DEFAULT_HISTORY_BUDGET)
+    return chat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200, help="messages in the stored conversation")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--target-ms", type=float, default=RERUN_TARGET_MS)
+    args = parser.parse_args()
+
+    app = AppTest.from_file(APP_PATH, default_timeout=60)
+    started = time.perf_counter()
+    app.run()
+    cold = (time.perf_counter() - started) * 1000
+    if app.exception:
+        sys.exit(f"app raised: {app.exception[0].message}")
+
+    app.session_state["chat"] = conversation(args.messages)
+    app.run()  # first render of the conversation
+
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        app.run()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    median = statistics.median(timings)
+    p95 = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+    print(f"cold run:     {cold:8.1f} ms")
+    print(f"rerun median: {median:8.1f} ms  (p95 {p95:.1f} ms, {args.messages} messages, {args.runs} runs)")
+    print(f"elements:     {len(app.markdown)} markdown, {len(app.session_state['chat'].messages)} messages in memory")
+    if median > args.target_ms:
+        sys.exit(f"rerun median {median:.1f} ms exceeds the {args.target_ms:.0f} ms target")
+    print(f"within the {args.target_ms:.0f} ms target")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark: the request scheduler against a rate-limited local stub LLM.
+
+Four scenarios, all over the OpenRouter wire format:
+    coalescing   N threads stream the identical request at the same time;
+                 counts upstream requests (1 expected) and checks that every
+                 caller got the full answer
+    unscheduled  N distinct requests fired at once straight at a stub that
+                 accepts --stub-rate requests/second; counts 429s
+    scheduled    the same requests through RequestScheduler limited just
+                 under the stub's rate; 429s are expected to vanish
+    overdriven   scheduler limit above the stub's rate, so the stub returns
+                 429 + Retry-After; the scheduler pauses and retries
+No network or API key needed.
+
+Usage:
+    python benchmarks/bench_scheduler.py --requests 20 --stub-rate 5
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_providers import ProviderError, stream_openrouter
+from scheduler import RequestScheduler
+from stub_servers import StubProfile, start_stub_server
+
+MODEL = "openai/gpt-3.5-turbo"
+
+
+def run_concurrently(n, fn):
+    """Run fn(i) on n threads started together; returns the results in order."""
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = fn(i)
+        except ProviderError as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def report(name, server, results, started, scheduler=None):
+    errors = [r for r in results if isinstance(r, Exception)]
+    line = (f"{name:12s} upstream requests {len(server.requests):3d} | 429s {server.rejected:3d} "
+            f"| failed calls {len(errors):3d} of {len(results)} | {time.perf_counter() - started:5.2f}s")
+    if scheduler is not None:
+        stats = scheduler.stats().get("openrouter", {})
+        line += f" | coalesced {stats.get('coalesced', 0)} retries {stats.get('retries', 0)}"
+    print(line)
+    for message in sorted({str(e).splitlines()[0] for e in errors}):
+        print(f"{'':12s} error: {message}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--stub-rate", type=float, default=5.0, help="requests/second the stub accepts")
+    parser.add_argument("--tokens", type=int, default=20)
+    args = parser.parse_args()
+
+    profile = StubProfile(first_token_delay=0.2, token_interval=0.005, tokens=args.tokens)
+    expected = "".join(f"token{i} " for i in range(args.tokens))
+
+    def messages(i):
+        return [{"role": "user", "content": f"question {i}"}]
+
+    # Coalescing: identical concurrent requests
+    server, base_url = start_stub_server(profile=profile)
+    url = f"{base_url}/api/v1/chat/completions"
+    scheduler = RequestScheduler()
+    started = time.perf_counter()
+    results = run_concurrently(args.requests, lambda i: "".join(scheduler.stream(
+        "openrouter", lambda: stream_openrouter("key", MODEL, messages(0), url=url), key="same-question")))
+    report("coalescing", server, results, started, scheduler)
+    assert all(r == expected for r in results), "a coalesced caller got a different answer"
+    server.shutdown()
+
+    # Distinct requests against a rate-limited stub
+    profile.rate_limit = args.stub_rate
+    scenarios = (
+        ("unscheduled", None),
+        ("scheduled", RequestScheduler(limits={"openrouter": (args.stub_rate * 0.9, 1)}, max_wait=60)),
+        ("overdriven", RequestScheduler(limits={"openrouter": (args.stub_rate * 4, args.requests)},
+                                        max_wait=60, max_retries=10)),
+    )
+    for name, scheduler in scenarios:
+        server, base_url = start_stub_server(profile=profile)
+        url = f"{base_url}/api/v1/chat/completions"
+
+        def call(i):
+            factory = lambda: stream_openrouter("key", MODEL, messages(i), url=url)
+            return "".join(scheduler.stream("openrouter", factory) if scheduler else factory())
+
+        started = time.perf_counter()
+        report(name, server, run_concurrently(args.requests, call), started, scheduler)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
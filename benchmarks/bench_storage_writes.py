@@ -0,0 +1,84 @@
+"""
+Benchmark: embedding write throughput.
+
+Compares the old per-chunk path (SELECT by chunk_id without an index, then
+UPDATE or INSERT, then commit, rollback journal) with
+StorageHandler.save_embeddings_bulk (unique index, ON CONFLICT upsert via
+executemany, one transaction, WAL). The legacy path is quadratic, so it is
+only run up to --legacy-max rows.
+
+Usage:
+    python benchmarks/bench_storage_writes.py --sizes 10000 100000 1000000 --dim 64
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage_handler import StorageHandler
+
+
+def legacy_writes(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(
+        "CREATE TABLE embeddings (id INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL, "
+        "chunk_content TEXT NOT NULL, embedding BLOB NOT NULL, dim INTEGER)"
+    )
+    for chunk_id, content, blob in rows:
+        cursor.execute("SELECT id FROM embeddings WHERE chunk_id = ?", (chunk_id,))
+        if cursor.fetchone():
+            cursor.execute("UPDATE embeddings SET chunk_content = ?, embedding = ? WHERE chunk_id = ?",
+                           (content, blob, chunk_id))
+        else:
+            cursor.execute("INSERT INTO embeddings (chunk_id, chunk_content, embedding) VALUES (?, ?, ?)",
+                           (chunk_id, content, blob))
+        conn.commit()
+    conn.close()
+
+
+def make_rows(n, dim, rng):
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return [(f"chunk-{i}", f"content of chunk {i}", vectors[i]) for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--legacy-max", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>9} {'legacy rows/s':>14} {'bulk rows/s':>12} {'re-upsert rows/s':>17}")
+    for n in args.sizes:
+        rows = make_rows(n, args.dim, rng)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy_rate = "-"
+            if n <= args.legacy_max:
+                start = time.perf_counter()
+                legacy_writes(os.path.join(tmp, "legacy.db"), ((c, t, v.tobytes()) for c, t, v in rows))
+                legacy_rate = f"{n / (time.perf_counter() - start):,.0f}"
+
+            storage = StorageHandler(os.path.join(tmp, "bulk.db"), use_snapshot=False)
+            start = time.perf_counter()
+            storage.save_embeddings_bulk(rows)
+            bulk_rate = n / (time.perf_counter() - start)
+
+            # Second pass hits ON CONFLICT DO UPDATE for every row
+            start = time.perf_counter()
+            storage.save_embeddings_bulk(rows)
+            update_rate = n / (time.perf_counter() - start)
+            storage.close()
+
+        print(f"{n:>9,} {legacy_rate:>14} {bulk_rate:>12,.0f} {update_rate:>17,.0f}")
+
+
+if __name__ == "__main__":
+    main()
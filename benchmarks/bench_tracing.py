@@ -0,0 +1,87 @@
+"""
+Benchmark: the cost of tracing.
+
+Runs the same questions through two engines, one with tracing on and one
+with it off (TRACING=0): lookups answered from the financial facts table
+(no I/O, so the tracing work is most visible) and questions answered by a
+local stub LLM (--first-token-delay). Then prints what tracing collected:
+the span summary, the trace_spans rows and the size of the Prometheus
+export. No network or API key needed.
+
+Usage:
+    python benchmarks/bench_tracing.py --first-token-delay 0.05
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine import QueryEngine
+from tracing import Tracer
+from stub_servers import StubProfile, start_stub_server
+
+MODEL = "anthropic/claude-3-haiku"
+LOOKUPS = ("net profit FY 2022-23", "promoter holding", "What is the EBITDA margin?", "FII holding")
+QUESTIONS = (
+    "How does Vadilal's cold chain work?",
+    "What is Vadilal's strategy for processed foods?",
+    "Is Vadilal expanding in the United States?",
+    "How seasonal is Vadilal's ice cream business?",
+)
+
+
+def time_answers(engine, questions, repeat):
+    timings = []
+    for _ in range(repeat):
+        for question in questions:
+            started = time.perf_counter()
+            result = engine.answer(question, "openrouter", "key", MODEL)
+            timings.append(time.perf_counter() - started)
+            assert result["answer"] and not result["error"], result
+    return sorted(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=200, help="rounds of the lookup questions")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(profile=StubProfile(
+        first_token_delay=args.first_token_delay, token_interval=0.001, tokens=30))
+    urls = {"openrouter": f"{base_url}/api/v1/chat/completions"}
+
+    engines = {}
+    for name, enabled in (("tracing on", True), ("tracing off", False)):
+        engine = QueryEngine(":memory:", provider_urls=urls, faq_warmup=False)
+        engine.tracer = engine.storage.tracer = Tracer(enabled=enabled, storage=engine.storage)
+        # Every LLM question must reach the stub, not the answer cache
+        engine.response_cache.similarity_threshold = None
+        engines[name] = engine
+
+    for name, engine in engines.items():
+        lookups = time_answers(engine, LOOKUPS, args.repeat)
+        llm = time_answers(engine, QUESTIONS, 1)
+        print(f"{name:12s} facts lookup median {lookups[len(lookups) // 2] * 1e6:8.1f} us "
+              f"| LLM answer median {llm[len(llm) // 2] * 1000:7.2f} ms")
+
+    engine = engines["tracing on"]
+    summary = engine.tracer.summary(recent=1)
+    engine.tracer.flush()
+    # Wait for the writer to store the flushed rows
+    engine.storage.run_write(lambda connection: None)
+    rows = engine.storage.get_trace_spans(0, limit=100000)
+    spans = ", ".join(f"{name} p50 {span['p50_ms']} ms" for name, span in sorted(summary["spans"].items()))
+    print(f"spans: {spans}")
+    last = summary["recent"][0]
+    print(f"last trace: {last['attributes'].get('outcome')} in {last['duration_ms']} ms, {len(last['spans'])} spans")
+    print(f"trace_spans rows {len(rows)} | /metrics {len(engine.prometheus().encode())} bytes")
+
+    for engine in engines.values():
+        engine.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
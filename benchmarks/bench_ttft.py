@@ -0,0 +1,86 @@
+"""
+Benchmark: time-to-first-token of streaming vs. blocking provider calls,
+measured against the local stub LLM server (no network, no API keys).
+
+Usage:
+    python benchmarks/bench_ttft.py --first-token-delay 0.4 --tokens 200 --token-interval 0.01
+"""
+import os
+import sys
+import time
+import argparse
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_providers import ProviderError, stream_openrouter, stream_anthropic
+from stub_servers import StubProfile, start_stub_server
+
+MESSAGES = [{"role": "user", "content": "What is Vadilal's revenue in FY 2023-24?"}]
+
+
+def measure_stream(chunks):
+    """Return (time to first token, total time, text) for a chunk generator."""
+    started = time.perf_counter()
+    first = None
+    parts = []
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - started
+        parts.append(chunk)
+    return first, time.perf_counter() - started, "".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--first-token-delay", type=float, default=0.4)
+    parser.add_argument("--token-interval", type=float, default=0.01)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    profile = StubProfile(args.first_token_delay, args.token_interval, args.tokens)
+    server, base_url = start_stub_server(profile=profile)
+    openrouter_url = f"{base_url}/api/v1/chat/completions"
+    anthropic_url = f"{base_url}/v1/messages"
+
+    for name, url, payload, stream in (
+        ("openrouter", openrouter_url, {"model": "stub", "messages": MESSAGES},
+         lambda: stream_openrouter("key", "stub", MESSAGES, url=openrouter_url)),
+        ("anthropic", anthropic_url, {"model": "stub", "system": "", "messages": MESSAGES, "max_tokens": 1000},
+         lambda: stream_anthropic("key", "stub", "", MESSAGES, url=anthropic_url)),
+    ):
+        blocking = []
+        streaming = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            requests.post(url, json=payload, timeout=60).raise_for_status()
+            blocking.append(time.perf_counter() - started)
+            streaming.append(measure_stream(stream()))
+
+        ttft = sum(s[0] for s in streaming) / args.runs
+        total = sum(s[1] for s in streaming) / args.runs
+        block = sum(blocking) / args.runs
+        print(f"{name:<11} blocking first text: {block * 1000:7.0f} ms | "
+              f"streaming TTFT: {ttft * 1000:7.0f} ms, total: {total * 1000:7.0f} ms "
+              f"({block / ttft:.1f}x sooner)")
+
+    # Error paths: rejected request and failure half way through the stream
+    for fail in ("http_429", "mid_stream"):
+        profile.fail = fail
+        for name, stream in (("openrouter", lambda: stream_openrouter("key", "stub", MESSAGES, url=openrouter_url)),
+                             ("anthropic", lambda: stream_anthropic("key", "stub", "", MESSAGES, url=anthropic_url))):
+            received = []
+            try:
+                for chunk in stream():
+                    received.append(chunk)
+                outcome = "no error raised"
+            except ProviderError as e:
+                outcome = f"ProviderError after {len(received)} tokens: {str(e).splitlines()[0]}"
+            print(f"{name:<11} {fail:<10} -> {outcome}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
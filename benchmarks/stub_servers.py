@@ -0,0 +1,359 @@
+"""
+Local stub servers that imitate the external APIs used by the app, for
+offline benchmarks. Each server runs in a background thread on 127.0.0.1.
+
+LLM stub (OpenRouter + Anthropic wire formats):
+    POST /api/v1/chat/completions   OpenRouter chat completions (JSON or SSE)
+    POST /v1/messages               Anthropic Messages API (JSON or SSE)
+
+Search stub (start_stub_server(SearchStubHandler, ...)):
+    GET /search                     SerpAPI JSON (organic_results)
+    GET /html/                      DuckDuckGo HTML results page
+
+Latency profile (StubProfile):
+    first_token_delay   seconds before the first token is sent
+    tail_probability    share of requests that wait `tail_delay` seconds
+                        for their first token instead (latency tail)
+    token_interval      seconds between streamed tokens
+    tokens              number of tokens in every answer
+    fail                None, "http_429" / "http_500" (reject the request) or
+                        "mid_stream" (send an error event half way through)
+    rate_limit          requests accepted per second; further requests get
+                        429 with Retry-After until the window frees up
+    results             search results per page (search stub; it answers
+                        after the first-token delay)
+
+Prompt caching: `cache_control` breakpoints are validated like the real APIs
+(at most 4, type "ephemeral", only on text blocks) and malformed requests get
+a 400. Prefixes up to each breakpoint are remembered per server, and the
+reported usage splits the prompt into cache reads, cache writes and uncached
+input tokens (Anthropic message_start usage, OpenRouter
+prompt_tokens_details.cached_tokens).
+"""
+import sys
+import json
+import html
+import time
+import random
+import hashlib
+import threading
+from dataclasses import dataclass
+from urllib.parse import urlsplit, parse_qs, quote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+@dataclass
+class StubProfile:
+    first_token_delay: float = 0.5
+    tail_probability: float = 0.0
+    tail_delay: float = 0.0
+    token_interval: float = 0.02
+    tokens: int = 100
+    fail: str = None
+    rate_limit: float = None
+    results: int = 5
+
+
+def answer_tokens(profile):
+    return [f"token{i} " for i in range(profile.tokens)]
+
+
+# Prompts shorter than this are never cached (Anthropic's minimum for most models)
+MIN_CACHEABLE_TOKENS = 1024
+MAX_BREAKPOINTS = 4
+
+
+def _blocks(content):
+    """Content as a list of blocks (plain strings become one text block)."""
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}]
+    return content or []
+
+
+def prompt_segments(system, messages):
+    """
+    Flatten a request into (text, has_breakpoint) segments in prompt order.
+    Raises ValueError for malformed cache_control usage.
+    """
+    segments = []
+    for role, content in [("system", system)] + [(m.get("role"), m.get("content")) for m in messages]:
+        for block in _blocks(content):
+            control = block.get("cache_control")
+            if control is not None:
+                if control.get("type") != "ephemeral":
+                    raise ValueError(f"cache_control.type must be 'ephemeral', got {control.get('type')!r}")
+                if block.get("type") != "text":
+                    raise ValueError("cache_control is only supported on text blocks here")
+            segments.append((f"{role}:{block.get('text', '')}", control is not None))
+
+    breakpoints = sum(1 for _, marked in segments if marked)
+    if breakpoints > MAX_BREAKPOINTS:
+        raise ValueError(f"A maximum of {MAX_BREAKPOINTS} blocks with cache_control may be provided. Found {breakpoints}.")
+    return segments
+
+
+def cache_usage(server, segments):
+    """
+    Emulate prefix caching: returns (uncached, cache_read, cache_write) token
+    counts and remembers every breakpoint prefix of this request. Like the
+    real API, each breakpoint also looks back up to 20 blocks for the longest
+    prefix cached by an earlier request.
+    """
+    digest = hashlib.sha256()
+    tokens = 0
+    boundaries = []
+    read = 0
+    write = 0
+    for text, marked in segments:
+        digest.update(text.encode("utf-8"))
+        tokens += len(text) // 4
+        boundaries.append((digest.hexdigest(), tokens))
+        if not marked or tokens < MIN_CACHEABLE_TOKENS:
+            continue
+        with server.lock:
+            for key, prefix_tokens in reversed(boundaries[-20:]):
+                if key in server.prompt_cache:
+                    read = max(read, prefix_tokens)
+                    break
+            server.prompt_cache.add(boundaries[-1][0])
+        write = tokens - read
+    return tokens - read - write, read, write
+
+
+class LLMStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def profile(self):
+        return self.server.profile
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_sse(self):
+        # Chunked transfer encoding, like the real providers, so the
+        # connection stays reusable and events are flushed one by one
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, payload):
+        self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+        self.wfile.flush()
+
+    def _end_sse(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _send_event(self, data, event=None):
+        lines = f"event: {event}\n" if event else ""
+        lines += f"data: {data}\n\n"
+        self._write_chunk(lines.encode("utf-8"))
+
+    def _reject(self):
+        """Send the failure or rate-limit response the profile calls for; True if one was sent."""
+        if self.profile.fail == "http_429":
+            self._send_json(429, {"error": {"message": "Rate limit exceeded"}}, {"Retry-After": "1"})
+            return True
+        if self.profile.fail == "http_500":
+            self._send_json(500, {"error": {"message": "Internal server error"}})
+            return True
+        retry_after = self._over_rate_limit()
+        if retry_after:
+            self._send_json(429, {"error": {"message": "Rate limit exceeded"}}, {"Retry-After": str(retry_after)})
+            return True
+        return False
+
+    def do_POST(self):
+        request = self._read_json()
+        self.server.requests.append({"path": self.path, "headers": dict(self.headers), "body": request})
+        if self._reject():
+            return
+
+        if self.path.endswith("/chat/completions"):
+            self._openrouter(request)
+        elif self.path.endswith("/messages"):
+            self._anthropic(request)
+        else:
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def _first_token_delay(self):
+        with self.server.lock:
+            in_tail = self.server.random.random() < self.profile.tail_probability
+        return self.profile.tail_delay if in_tail else self.profile.first_token_delay
+
+    def _over_rate_limit(self):
+        """Seconds to advertise in Retry-After if this request exceeds the profile's rate, else 0."""
+        if not self.profile.rate_limit:
+            return 0
+        now = time.monotonic()
+        with self.server.lock:
+            accepted = self.server.accepted
+            while accepted and accepted[0] <= now - 1.0:
+                accepted.pop(0)
+            if len(accepted) >= self.profile.rate_limit:
+                self.server.rejected += 1
+                return max(1, int(accepted[0] + 1.0 - now + 0.999))
+            accepted.append(now)
+        return 0
+
+    def _stream_tokens(self, send_token, send_error):
+        time.sleep(self._first_token_delay())
+        tokens = answer_tokens(self.profile)
+        for i, token in enumerate(tokens):
+            if self.profile.fail == "mid_stream" and i == len(tokens) // 2:
+                send_error()
+                return False
+            send_token(token)
+            time.sleep(self.profile.token_interval)
+        return True
+
+    def _openrouter(self, request):
+        messages = request.get("messages", [])
+        try:
+            segments = prompt_segments(None, messages)
+        except ValueError as e:
+            self._send_json(400, {"error": {"code": 400, "message": str(e)}})
+            return
+        uncached, read, write = cache_usage(self.server, segments)
+
+        if not request.get("stream"):
+            time.sleep(self._first_token_delay() + self.profile.token_interval * self.profile.tokens)
+            self._send_json(200, {
+                "choices": [{"message": {"role": "assistant", "content": "".join(answer_tokens(self.profile))}}],
+                "usage": {"prompt_tokens": len(json.dumps(request)) // 4, "completion_tokens": self.profile.tokens}
+            })
+            return
+
+        self._start_sse()
+        self._write_chunk(b": OPENROUTER PROCESSING\n\n")
+        completed = self._stream_tokens(
+            lambda token: self._send_event(json.dumps({"choices": [{"delta": {"content": token}}]})),
+            lambda: self._send_event(json.dumps({"error": {"message": "stub failure mid-stream"}}))
+        )
+        if completed:
+            if (request.get("usage") or {}).get("include"):
+                self._send_event(json.dumps({"choices": [], "usage": {
+                    "prompt_tokens": uncached + read + write,
+                    "completion_tokens": self.profile.tokens,
+                    "prompt_tokens_details": {"cached_tokens": read}
+                }}))
+            self._send_event("[DONE]")
+        self._end_sse()
+
+    def _anthropic(self, request):
+        try:
+            segments = prompt_segments(request.get("system"), request.get("messages", []))
+        except ValueError as e:
+            self._send_json(400, {"type": "error", "error": {"type": "invalid_request_error", "message": str(e)}})
+            return
+        uncached, read, write = cache_usage(self.server, segments)
+
+        if not request.get("stream"):
+            time.sleep(self._first_token_delay() + self.profile.token_interval * self.profile.tokens)
+            self._send_json(200, {
+                "type": "message",
+                "content": [{"type": "text", "text": "".join(answer_tokens(self.profile))}],
+                "usage": {"input_tokens": len(json.dumps(request)) // 4, "output_tokens": self.profile.tokens}
+            })
+            return
+
+        self._start_sse()
+        self._send_event(json.dumps({"type": "message_start", "message": {"usage": {
+            "input_tokens": uncached, "cache_read_input_tokens": read,
+            "cache_creation_input_tokens": write, "output_tokens": 1
+        }}}), "message_start")
+        self._send_event(json.dumps({"type": "content_block_start", "index": 0}), "content_block_start")
+        completed = self._stream_tokens(
+            lambda token: self._send_event(json.dumps({
+                "type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": token}
+            }), "content_block_delta"),
+            lambda: self._send_event(json.dumps({
+                "type": "error", "error": {"type": "overloaded_error", "message": "stub failure mid-stream"}
+            }), "error")
+        )
+        if completed:
+            self._send_event(json.dumps({
+                "type": "message_delta", "delta": {"stop_reason": "end_turn"},
+                "usage": {"output_tokens": self.profile.tokens}
+            }), "message_delta")
+            self._send_event(json.dumps({"type": "message_stop"}), "message_stop")
+        self._end_sse()
+
+
+def search_results(query, count):
+    """Deterministic fake results for a query."""
+    slug = hashlib.sha1(query.encode("utf-8")).hexdigest()[:8]
+    return [{"title": f"Result {i} for {query}", "link": f"https://example.com/{slug}/{i}",
+             "snippet": f"Snippet {i} about {query}. " * 3} for i in range(count)]
+
+
+class SearchStubHandler(LLMStubHandler):
+    """SerpAPI and DuckDuckGo HTML stubs, sharing the LLM stub's failure and rate-limit profile."""
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = (parse_qs(parts.query).get("q") or [""])[0]
+        self.server.requests.append({"path": parts.path, "headers": dict(self.headers), "query": query})
+        if self._reject():
+            return
+        time.sleep(self._first_token_delay())
+        results = search_results(query, self.profile.results)
+
+        if parts.path.startswith("/search"):
+            self._send_json(200, {"organic_results": results})
+        elif parts.path.startswith("/html"):
+            body = "".join(
+                f'<div class="result__body"><a class="result__a" href="//duckduckgo.com/l/?uddg={quote(r["link"])}">'
+                f'{html.escape(r["title"])}</a><a class="result__snippet">{html.escape(r["snippet"])}</a></div>'
+                for r in results
+            ).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": f"unknown path {parts.path}"})
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Bursts of concurrent clients must not overflow the listen backlog
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Clients dropping pooled keep-alive connections is expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_stub_server(handler=LLMStubHandler, profile=None):
+    """Start a stub server in a daemon thread. Returns (server, base_url)."""
+    server = StubServer(("127.0.0.1", 0), handler)
+    server.profile = profile or StubProfile()
+    server.requests = []
+    server.prompt_cache = set()
+    server.lock = threading.Lock()
+    server.accepted = []
+    server.random = random.Random(0)
+    server.rejected = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_port}"
@@ -0,0 +1,85 @@
+"""
+Chat sessions persisted to SQLite with a bounded in-memory tail.
+
+Every message is written to the `chat_messages` table as it is added, so a
+conversation survives restarts (the app keeps the session id in the URL).
+Only a tail of the conversation stays in memory:
+    - messages already folded into the HistoryWindow summary are dropped
+      once more than `max_messages` are held; unfolded messages are bounded
+      by the model's history token budget, so memory per session is bounded,
+    - the UI shows a window of the latest `page_size` messages and pages
+      further back from SQLite on request ("load earlier"), so the render
+      cost of a rerun does not grow with the conversation.
+"""
+import uuid
+
+from history import HistoryWindow
+
+# Messages shown at first and added per "load earlier" click
+PAGE_SIZE = 20
+
+# In-memory messages per session beyond which folded ones are dropped
+MAX_MESSAGES_IN_MEMORY = 60
+
+# Sessions idle for longer than this are deleted at startup
+CHAT_RETENTION = 30 * 24 * 60 * 60
+
+
+class ChatSession:
+    """
+    One conversation: its id, the in-memory tail of messages and the
+    HistoryWindow used to build prompts from it. Pass `session_id` to resume
+    a stored conversation.
+    """
+
+    def __init__(self, storage, session_id=None, max_messages=MAX_MESSAGES_IN_MEMORY, page_size=PAGE_SIZE):
+        self.storage = storage
+        self.session_id = session_id or uuid.uuid4().hex
+        self.max_messages = max_messages
+        self.page_size = page_size
+        self.history_window = HistoryWindow()
+        self.visible = page_size
+        # Resuming starts a fresh summary over the loaded tail
+        self.messages = storage.get_chat_messages(self.session_id, max_messages) if session_id else []
+        self.total = storage.count_chat_messages(self.session_id) if session_id else 0
+
+    def append(self, role, content):
+        """Store a message and add it to the in-memory tail."""
+        message_id = self.storage.append_chat_message(self.session_id, role, content)
+        self.messages.append({"id": message_id, "role": role, "content": content})
+        self.total += 1
+        self._trim()
+
+    def _trim(self):
+        excess = self.history_window.discard(len(self.messages) - self.max_messages)
+        if excess:
+            del self.messages[:excess]
+
+    def history(self):
+        """In-memory messages without the latest one (the question being answered)."""
+        return self.messages[:-1]
+
+    def visible_messages(self):
+        """The latest `visible` messages; older pages are read from SQLite."""
+        if self.visible <= len(self.messages):
+            return self.messages[len(self.messages) - self.visible:]
+        earlier = []
+        if self.messages and self.total > len(self.messages):
+            earlier = self.storage.get_chat_messages(self.session_id, self.visible - len(self.messages),
+                                                     before_id=self.messages[0]["id"])
+        return earlier + self.messages
+
+    @property
+    def has_earlier(self):
+        return self.total > self.visible
+
+    def load_earlier(self):
+        self.visible += self.page_size
+
+    def clear(self):
+        """Delete the conversation and start over under the same id."""
+        self.storage.delete_chat_session(self.session_id)
+        self.messages = []
+        self.total = 0
+        self.visible = self.page_size
+        self.history_window.reset()
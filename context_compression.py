@@ -0,0 +1,143 @@
+"""
+Compression of the knowledge text before it is indexed and sent to a model.
+
+The research notes cite their sources with footnote numbers glued to the
+text ("...in Ahmedabad.1", "a debt-to-equity ratio of 0.3.42", "₹ 698 crore
+38") and end with a "Works cited" list of "Title, accessed on <date>, <url>"
+lines, the n-th line being source n. The same sentences also recur across
+sections and in vadilal_deepsearch.txt. None of that helps answer a
+question, but all of it used to be sent with every prompt.
+
+compress_documents() moves the reference lines into a lookup table keyed by
+(source name, footnote number) and drops every sentence that already
+appeared earlier, in any document (compared without footnotes, case or
+punctuation). The footnote markers stay in the text until the retriever has
+chunked it: strip_footnotes() then removes them from each chunk and returns
+the numbers it carried, so only the sources behind the retrieved chunks are
+attached to the prompt, as one line of site names (format_sources()); titles
+and full URLs stay in the lookup table.
+"""
+import re
+from urllib.parse import urlsplit
+
+REFERENCE_LINE = re.compile(r"^(?P<title>.+?), accessed on (?P<date>[A-Z][a-z]+ \d{1,2}, \d{4}), (?P<url>https?://\S+)$")
+REFERENCES_HEADING = re.compile(r"^(?:works cited|references|sources)$", re.IGNORECASE)
+
+# Footnote markers, as (pattern, replacement); group "n" is the footnote number
+FOOTNOTE_PATTERNS = (
+    # After a word, a closing bracket or a percent sign: "Ahmedabad.1", "(IPO).1"
+    (re.compile(r"(?<=[^\W\d_]|[)%'\"’])\.(?P<n>\d{1,2})(?=\s|$)"), "."),
+    # After a year ending a sentence: "in 2034.50 Similarly", "FY 2000-01.26"
+    (re.compile(r"(?P<year>(?<![\d.])(?:19|20)\d{2}(?:-\d{2})?)\.(?P<n>\d{1,2})(?=\s+[A-Z]|\s*$)"), r"\g<year>."),
+    # After a decimal number, which cannot take a second point: "ratio of 0.3.42"
+    (re.compile(r"(?P<number>\d\.\d+)\.(?P<n>\d{1,2})(?=\s|$)"), r"\g<number>."),
+    # Trailing a value in the Q&A lists: "Public: 35.27% 47", "Amul: 40-45% 48 / 40% 49"
+    (re.compile(r"(?<=[%a-z]) (?P<n>\d{1,2})(?=\s*/|\s*$)"), ""),
+)
+
+# Sentence boundaries, also behind a footnote marker ("...in Ahmedabad.1 Initially")
+SENTENCE_END = re.compile(r"(?:(?<=[.!?])|(?<=[.!?]\d)|(?<=[.!?]\d\d))\s+(?=[A-Z\"'(₹])")
+NON_WORD = re.compile(r"[^\w%₹]+")
+
+# Shorter sentences (headings, table cells, list entries) are only dropped as
+# whole lines repeating a line of an earlier document
+MIN_DEDUPE_WORDS = 6
+
+
+def strip_footnotes(text):
+    """(text without footnote markers, sorted footnote numbers it carried)."""
+    numbers = set()
+
+    def collect(match, replacement):
+        numbers.add(int(match.group("n")))
+        return match.expand(replacement)
+
+    lines = []
+    for line in text.split("\n"):
+        for pattern, replacement in FOOTNOTE_PATTERNS:
+            line = pattern.sub(lambda match: collect(match, replacement), line)
+        lines.append(line)
+    return "\n".join(lines), sorted(numbers)
+
+
+def split_references(text):
+    """
+    (text without its reference list, {footnote number: {"title", "date", "url"}}).
+    Reference lines are numbered in order, from 1; a "Works cited" heading
+    directly above them goes too.
+    """
+    references = {}
+    lines = []
+    for line in text.split("\n"):
+        match = REFERENCE_LINE.match(line.strip())
+        if match:
+            references[len(references) + 1] = match.groupdict()
+            if lines and REFERENCES_HEADING.match(lines[-1].strip()):
+                lines.pop()
+            continue
+        lines.append(line)
+    return "\n".join(lines), references
+
+
+def _key(text):
+    text, _ = strip_footnotes(text)
+    return NON_WORD.sub(" ", text.lower()).split()
+
+
+def _sentence_key(sentence):
+    words = _key(sentence)
+    return " ".join(words) if len(words) >= MIN_DEDUPE_WORDS else None
+
+
+def compress_documents(documents):
+    """
+    Split off the reference lists and drop repeated sentences, and lines
+    already present in an earlier document. Returns
+    (documents, references, report): the (source name, text) pairs with
+    their footnote markers still in place, {(source name, number): {"title",
+    "date", "url"}} and {"references", "duplicate_sentences"}.
+    """
+    references = {}
+    compressed = []
+    seen = set()
+    earlier_lines = set()
+    duplicates = 0
+    for source, text in documents:
+        body, numbered = split_references(text or "")
+        references.update(((source, number), reference) for number, reference in numbered.items())
+
+        lines = []
+        line_keys = set()
+        for line in body.split("\n"):
+            if not line.strip():
+                continue
+            line_key = " ".join(_key(line))
+            line_keys.add(line_key)
+            if line_key in earlier_lines:
+                duplicates += len(SENTENCE_END.split(line.strip()))
+                continue
+            kept = []
+            for sentence in SENTENCE_END.split(line.strip()):
+                key = _sentence_key(sentence)
+                if key is not None:
+                    if key in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(key)
+                kept.append(sentence)
+            if kept:
+                lines.append(" ".join(kept))
+        compressed.append((source, "\n".join(lines)))
+        earlier_lines |= line_keys
+    return compressed, references, {"references": len(references), "duplicate_sentences": duplicates}
+
+
+def source_site(reference):
+    """The site a reference is on ("equitymaster.com"); the prompt cites sources by site."""
+    return urlsplit(reference["url"]).netloc.lower().removeprefix("www.")
+
+
+def format_sources(keys, references):
+    """A "SOURCES:" line naming the sites of the references `keys` point to, each once, in order."""
+    sites = dict.fromkeys(source_site(references[key]) for key in keys if key in references)
+    return "SOURCES: " + ", ".join(sites) if sites else ""
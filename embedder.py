@@ -0,0 +1,261 @@
+"""
+Offline local embedding engine.
+
+Text is turned into vectors without any external service:
+    1. unigram + bigram features hashed into `n_features` buckets (signed hashing),
+    2. sublinear TF weighting and, once fitted, IDF weights,
+    3. optional truncated-SVD projection down to `svd_dim` dimensions (LSA),
+    4. L2 normalisation, so dot products are cosine similarities.
+
+Per-chunk vectors are cached in SQLite by content hash and model id, so
+re-ingesting an unchanged knowledge base costs one lookup per chunk.
+
+Usage:
+    python embedder.py --db vadilal_data.db vadilal_deepsearch.txt
+"""
+import os
+import zlib
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from retrieval import tokenize, chunk_text
+
+
+def content_hash(text):
+    """Stable hash of a chunk's text, used as cache key."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def randomized_svd(matrix, n_components, n_oversamples=10, n_iter=4, seed=0):
+    """
+    Top `n_components` right singular vectors of `matrix` as rows (like the
+    `vt` of np.linalg.svd), via a randomized range finder with power
+    iterations (Halko et al.). Costs O(rows * features * n_components)
+    instead of a full decomposition; matrices the sketch would not be much
+    smaller than are decomposed exactly.
+    """
+    rank = n_components + n_oversamples
+    if 2 * rank > min(matrix.shape):
+        return np.linalg.svd(matrix, full_matrices=False)[2][:n_components]
+
+    rng = np.random.default_rng(seed)
+    basis, _ = np.linalg.qr(matrix @ rng.standard_normal((matrix.shape[1], rank), dtype=np.float32))
+    for _ in range(n_iter):
+        basis, _ = np.linalg.qr(matrix.T @ basis)
+        basis, _ = np.linalg.qr(matrix @ basis)
+    _, _, vt = np.linalg.svd(basis.T @ matrix, full_matrices=False)
+    return vt[:n_components]
+
+
+class HashingEmbedder:
+    """
+    Hashing-vectorizer embedder with optional IDF and SVD projection.
+    Unfitted it is stateless; fit() learns IDF weights and the projection from a
+    corpus, and save()/load() keep query-time encoding consistent with ingestion.
+    """
+
+    def __init__(self, n_features=4096, svd_dim=256, ngram_range=(1, 2), parallel_threshold=2000):
+        self.n_features = n_features
+        self.svd_dim = svd_dim
+        self.ngram_range = ngram_range
+        self.parallel_threshold = parallel_threshold
+        self.idf = None
+        self.components = None
+
+    @property
+    def dim(self):
+        return self.components.shape[1] if self.components is not None else self.n_features
+
+    @property
+    def model_id(self):
+        """Identifies the exact encoding; cached vectors are only reused for the same id."""
+        digest = hashlib.sha1(f"hash:{self.n_features}:{self.ngram_range}".encode())
+        if self.idf is not None:
+            digest.update(self.idf.tobytes())
+        if self.components is not None:
+            digest.update(self.components.tobytes())
+        return digest.hexdigest()[:16]
+
+    def _features(self, text):
+        """Signed, sublinear-TF hashed features of one text as a dense row."""
+        terms = tokenize(text)
+        lo, hi = self.ngram_range
+        row = np.zeros(self.n_features, dtype=np.float32)
+        counts = {}
+        for n in range(lo, hi + 1):
+            for i in range(len(terms) - n + 1):
+                gram = " ".join(terms[i:i + n]).encode("utf-8")
+                h = zlib.crc32(gram)
+                bucket = h % self.n_features
+                sign = 1.0 if (h >> 31) & 1 else -1.0
+                counts[bucket] = counts.get(bucket, 0.0) + sign
+
+        for bucket, count in counts.items():
+            if count:
+                row[bucket] = np.sign(count) * (1.0 + np.log(abs(count)))
+        return row
+
+    def _hash_batch(self, texts):
+        matrix = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for i, text in enumerate(texts):
+            matrix[i] = self._features(text)
+        return matrix
+
+    def _encode_batch(self, texts):
+        """Encode one batch in the current process."""
+        matrix = self._hash_batch(texts)
+        if self.idf is not None:
+            matrix *= self.idf
+        if self.components is not None:
+            matrix = matrix @ self.components
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).astype(np.float32)
+
+    def encode(self, texts, batch_size=256, workers=None):
+        """
+        Encode `texts` into a (len(texts), dim) float32 matrix. Large inputs are
+        split into batches and spread across CPU cores.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        if len(texts) < self.parallel_threshold or len(batches) == 1:
+            return np.vstack([self._encode_batch(batch) for batch in batches])
+
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return np.vstack(list(pool.map(self._encode_batch, batches)))
+
+    def fit(self, texts, max_rows=20000, seed=0):
+        """Learn IDF weights and (if svd_dim) the SVD projection from a corpus."""
+        texts = list(texts)
+        if len(texts) > max_rows:
+            rng = np.random.default_rng(seed)
+            texts = [texts[i] for i in rng.choice(len(texts), max_rows, replace=False)]
+
+        self.idf = None
+        self.components = None
+        matrix = self._hash_batch(texts)
+
+        doc_freq = np.count_nonzero(matrix, axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + doc_freq)) + 1.0).astype(np.float32)
+
+        if self.svd_dim:
+            weighted = matrix * self.idf
+            n_components = min(self.svd_dim, *weighted.shape)
+            self.components = randomized_svd(weighted, n_components, seed=seed).T.astype(np.float32)
+        return self
+
+    def save(self, path):
+        """Persist configuration and fitted state as .npz."""
+        np.savez(
+            path,
+            n_features=self.n_features,
+            svd_dim=self.svd_dim or 0,
+            ngram_range=np.array(self.ngram_range),
+            idf=self.idf if self.idf is not None else np.empty(0, dtype=np.float32),
+            components=self.components if self.components is not None else np.empty((0, 0), dtype=np.float32),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load an embedder written by save()."""
+        data = np.load(path)
+        embedder = cls(int(data["n_features"]), int(data["svd_dim"]) or None, tuple(int(n) for n in data["ngram_range"]))
+        if data["idf"].size:
+            embedder.idf = data["idf"]
+        if data["components"].size:
+            embedder.components = data["components"]
+        return embedder
+
+
+def model_path(db_path):
+    """Fitted embedder saved next to the database."""
+    return f"{db_path}.embedder.npz"
+
+
+def load_or_fit_embedder(storage, texts=None):
+    """
+    Load the embedder fitted for `storage`, fitting (and saving) it if missing
+    on `texts`, or else on the stored text chunks.
+    """
+    path = model_path(storage.db_path)
+    if os.path.exists(path):
+        return HashingEmbedder.load(path)
+
+    texts = list(texts or []) or [chunk for _, chunk in storage.get_text_chunks()]
+    if not texts:
+        raise ValueError("No texts to fit the embedder on; ingest the knowledge base first.")
+    embedder = HashingEmbedder().fit(texts)
+    embedder.save(path)
+    return embedder
+
+
+def embed_chunks(storage, embedder, contents):
+    """
+    Return vectors for `contents`, encoding only the chunks not already cached
+    for this model. Returns (matrix, number of chunks encoded).
+    """
+    hashes = [content_hash(text) for text in contents]
+    cached = storage.get_cached_embeddings(embedder.model_id, hashes)
+
+    missing = [i for i, h in enumerate(hashes) if h not in cached]
+    if missing:
+        vectors = embedder.encode([contents[i] for i in missing])
+        new_entries = {hashes[i]: vectors[row] for row, i in enumerate(missing)}
+        storage.save_cached_embeddings(embedder.model_id, new_entries.items())
+        cached.update(new_entries)
+
+    matrix = np.vstack([cached[h] for h in hashes]) if hashes else np.empty((0, embedder.dim), dtype=np.float32)
+    return matrix, len(missing)
+
+
+def ingest_documents(storage, documents, embedder=None, chunk_tokens=180):
+    """
+    Chunk `documents` ((source, text) pairs), embed every distinct chunk and
+    write them to the embeddings table in one bulk upsert. Chunk ids are
+    derived from the content hash, so unchanged chunks keep their id.
+    """
+    chunks = {}
+    for source, text in documents:
+        for chunk in chunk_text(text or "", chunk_tokens):
+            chunks.setdefault(content_hash(chunk), (source, chunk))
+
+    contents = [chunk for _, chunk in chunks.values()]
+    if embedder is None:
+        embedder = load_or_fit_embedder(storage, contents)
+
+    matrix, encoded = embed_chunks(storage, embedder, contents)
+    storage.save_embeddings_bulk(
+        (f"{source}:{digest[:16]}", chunk, matrix[i])
+        for i, (digest, (source, chunk)) in enumerate(chunks.items())
+    )
+    return {"chunks": len(contents), "encoded": encoded, "cached": len(contents) - encoded, "dim": embedder.dim}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed knowledge-base files into the embeddings table.")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--db", default="vadilal_data.db")
+    args = parser.parse_args()
+
+    from storage_handler import StorageHandler
+    storage = StorageHandler(args.db)
+    documents = []
+    for path in args.files:
+        with open(path, encoding="utf-8") as f:
+            documents.append((os.path.basename(path), f.read()))
+
+    stats = ingest_documents(storage, documents)
+    print(f"{stats['chunks']} chunks ({stats['encoded']} encoded, {stats['cached']} from cache), dim={stats['dim']}")
+    storage.close()
+
+
+if __name__ == "__main__":
+    main()
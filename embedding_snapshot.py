@@ -0,0 +1,201 @@
+"""
+Memory-mapped embedding snapshot.
+
+SQLite stays the source of truth for embeddings; this module exports the
+embedding matrix plus a chunk-id/offset table into a single read-only file
+that worker processes `mmap` with zero copy. Opening a snapshot costs the same
+no matter how large the corpus is, and every process shares the same pages of
+the OS page cache.
+
+File layout (little endian):
+    header       MAGIC, format version, dim, count, fingerprint, section offsets
+    matrix       count x dim float32, L2-normalised rows (64-byte aligned)
+    id offsets   (count + 1) uint64 byte offsets into the id blob
+    id blob      UTF-8 chunk ids, concatenated
+
+Usage:
+    python embedding_snapshot.py --db vadilal_data.db --dim 384
+"""
+import os
+import mmap
+import struct
+import hashlib
+import argparse
+
+import numpy as np
+
+MAGIC = b"VDLSNAP1"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIQ32sQQQ")
+ALIGNMENT = 64
+
+
+def snapshot_path(db_path, dim):
+    """Default snapshot location: next to the database, one file per dimension."""
+    return f"{db_path}.{dim}d.snapshot"
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class EmbeddingSnapshot:
+    """Read-only, memory-mapped view of an exported embedding matrix."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.dim, self.count, self.fingerprint,
+         matrix_offset, offsets_offset, ids_offset) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} embedding snapshot")
+
+        # Zero-copy views straight onto the mapped pages
+        self.matrix = np.frombuffer(
+            self._mmap, dtype=np.float32, count=self.count * self.dim, offset=matrix_offset
+        ).reshape(self.count, self.dim)
+        self._id_offsets = np.frombuffer(
+            self._mmap, dtype=np.uint64, count=self.count + 1, offset=offsets_offset
+        )
+        self._ids_offset = ids_offset
+
+    def chunk_id(self, row):
+        """Chunk id stored for matrix row `row`."""
+        start = self._ids_offset + int(self._id_offsets[row])
+        end = self._ids_offset + int(self._id_offsets[row + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+    def search(self, query_vector, k=5):
+        """Return up to `k` (chunk_id, cosine score) pairs, best first."""
+        if self.count == 0 or k <= 0:
+            return []
+
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        scores = self.matrix @ query
+        k = min(k, self.count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.chunk_id(i), float(scores[i])) for i in top]
+
+    def close(self):
+        """Release the mapping. Views obtained from this snapshot become invalid."""
+        self.matrix = None
+        self._id_offsets = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Someone still holds a view; the mapping is released with it
+            pass
+
+
+def export_snapshot(rows, dim, fingerprint, path):
+    """
+    Write `rows` (iterable of (chunk_id, float32 blob)) as a snapshot file.
+    The file is written beside `path` and renamed into place, so readers never
+    see a half-written snapshot and existing mappings stay valid.
+    """
+    chunk_ids = []
+    blobs = []
+    for chunk_id, blob in rows:
+        chunk_ids.append(chunk_id.encode("utf-8"))
+        blobs.append(blob)
+
+    count = len(chunk_ids)
+    if count:
+        matrix = np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(count, dim)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = (matrix / norms).astype(np.float32)
+    else:
+        matrix = np.empty((0, dim), dtype=np.float32)
+
+    id_offsets = np.zeros(count + 1, dtype=np.uint64)
+    if count:
+        id_offsets[1:] = np.cumsum([len(c) for c in chunk_ids])
+
+    matrix_offset = _aligned(HEADER.size)
+    offsets_offset = _aligned(matrix_offset + matrix.nbytes)
+    ids_offset = offsets_offset + id_offsets.nbytes
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, dim, count, fingerprint,
+                            matrix_offset, offsets_offset, ids_offset))
+        f.write(b"\0" * (matrix_offset - HEADER.size))
+        f.write(matrix.tobytes())
+        f.write(b"\0" * (offsets_offset - matrix_offset - matrix.nbytes))
+        f.write(id_offsets.tobytes())
+        f.write(b"".join(chunk_ids))
+    os.replace(tmp_path, path)
+
+
+def table_fingerprint(storage, dim):
+    """
+    Fingerprint of the embeddings table state for dimension `dim`. It changes on
+    every insert/update/delete (see StorageHandler.embeddings_version).
+    """
+    # Both lookups are O(1): a single meta row and the rowid b-tree's last key
+    max_id = storage.conn.execute("SELECT COALESCE(MAX(id), 0) FROM embeddings").fetchone()[0]
+    state = f"{storage.embeddings_version()}:{max_id}:{dim}"
+    return hashlib.sha256(state.encode("utf-8")).digest()
+
+
+def build_snapshot(storage, dim, path=None):
+    """Export the embeddings of dimension `dim` from `storage` and open the result."""
+    path = path or snapshot_path(storage.db_path, dim)
+    fingerprint = table_fingerprint(storage, dim)
+    rows = storage.conn.execute(
+        "SELECT chunk_id, embedding FROM embeddings WHERE dim = ? ORDER BY id", (dim,)
+    )
+    export_snapshot(rows, dim, fingerprint, path)
+    return EmbeddingSnapshot(path)
+
+
+def open_snapshot(storage, dim, path=None, current=None):
+    """
+    Return an up-to-date snapshot for `dim`, reusing `current` or the file on
+    disk when its fingerprint still matches and rebuilding it otherwise.
+    """
+    path = path or snapshot_path(storage.db_path, dim)
+    fingerprint = table_fingerprint(storage, dim)
+
+    if current is not None and current.fingerprint == fingerprint:
+        return current
+
+    if os.path.exists(path):
+        try:
+            snapshot = EmbeddingSnapshot(path)
+            if snapshot.fingerprint == fingerprint:
+                return snapshot
+            snapshot.close()
+        except (ValueError, struct.error, OSError):
+            # Corrupt or truncated file: rebuild below
+            pass
+
+    return build_snapshot(storage, dim, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embeddings table to a memory-mapped snapshot.")
+    parser.add_argument("--db", default="vadilal_data.db")
+    parser.add_argument("--dim", type=int, required=True)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    from storage_handler import StorageHandler
+    storage = StorageHandler(args.db)
+    snapshot = build_snapshot(storage, args.dim, args.out)
+    print(f"Wrote {snapshot.count} x {snapshot.dim} embeddings to {snapshot.path}")
+    snapshot.close()
+    storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""
+Headless question-answering engine.
+
+QueryEngine runs the whole pipeline without any UI: knowledge-base retrieval
+and web search (in parallel), history windowing, prompt building, the
+streaming provider call and the search/answer caches. The Streamlit app and
+the HTTP service (server.py) are both thin layers over stream_answer(), which
+yields events:
+
+    {"type": "status", "stage": "searching"}         web search started
+    {"type": "sources", "sources": {...}}             per-source status/timing
+    {"type": "context", "context": {"tokens_before",  knowledge context size before and after
+     "tokens_after", "sources"}}                      compression (context_compression.py)
+    {"type": "facts", "facts": [...]}                 answered from the financial facts
+                                                      table, without a provider call
+    {"type": "faq", "question": "..."}                answered with the precomputed answer
+                                                      to this FAQ question
+    {"type": "text", "text": "..."}                   answer delta
+    {"type": "route", "provider", "model",            who answered, and whether a hedged
+     "hedged", "failed_over"}                         request or failover was involved
+    {"type": "usage", "usage": {...}}                 token counts of the provider calls
+    {"type": "error", "message": "..."}               user-facing provider error
+    {"type": "done", "answer": "..."}                 full answer text
+
+Every answer is traced (tracing.py): spans for each stage and for the
+storage operations it runs, kept in memory, in SQLite and exported by
+prometheus().
+
+One engine is shared by all sessions/requests of a process; it is thread-safe.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+
+from retrieval import KnowledgeRetriever
+from knowledge_base import load_documents
+from financial_facts import FactIndex, ingest_facts
+from faq import PrecomputedAnswers
+from llm_providers import ProviderError, empty_usage, stream_openrouter, stream_anthropic
+from prompt_builder import build_prompt, cache_scope, anthropic_request, openrouter_messages
+from history import HistoryWindow, history_budget
+from provider_router import ProviderRouter
+from scheduler import RequestScheduler
+from search_cache import SearchCache, cache_key
+from response_cache import ResponseCache
+from storage_handler import StorageHandler
+from tracing import Tracer
+from web_search import gather, merge_results, format_results, serpapi_results, duckduckgo_results
+
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vadilal_data.db")
+
+# Retrieval settings: only the top-k relevant chunks of the knowledge base are sent
+RETRIEVAL_TOP_K = 6
+RETRIEVAL_TOKEN_BUDGET = 1500
+
+PROVIDERS = ("openrouter", "anthropic")
+
+# Display name -> model id, per provider
+MODEL_OPTIONS = {
+    "openrouter": {
+        "Claude 3 Haiku": "anthropic/claude-3-haiku",
+        "Claude 3 Sonnet": "anthropic/claude-3-sonnet",
+        "Claude 3 Opus": "anthropic/claude-3-opus",
+        "GPT-3.5 Turbo": "openai/gpt-3.5-turbo",
+        "Llama 3 70B": "meta-llama/llama-3-70b-instruct",
+        "Llama 4 Maverick (Free)": "meta-llama/llama-4-maverick:free"
+    },
+    "anthropic": {
+        "Claude 3 Haiku": "claude-3-haiku-20240307",
+        "Claude 3 Sonnet": "claude-3-sonnet-20240229",
+        "Claude 3 Opus": "claude-3-opus-20240229"
+    }
+}
+
+WEB_SOURCES = ("serpapi", "duckduckgo")
+
+
+def equivalent_model(model, provider, target_provider):
+    """The model with the same display name on `target_provider`, else its first model."""
+    name = next((name for name, model_id in MODEL_OPTIONS[provider].items() if model_id == model), None)
+    options = MODEL_OPTIONS[target_provider]
+    return options.get(name) or next(iter(options.values()))
+
+
+def faq_settings_from_env():
+    """
+    Provider settings for generating FAQ answers from FAQ_API_KEY,
+    FAQ_PROVIDER (default openrouter) and FAQ_MODEL (default: the
+    provider's first model), or None when FAQ_API_KEY is not set.
+    """
+    api_key = os.getenv("FAQ_API_KEY")
+    if not api_key:
+        return None
+    provider = os.getenv("FAQ_PROVIDER", "openrouter")
+    if provider not in PROVIDERS:
+        raise ValueError(f"unknown FAQ_PROVIDER {provider!r}")
+    model = os.getenv("FAQ_MODEL") or next(iter(MODEL_OPTIONS[provider].values()))
+    return {"provider": provider, "api_key": api_key, "model": model}
+
+
+class QueryEngine:
+    """
+    Shared resources (retriever, storage, caches) plus the answer pipeline.
+    `response_similarity` is the threshold for similar-question hits in the
+    answer cache (default: RESPONSE_CACHE_SIMILARITY or 0.85; 0 disables them).
+    `faq_settings` ({"provider", "api_key", "model"}, default from the
+    environment, see faq_settings_from_env()) lets the engine generate the
+    FAQ answers itself; with `faq_warmup` that happens in the background
+    whenever answers for the current knowledge version are missing.
+    """
+
+    def __init__(self, db_path=DB_PATH, documents=None, top_k=RETRIEVAL_TOP_K, response_similarity=None,
+                 provider_urls=None, scheduler=None, router=None, faq_settings=None, faq_warmup=True,
+                 tracer=None):
+        self.top_k = top_k
+        documents = documents if documents is not None else load_documents()
+        self.retriever = KnowledgeRetriever(documents)
+        self.storage = StorageHandler(db_path)
+        # Spans for every answer and storage operation (TRACING=0 turns them off)
+        self.tracer = tracer or Tracer(storage=self.storage)
+        self.storage.tracer = self.tracer
+        # Direct metric lookups ("net profit FY 2022-23") are answered from the
+        # parsed tables without calling a provider
+        ingest_facts(self.storage, documents)
+        self.facts = FactIndex.from_storage(self.storage)
+        self._fact_answers = 0
+        self._fact_lock = threading.Lock()
+        self.search_cache = SearchCache(self.storage)
+        self._knowledge_digest = hashlib.sha256(self.retriever.full_text.encode("utf-8")).hexdigest()[:16]
+        if response_similarity is None:
+            response_similarity = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.85"))
+        self.response_cache = ResponseCache(self.storage, self.knowledge_version,
+                                            similarity_threshold=response_similarity or None)
+        # Endpoint overrides ({"openrouter": url, "anthropic": url, "serpapi": url,
+        # "duckduckgo": url}), e.g. for stub servers
+        self.provider_urls = provider_urls or {}
+        # Rate limits, Retry-After handling and coalescing for every upstream call
+        self.scheduler = scheduler or RequestScheduler()
+        # Provider health, hedging and failover between the primary and fallback providers
+        self.router = router or ProviderRouter()
+        # Precomputed answers to the most frequent questions
+        faq_settings = faq_settings if faq_settings is not None else faq_settings_from_env()
+        self.faq = PrecomputedAnswers(
+            self.storage, self.knowledge_version,
+            generate=self._faq_generator(faq_settings) if faq_settings else None,
+            model=faq_settings["model"] if faq_settings else "", auto_warm_up=faq_warmup)
+        self.faq.refresh()
+
+    def knowledge_version(self):
+        """Changes whenever the built-in knowledge or the stored text changes."""
+        return f"{self._knowledge_digest}:{self.storage.text_version()}"
+
+    def _faq_generator(self, settings):
+        """Callable answering an FAQ question through the full pipeline with `settings`."""
+        def generate(question):
+            result = self.answer(question, settings["provider"], settings["api_key"], settings["model"],
+                                 use_precomputed=False)
+            if result["error"]:
+                raise ProviderError(result["error"])
+            return result["answer"]
+        return generate
+
+    def gather_context(self, question, enable_web_search=False, serp_api_key=None,
+                       token_budget=RETRIEVAL_TOKEN_BUDGET):
+        """
+        Run knowledge-base retrieval and the enabled web searches concurrently.
+        Returns (knowledge_context, formatted web results, per-source outcomes);
+        the knowledge_base outcome's result is the retriever's compression
+        report. Web sources that fail or miss their deadline are left out;
+        retrieval runs on this thread, so it never waits behind them, and
+        falls back to the whole knowledge base if it fails.
+        """
+        sources = {"knowledge_base": lambda: self.retriever.context(question, self.top_k, token_budget)}
+        if enable_web_search:
+            # Failed and empty searches raise or return [], so they are never cached
+            if serp_api_key:
+                sources["serpapi"] = lambda: self.search_cache.get_or_fetch(
+                    "serpapi", question, lambda: self._search("serpapi", question, lambda: serpapi_results(
+                        question, serp_api_key, **self._url_override("serpapi")), serp_api_key))
+            sources["duckduckgo"] = lambda: self.search_cache.get_or_fetch(
+                "duckduckgo", question, lambda: self._search("duckduckgo", question, lambda: duckduckgo_results(
+                    question, **self._url_override("duckduckgo"))))
+
+        outcomes = gather(sources, inline=("knowledge_base",))
+        knowledge = outcomes["knowledge_base"]["result"]
+        knowledge_context = knowledge["text"] if knowledge else self.retriever.full_text
+        web_results = merge_results(outcomes[name]["result"] for name in WEB_SOURCES if name in outcomes)
+        return knowledge_context, format_results(web_results), outcomes
+
+    def _url_override(self, provider):
+        """{"url": ...} when the provider's endpoint is overridden, else {}."""
+        url = self.provider_urls.get(provider)
+        return {"url": url} if url else {}
+
+    def _search(self, provider, question, fetch, api_key=None):
+        """
+        Run a web search through the scheduler; concurrent identical searches
+        with the same API key share one call (and its errors).
+        """
+        key = cache_key(provider, question)
+        if api_key:
+            key += ":" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        return self.scheduler.call(provider, fetch, key=key)
+
+    def _provider_stream(self, provider, api_key, model, request, usage):
+        """
+        Zero-argument factory for the provider's text stream, run through the
+        scheduler. Identical requests with the same API key in flight at the
+        same time share one upstream call, so a caller never gets another
+        key's errors or rate limits; only the caller that made the call gets
+        its usage.
+        """
+        kwargs = self._url_override(provider)
+        if provider == "anthropic":
+            system, messages = anthropic_request(request)
+            payload = [system, messages]
+            factory = lambda: stream_anthropic(api_key, model, system, messages, usage=usage, **kwargs)
+        else:
+            messages = openrouter_messages(request, model)
+            payload = messages
+            factory = lambda: stream_openrouter(api_key, model, messages, usage=usage, **kwargs)
+
+        # The key is a digest, so the API key is never held in plain text
+        key = hashlib.sha256(json.dumps([provider, api_key, model, payload], sort_keys=True).encode("utf-8")).hexdigest()
+        return lambda: self.scheduler.stream(provider, factory, key)
+
+    def stream_answer(self, question, provider, api_key, model, history=(), history_window=None,
+                      enable_web_search=False, serp_api_key=None, token_budget=RETRIEVAL_TOKEN_BUDGET,
+                      fallbacks=(), use_precomputed=True):
+        """
+        Answer `question` and yield pipeline events (see module docstring).
+        `history` is the conversation before the question; pass the session's
+        HistoryWindow to keep its rolling summary incremental across turns
+        (api_client.EngineClient takes the same argument and folds the
+        history before sending it, see server.py).
+        `fallbacks` lists further {"provider", "api_key", "model"} the router
+        may hedge or fail over to, in order of preference.
+        Direct metric lookups and FAQ questions are answered from the facts
+        table and the precomputed answers instead, unless web search asks
+        for fresher information or `use_precomputed` is False; FAQ answers
+        only for the first question of a conversation.
+        """
+        for name in [provider] + [fallback["provider"] for fallback in fallbacks]:
+            if name not in PROVIDERS:
+                raise ValueError(f"unknown provider {name!r}")
+
+        with self.tracer.trace("answer", provider=provider, model=model, web_search=enable_web_search) as trace:
+            yield from self._answer_events(trace, question, provider, api_key, model, history, history_window,
+                                           enable_web_search, serp_api_key, token_budget, fallbacks, use_precomputed)
+
+    def _answer_events(self, trace, question, provider, api_key, model, history, history_window,
+                       enable_web_search, serp_api_key, token_budget, fallbacks, use_precomputed):
+        """stream_answer()'s pipeline, recording its stages on `trace`."""
+        precomputed = use_precomputed and not enable_web_search
+        with trace.span("precomputed_lookup") as span:
+            fact = self.facts.answer(question) if precomputed else None
+            # A follow-up may be about whatever the conversation is about, not Vadilal
+            faq = self.faq.lookup(question) if precomputed and fact is None and not history else None
+            span["hit"] = "facts" if fact else "faq" if faq else None
+        if fact is not None:
+            with self._fact_lock:
+                self._fact_answers += 1
+            trace.set(outcome="facts")
+            self.tracer.count("answers", outcome="facts")
+            yield {"type": "facts", "facts": fact["facts"]}
+            yield {"type": "text", "text": fact["answer"]}
+            yield {"type": "done", "answer": fact["answer"]}
+            return
+        if faq is not None:
+            trace.set(outcome="faq")
+            self.tracer.count("answers", outcome="faq")
+            yield {"type": "faq", "question": faq["question"]}
+            yield {"type": "text", "text": faq["answer"]}
+            yield {"type": "done", "answer": faq["answer"]}
+            return
+
+        if enable_web_search:
+            yield {"type": "status", "stage": "searching"}
+        with trace.span("gather_context"):
+            knowledge_context, web_results, outcomes = self.gather_context(
+                question, enable_web_search, serp_api_key, token_budget)
+        for name, outcome in outcomes.items():
+            trace.add_span(f"source.{name}", outcome["seconds"], status=outcome["status"])
+        yield {"type": "sources", "sources": {
+            name: {key: value for key, value in outcome.items() if key != "result"}
+            for name, outcome in outcomes.items()
+        }}
+        knowledge = outcomes["knowledge_base"]["result"]
+        if knowledge:
+            context = {key: value for key, value in knowledge.items() if key != "text"}
+            trace.set(context_tokens_before=context["tokens_before"], context_tokens_after=context["tokens_after"])
+            self.tracer.count("context_tokens", context["tokens_before"], stage="before")
+            self.tracer.count("context_tokens", context["tokens_after"], stage="after")
+            yield {"type": "context", "context": context}
+
+        # Recent turns verbatim, older ones as a rolling summary
+        with trace.span("history_window") as span:
+            window = history_window if history_window is not None else HistoryWindow()
+            summary, recent = window.window(list(history), history_budget(model))
+            span["summarized"] = bool(summary)
+
+        # Stable persona + knowledge prefix first, date/summary/search results after it
+        with trace.span("build_prompt") as span:
+            request = build_prompt(knowledge_context, question, recent, summary, web_results)
+            if trace.enabled:
+                prompt_bytes = len(json.dumps(request).encode("utf-8"))
+                span["prompt_bytes"] = prompt_bytes
+                trace.set(prompt_bytes=prompt_bytes)
+        usages = []
+        candidates = []
+        for target in [{"provider": provider, "api_key": api_key, "model": model}] + list(fallbacks):
+            usages.append(empty_usage())
+            candidates.append((target["provider"], target["model"], self._provider_stream(
+                target["provider"], target["api_key"], target["model"], request, usages[-1])))
+        route = {}
+        parts = []
+        error = None
+        started = time.perf_counter()
+        first_token = None
+        # Served from the answer cache when the same request was answered before
+        chunks = self.response_cache.stream(model, cache_scope(request, web_results), recent, question,
+                                            lambda: self.router.stream(candidates, route))
+        try:
+            for text in chunks:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                parts.append(text)
+                yield {"type": "text", "text": text}
+        except ProviderError as e:
+            error = e
+            yield {"type": "error", "message": str(e), "status_code": e.status_code}
+        finally:
+            # Closing cancels the provider stream when the caller stops early
+            chunks.close()
+
+        if route.get("provider"):
+            yield {"type": "route", **route}
+        # Hedged requests are paid for too, so usage covers every call made
+        usage = empty_usage()
+        for counts in usages:
+            for key in usage:
+                usage[key] += counts[key]
+
+        # The router only runs when the answer cache missed
+        answer_cache = "miss" if route.get("provider") or error is not None else "hit"
+        outcome = "error" if error is not None else "cache" if answer_cache == "hit" else "llm"
+        trace.add_span("provider_call", time.perf_counter() - started,
+                       ttft_ms=round(first_token * 1000, 2) if first_token is not None else None,
+                       answer_cache=answer_cache, provider=route.get("provider"),
+                       hedged=route.get("hedged", False), failed_over=route.get("failed_over", False),
+                       error=error.status_code if error is not None else None, **usage)
+        trace.set(outcome=outcome, answer_cache=answer_cache, **usage)
+        self.tracer.count("answers", outcome=outcome)
+        for kind, tokens in usage.items():
+            self.tracer.count("tokens", tokens, kind=kind)
+        if answer_cache == "miss" and trace.enabled:
+            self.tracer.count("prompt_bytes", prompt_bytes)
+
+        if usage["input_tokens"] or usage["cache_read_tokens"]:
+            yield {"type": "usage", "usage": usage}
+        yield {"type": "done", "answer": "".join(parts).strip()}
+
+    def answer(self, question, provider, api_key, model, **kwargs):
+        """
+        Run stream_answer() to completion; returns {"answer", "sources",
+        "context", "facts", "faq", "route", "usage", "error"}.
+        """
+        result = {"answer": "", "sources": {}, "context": None, "facts": None, "faq": None, "route": None,
+                  "usage": None, "error": None}
+        for event in self.stream_answer(question, provider, api_key, model, **kwargs):
+            if event["type"] in ("sources", "context", "facts"):
+                result[event["type"]] = event[event["type"]]
+            elif event["type"] == "faq":
+                result["faq"] = event["question"]
+            elif event["type"] == "route":
+                result["route"] = {key: value for key, value in event.items() if key != "type"}
+            elif event["type"] == "usage":
+                result["usage"] = event["usage"]
+            elif event["type"] == "error":
+                result["error"] = event["message"]
+            elif event["type"] == "done":
+                result["answer"] = event["answer"]
+        return result
+
+    def stats(self):
+        """Cache, scheduler, provider health, facts and FAQ counters, plus the tracing summary."""
+        with self._fact_lock:
+            facts = {"stored": len(self.facts), "answered": self._fact_answers}
+        return {"search_cache": self.search_cache.stats(), "response_cache": self.response_cache.stats(),
+                "scheduler": self.scheduler.stats(), "providers": self.router.stats(), "facts": facts,
+                "faq": self.faq.stats(), "tracing": self.tracer.summary()}
+
+    def prometheus(self):
+        """Span histograms and counters plus cache, scheduler and provider metrics, in Prometheus text format."""
+        stats = self.stats()
+        response, search = stats["response_cache"], stats["search_cache"]
+        families = [
+            ("cache_lookups_total", "counter", "Answer and search cache lookups by outcome.", [
+                ({"cache": "answer", "outcome": "exact_hit"}, response["exact_hits"]),
+                ({"cache": "answer", "outcome": "similar_hit"}, response["similar_hits"]),
+                ({"cache": "answer", "outcome": "miss"}, response["misses"]),
+                ({"cache": "search", "outcome": "memory_hit"}, search["memory_hits"]),
+                ({"cache": "search", "outcome": "db_hit"}, search["db_hits"]),
+                ({"cache": "search", "outcome": "miss"}, search["misses"]),
+            ]),
+            ("scheduler_waiting", "gauge", "Calls waiting for a provider's rate limit.",
+             [({"provider": name}, lane["waiting"]) for name, lane in stats["scheduler"].items()]),
+            ("circuit_open", "gauge", "1 while a provider/model circuit breaker is open.",
+             [({"target": name}, int(health["state"] != "closed")) for name, health in stats["providers"].items()]),
+            ("faq_answers", "gauge", "Precomputed FAQ answers current for the knowledge base.",
+             [({}, stats["faq"]["answered"])]),
+        ]
+        return self.tracer.prometheus(families)
+
+    def close(self):
+        self.tracer.flush()
+        self.storage.close()
@@ -0,0 +1,294 @@
+"""
+Precomputed answers for the questions users ask most.
+
+FAQ_QUESTIONS is the curated set: a canonical question plus the usual ways
+of phrasing it. A batch job (this module's CLI, or the engine's background
+warm-up when FAQ_API_KEY is set) answers every canonical question through
+the normal LLM pipeline and stores the answer in the `faq_answers` table
+with the knowledge-base version it was built on.
+
+At query time FAQIndex normalises the question (lower case, no stop words
+or company name, crude stemming, a few synonyms such as factory -> plant)
+to a set of terms and matches it against the variants: an exact term-set
+hit first, then the closest variant by Jaccard similarity (at least
+`min_similarity`, the numbers must agree and every term must occur in some
+variant, so "Amul's market share" never matches "Vadilal's market
+share"). Only answers built on the current knowledge version are served;
+when the version changes they stop matching and are generated again in the
+background.
+
+Usage:
+    python faq.py --provider openrouter --api-key sk-... [--model anthropic/claude-3-haiku] [--force]
+"""
+import re
+import time
+import threading
+
+from llm_providers import ProviderError
+
+# Canonical question first, then other phrasings of the same question
+FAQ_QUESTIONS = (
+    ("What is the history of Vadilal?",
+     "Tell me about Vadilal's history", "How did Vadilal start?", "When was Vadilal founded?",
+     "Who founded Vadilal?"),
+    ("Where are Vadilal's manufacturing plants?",
+     "Where are Vadilal's factories located?", "What manufacturing facilities does Vadilal have?",
+     "How many plants does Vadilal have?", "Where does Vadilal manufacture its ice cream?"),
+    ("What is Vadilal's market share in the Indian ice cream market?",
+     "What is Vadilal's market share?", "How big is Vadilal's share of the ice cream market?",
+     "What share of the Indian ice cream market does Vadilal have?"),
+    ("Who are Vadilal's main competitors?",
+     "Who competes with Vadilal?", "Who are the biggest competitors of Vadilal?",
+     "Who are Vadilal's rivals in ice cream?"),
+    ("How has Vadilal performed financially over the last three years?",
+     "Give me an overview of Vadilal's financial performance", "Summarize Vadilal's financials",
+     "How are Vadilal's financials?"),
+    ("What is Vadilal's shareholding pattern?",
+     "Who owns Vadilal?", "What is the shareholding structure of Vadilal?"),
+    ("What products does Vadilal sell?",
+     "What are Vadilal's main products?", "What does Vadilal make?",
+     "What products does Vadilal make?", "What is Vadilal's product range?"),
+    ("Which countries does Vadilal export to?",
+     "Where does Vadilal export?", "What are Vadilal's export markets?",
+     "What is Vadilal's international presence?"),
+    ("How does Vadilal distribute its products?",
+     "What is Vadilal's distribution network?", "How big is Vadilal's distribution network?"),
+    ("What is Vadilal's corporate structure?",
+     "What are Vadilal's subsidiaries?", "What companies are part of the Vadilal group?"),
+    ("What are the key trends in the Indian ice cream industry?",
+     "What trends are driving the Indian ice cream market?", "What are the latest ice cream industry trends?"),
+    ("What are Vadilal's strengths and weaknesses?",
+     "What are Vadilal's competitive strengths?", "What are the weaknesses of Vadilal?"),
+)
+
+# Words that do not change which FAQ a question is. Pronouns ("it", "their",
+# "this", ...) are not among them: no variant contains them on their own, so
+# "Who founded it?" matches nothing instead of Vadilal's history
+STOPWORDS = frozenset("""
+    a an the of in on at to for by and or with is are was were be been being do does did has have had
+    can could would will tell me about give please you your
+    some any much vadilal vadilals industries company ltd limited
+""".split())
+
+# Stemmed word -> the term used in the index
+SYNONYMS = {
+    "factory": "plant", "facility": "plant", "manufactur": "plant", "unit": "plant",
+    "found": "history", "start": "history", "establish": "history", "begin": "history", "began": "history",
+    "origin": "history",
+    "compet": "competitor", "compete": "competitor", "rival": "competitor",
+    "financially": "financial", "performed": "perform",
+    "own": "shareholding", "owner": "shareholding", "shareholder": "shareholding",
+    "india": "indian",
+}
+
+WORD = re.compile(r"[a-z0-9]+(?:\.\d+)?")
+MIN_SIMILARITY = 0.75
+
+
+def _stem(word):
+    """Strip one common suffix; crude, but applied alike to the FAQ and the question."""
+    for suffix, replacement in (("ies", "y"), ("ing", ""), ("ed", ""), ("es", ""), ("s", "")):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def question_terms(text):
+    """Normalised term set of a question (see module docstring)."""
+    text = (text or "").lower().replace("’", "'").replace("'s", "")
+    terms = set()
+    for word in WORD.findall(text):
+        if word in STOPWORDS:
+            continue
+        stemmed = _stem(word)
+        terms.add(SYNONYMS.get(stemmed, stemmed))
+    return frozenset(terms)
+
+
+def _numbers(terms):
+    return {term for term in terms if term[0].isdigit()}
+
+
+class FAQIndex:
+    """Maps a question to the canonical FAQ question it asks, if any."""
+
+    def __init__(self, questions=FAQ_QUESTIONS, min_similarity=MIN_SIMILARITY):
+        self.min_similarity = min_similarity
+        self.canonical = [variants[0] for variants in questions]
+        self._exact = {}
+        self._variants = []
+        self._postings = {}
+        for variants in questions:
+            for variant in variants:
+                terms = question_terms(variant)
+                self._exact.setdefault(terms, variants[0])
+                for term in terms:
+                    self._postings.setdefault(term, []).append(len(self._variants))
+                self._variants.append((terms, variants[0]))
+
+    def match(self, question):
+        """(canonical question, similarity) for the best matching FAQ, or None."""
+        terms = question_terms(question)
+        if not terms:
+            return None
+        if terms in self._exact:
+            return self._exact[terms], 1.0
+        if any(term not in self._postings for term in terms):
+            return None
+
+        shared = {}
+        for term in terms:
+            for position in self._postings.get(term, ()):
+                shared[position] = shared.get(position, 0) + 1
+        best = None
+        for position, overlap in shared.items():
+            variant_terms, canonical = self._variants[position]
+            similarity = overlap / len(terms | variant_terms)
+            if similarity >= self.min_similarity and (best is None or similarity > best[1]) \
+                    and _numbers(variant_terms) == _numbers(terms):
+                best = canonical, similarity
+        return best
+
+
+class PrecomputedAnswers:
+    """
+    FAQ answers for the current knowledge version, backed by a
+    StorageHandler. `generate(question)` returns a fresh answer (or raises
+    ProviderError); without it answers are only served, never built. With
+    `auto_warm_up`, missing answers are generated in the background as soon
+    as refresh() notices them. Thread-safe.
+    """
+
+    def __init__(self, storage, knowledge_version, generate=None, model="", auto_warm_up=True, index=None):
+        self.storage = storage
+        self.knowledge_version = knowledge_version
+        self.generate = generate
+        self.model = model
+        self.auto_warm_up = auto_warm_up
+        self.index = index or FAQIndex()
+        self._answers = {}
+        self._version = None
+        self._warming = False
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "generated": 0, "failed": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def refresh(self):
+        """
+        Load the stored answers when the knowledge version changed (and start
+        the background warm-up for missing ones). Returns the version.
+        """
+        version = self.knowledge_version()
+        with self._lock:
+            changed = version != self._version
+        if changed:
+            answers = self.storage.get_faq_answers(version)
+            with self._lock:
+                self._version = version
+                self._answers = {question: answers[question]
+                                 for question in self.index.canonical if question in answers}
+            if self.auto_warm_up:
+                self.warm_up()
+        return version
+
+    def lookup(self, question):
+        """{"question": canonical question, "answer", "similarity"} for an FAQ with a current answer, or None."""
+        self.refresh()
+        matched = self.index.match(question)
+        with self._lock:
+            answer = self._answers.get(matched[0]) if matched else None
+        if answer is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return {"question": matched[0], "answer": answer, "similarity": matched[1]}
+
+    def missing(self):
+        with self._lock:
+            return [question for question in self.index.canonical if question not in self._answers]
+
+    def warm_up(self, force=False, background=True):
+        """
+        Generate the answers that are missing for the current version (all
+        of them with `force`). Runs on a daemon thread unless `background`
+        is False; at most one warm-up runs at a time. Returns False when
+        there is nothing to do or no generator.
+        """
+        if self.generate is None:
+            return False
+        with self._lock:
+            if self._warming:
+                return False
+            questions = list(self.index.canonical) if force else \
+                [question for question in self.index.canonical if question not in self._answers]
+            if not questions:
+                return False
+            self._warming = True
+        if background:
+            threading.Thread(target=self._build, args=(questions,), daemon=True, name="faq-warmup").start()
+        else:
+            self._build(questions)
+        return True
+
+    def _build(self, questions):
+        try:
+            for question in questions:
+                version = self.knowledge_version()
+                with self._lock:
+                    if version != self._version:
+                        # The knowledge changed under us; the next refresh() starts over
+                        return
+                try:
+                    answer = (self.generate(question) or "").strip()
+                except ProviderError:
+                    self._count("failed")
+                    continue
+                if not answer:
+                    self._count("failed")
+                    continue
+                self.storage.save_faq_answer(question, answer, self.model, version)
+                with self._lock:
+                    if version == self._version:
+                        self._answers[question] = answer
+                self._count("generated")
+        finally:
+            with self._lock:
+                self._warming = False
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "questions": len(self.index.canonical), "answered": len(self._answers),
+                    "warming": self._warming}
+
+
+def main():
+    import argparse
+    from engine import QueryEngine, DB_PATH, MODEL_OPTIONS
+
+    parser = argparse.ArgumentParser(description="Generate the precomputed FAQ answers for the current knowledge base.")
+    parser.add_argument("--provider", choices=sorted(MODEL_OPTIONS), default="openrouter")
+    parser.add_argument("--api-key", required=True)
+    parser.add_argument("--model", help="model id (default: the provider's first model)")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--force", action="store_true", help="regenerate answers that are already current")
+    args = parser.parse_args()
+
+    model = args.model or next(iter(MODEL_OPTIONS[args.provider].values()))
+    engine = QueryEngine(args.db, faq_settings={"provider": args.provider, "api_key": args.api_key, "model": model},
+                         faq_warmup=False)
+    started = time.perf_counter()
+    engine.faq.refresh()
+    engine.faq.warm_up(force=args.force, background=False)
+    stats = engine.faq.stats()
+    print(f"{stats['generated']} generated, {stats['failed']} failed, "
+          f"{stats['answered']}/{stats['questions']} current in {time.perf_counter() - started:.1f}s")
+    for question in engine.faq.missing():
+        print(f"  no answer: {question}")
+    engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Typed financial facts and a no-LLM fast path for direct metric lookups.
+
+The knowledge text ends with two tables flattened to one cell per line: the
+fiscal-year summary (revenue, net profit, EBITDA, margins, capex and debt per
+FY) and the shareholding pattern. ingest_facts() parses them into the
+`financial_facts` table (one row per metric and period), and FactIndex keeps
+them in memory to answer questions such as "net profit FY 2022-23" or
+"promoter holding" directly, in microseconds and without an API call.
+
+The matcher only answers plain lookups: exactly one known metric, at most one
+fiscal year that exists in the table, and otherwise only filler words ("what
+was", "the", "Vadilal's", ...). Anything asking for explanation, comparison
+or data the table does not hold (standalone figures, forecasts, ...) returns
+None and goes to the LLM.
+
+Usage:
+    python financial_facts.py --db vadilal_data.db "net profit FY 2022-23"
+"""
+import re
+import argparse
+
+# key -> (label, question patterns). Patterns also map table headers to keys;
+# more specific metrics come first so "net profit margin" is not "net profit"
+METRICS = (
+    ("ebitda_margin", "EBITDA margin", (r"ebitda margins?", r"operating margins?")),
+    ("net_profit_margin", "net profit margin", (r"net profit margins?", r"net margins?", r"pat margins?",
+                                                r"profit margins?")),
+    ("revenue", "annual revenue", (r"revenues?", r"sales", r"turnover", r"top ?line")),
+    ("net_profit", "net profit", (r"net profits?", r"profit after tax", r"pat", r"net income", r"earnings",
+                                  r"profits?")),
+    ("ebitda", "EBITDA", (r"ebitda", r"operating profits?")),
+    ("capex", "capital expenditure", (r"capital expenditures?", r"capex", r"capital spending")),
+    ("long_term_debt", "long-term debt", (r"long[- ]term debt", r"debt", r"borrowings?")),
+    ("promoter_holding", "promoter & promoter group holding",
+     (r"promoters?(?:'s?)?(?: & promoter)?(?: group)? (?:holding|stake|shareholding)",)),
+    ("public_holding", "public shareholding", (r"public (?:holding|stake|shareholding)",)),
+    ("fii_holding", "FII holding", (r"(?:fiis?|foreign institutional(?: investors?)?) (?:holding|stake|shareholding)",)),
+    ("dii_holding", "DII holding", (r"(?:diis?|domestic institutional(?: investors?)?) (?:holding|stake|shareholding)",)),
+)
+
+_METRIC_PATTERNS = [
+    (key, label, re.compile(r"\b(?:" + "|".join(patterns) + r")\b", re.IGNORECASE))
+    for key, label, patterns in METRICS
+]
+METRIC_LABELS = {key: label for key, label, _ in METRICS}
+
+# Besides the metric and the fiscal year, a lookup may only contain these
+# words; anything else ("why", "standalone", "channels", "compare", ...) means
+# the question wants more than a table cell
+FILLER_WORDS = frozenset("""
+    a an the of in for at on to by and is was were are what whats what's tell me give show please
+    much how did does do has have had make made earn earned report reported vadilal vadilal's industries group company
+    ltd limited total consolidated annual current latest recent figure value amount number ratio percentage
+    percent share shares held holding stake shareholding fiscal financial year fy crore crores inr rs
+""".split())
+WORD = re.compile(r"[a-z0-9&'%.]+")
+
+FY_LABEL = re.compile(r"^FY (\d{4})-(\d{2})$")
+# "FY 2022-23", "FY22-23", "FY23", "fy 2023", "2022-23"
+FY_IN_QUESTION = re.compile(
+    r"\bFY\s*'?(\d{2}|\d{4})(?:\s*[-–/]\s*'?(\d{2}|\d{4}))?\b|\b(20\d{2})\s*[-–/]\s*(\d{2}|20\d{2})\b",
+    re.IGNORECASE
+)
+NUMBER = re.compile(r"^(~)?\s*(-?\d+(?:\.\d+)?)$")
+TABLE_TITLE = re.compile(r"^Table \d+:\s*(.+)$", re.MULTILINE)
+
+
+def metric_key(text):
+    """Canonical metric for a table header or question fragment, or None."""
+    for key, _, pattern in _METRIC_PATTERNS:
+        if pattern.search(text):
+            return key
+    return None
+
+
+def _unit(header):
+    if "%" in header:
+        return "%"
+    if re.search(r"crore", header, re.IGNORECASE):
+        return "INR crore"
+    return ""
+
+
+def _number(cell):
+    """(value, display text, approximate) for a numeric cell, or None."""
+    match = NUMBER.match(cell.strip())
+    if not match:
+        return None
+    return float(match.group(2)), match.group(2), bool(match.group(1))
+
+
+def _title(text, keyword):
+    """The title of the first "Table N: ..." caption containing `keyword`."""
+    for title in TABLE_TITLE.findall(text):
+        if keyword.lower() in title.lower():
+            return title
+    return ""
+
+
+def parse_fiscal_table(text):
+    """
+    Facts from the flattened fiscal-year table: a "Fiscal Year" line, one
+    header line per metric, then per year an "FY YYYY-YY" line followed by
+    one value per metric.
+    """
+    lines = [line.strip() for line in text.splitlines()]
+    if "Fiscal Year" not in lines:
+        return []
+    start = lines.index("Fiscal Year") + 1
+    headers = []
+    while start < len(lines) and lines[start] and not FY_LABEL.match(lines[start]):
+        headers.append(lines[start])
+        start += 1
+
+    basis = "consolidated" if "consolidated" in _title(text, "Financial").lower() else ""
+    facts = []
+    position = start
+    while position < len(lines) and FY_LABEL.match(lines[position]):
+        period = lines[position]
+        cells = lines[position + 1:position + 1 + len(headers)]
+        for header, cell in zip(headers, cells):
+            parsed = _number(cell)
+            key = metric_key(re.sub(r"\(.*?\)", "", header).strip())
+            if parsed is None or key is None:
+                continue
+            value, display, approximate = parsed
+            facts.append({"metric": key, "period": period, "value": value, "display": display,
+                          "unit": _unit(header), "basis": basis, "approximate": approximate})
+        position += 1 + len(headers)
+    return facts
+
+
+def parse_shareholding_table(text):
+    """Facts from the flattened shareholding table: category / percentage line pairs."""
+    lines = [line.strip() for line in text.splitlines()]
+    if "Shareholder Category" not in lines:
+        return []
+    position = lines.index("Shareholder Category") + 1
+    if position < len(lines) and "%" in lines[position]:
+        position += 1
+
+    as_of = re.search(r"(?:Latest\s*-\s*)?([A-Z][a-z]+ \d{1,2}, \d{4})", _title(text, "Shareholding"))
+    period = f"as of {as_of.group(1)}" if as_of else "latest"
+    facts = []
+    while position + 1 < len(lines):
+        key, parsed = metric_key(f"{lines[position]} holding"), _number(lines[position + 1])
+        if key is None or parsed is None:
+            break
+        value, display, approximate = parsed
+        facts.append({"metric": key, "period": period, "value": value, "display": display,
+                      "unit": "%", "basis": "", "approximate": approximate})
+        position += 2
+    return facts
+
+
+def extract_facts(text):
+    return parse_fiscal_table(text) + parse_shareholding_table(text)
+
+
+def ingest_facts(storage, documents):
+    """Parse every (source, text) document and store its facts. Returns the number of facts parsed."""
+    count = 0
+    for source, text in documents:
+        facts = extract_facts(text)
+        storage.save_financial_facts(source, facts)
+        count += len(facts)
+    return count
+
+
+def fiscal_year(start, end=None):
+    """Normalise a fiscal year mention to the table's "FY YYYY-YY" label."""
+    if end is None:
+        # "FY23" / "FY 2023": the Indian fiscal year ending in March of that year
+        ending = int(start) if len(start) == 4 else 2000 + int(start)
+        return f"FY {ending - 1}-{ending % 100:02d}"
+    first = int(start) if len(start) == 4 else 2000 + int(start)
+    return f"FY {first}-{(first + 1) % 100:02d}"
+
+
+def _format_value(fact):
+    about = "about " if fact["approximate"] else ""
+    if fact["unit"] == "INR crore":
+        return f"{about}₹ {fact['display']} crore"
+    return f"{about}{fact['display']}{fact['unit']}"
+
+
+class FactIndex:
+    """In-memory facts ({metric: {period: fact}}) plus the lookup matcher."""
+
+    def __init__(self, facts):
+        self.facts = {}
+        for fact in facts:
+            self.facts.setdefault(fact["metric"], {})[fact["period"]] = fact
+
+    @classmethod
+    def from_storage(cls, storage):
+        return cls(storage.get_financial_facts())
+
+    def __len__(self):
+        return sum(len(periods) for periods in self.facts.values())
+
+    def match(self, question):
+        """
+        (metric, period or None) when `question` is a direct lookup of one
+        stored fact, else None.
+        """
+        text = (question or "").strip()
+        if not text:
+            return None
+
+        periods = {fiscal_year(m.group(1) or m.group(3), m.group(2) or m.group(4))
+                   for m in FY_IN_QUESTION.finditer(text)}
+        remainder = FY_IN_QUESTION.sub(" ", text)
+        metrics = []
+        for key, _, pattern in _METRIC_PATTERNS:
+            if pattern.search(remainder):
+                metrics.append(key)
+                # Consume the match so "net profit margin" does not also count as "net profit"
+                remainder = pattern.sub(" ", remainder)
+        if len(metrics) != 1 or len(periods) > 1 or metrics[0] not in self.facts:
+            return None
+        if any(word.strip("'.%") not in FILLER_WORDS and word.strip("'.%")
+               for word in WORD.findall(remainder.lower().replace("’", "'"))):
+            return None
+        period = next(iter(periods), None)
+        if period is not None and period not in self.facts[metrics[0]]:
+            return None
+        return metrics[0], period
+
+    def answer(self, question):
+        """
+        {"answer", "facts"} for a direct metric lookup, or None. Without a
+        fiscal year the latest one is given first, followed by the others.
+        """
+        matched = self.match(question)
+        if matched is None:
+            return None
+        metric, period = matched
+        periods = self.facts[metric]
+        if period is None:
+            ordered = sorted(periods, reverse=True)
+        else:
+            ordered = [period]
+
+        first = periods[ordered[0]]
+        label = f"{first['basis']} {METRIC_LABELS[metric]}".strip()
+        when = f"for {first['period']}" if first["period"].startswith("FY") else first["period"]
+        answer = f"Vadilal Industries' {label} {when} was {_format_value(first)}."
+        if len(ordered) > 1:
+            others = "; ".join(f"{p}: {_format_value(periods[p])}" for p in ordered[1:])
+            answer += f" Earlier years: {others}."
+        return {"answer": answer, "facts": [periods[p] for p in ordered]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse the knowledge tables into facts and answer a lookup.")
+    parser.add_argument("question", nargs="?")
+    parser.add_argument("--db", default="vadilal_data.db")
+    args = parser.parse_args()
+
+    from storage_handler import StorageHandler
+    from knowledge_base import load_documents
+    storage = StorageHandler(args.db)
+    print(f"parsed {ingest_facts(storage, load_documents())} facts")
+    index = FactIndex.from_storage(storage)
+    storage.close()
+    if args.question:
+        result = index.answer(args.question)
+        print(result["answer"] if result else "not a direct lookup; would go to the LLM")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Token-budgeted conversation history.
+
+Sending the whole chat with every question makes prompts (and latency) grow
+without bound. HistoryWindow keeps the most recent turns verbatim within a
+per-model token budget and folds older turns into a rolling summary:
+    - turns are folded oldest first, in user/assistant pairs, so the kept
+      messages still start with a user turn,
+    - each folded turn is condensed locally (no extra API call) into one
+      summary line and appended, so the work per question is bounded by the
+      number of newly folded turns, not the length of the chat,
+    - the summary itself is capped at `summary_budget` tokens by dropping its
+      oldest lines.
+One HistoryWindow is kept per chat session (see chat_store.ChatSession).
+"""
+import re
+
+from retrieval import estimate_tokens
+
+# Tokens of verbatim history sent with each question, by model id substring;
+# smaller-context models get less
+HISTORY_BUDGETS = (
+    ("llama-3-70b", 1200),
+    ("gpt-3.5", 1500),
+    ("claude-3-haiku", 2000),
+)
+DEFAULT_HISTORY_BUDGET = 2500
+
+# Per-message framing overhead (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def history_budget(model):
+    """Verbatim-history token budget for `model`."""
+    for pattern, budget in HISTORY_BUDGETS:
+        if pattern in (model or ""):
+            return budget
+    return DEFAULT_HISTORY_BUDGET
+
+
+def message_tokens(message):
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _condense(text, max_chars):
+    """First sentence(s) of `text` up to roughly `max_chars` characters."""
+    text = re.sub(r"\s+", " ", re.sub(r"<[^>]+>", " ", text or "")).strip()
+    if len(text) <= max_chars:
+        return text
+    condensed = ""
+    for sentence in SENTENCE_END.split(text):
+        if condensed and len(condensed) + len(sentence) + 1 > max_chars:
+            break
+        condensed = f"{condensed} {sentence}".strip()
+    return condensed if len(condensed) <= max_chars else condensed[:max_chars].rstrip() + "…"
+
+
+def summarize_turn(messages):
+    """One summary line for a folded user/assistant exchange."""
+    parts = []
+    for message in messages:
+        if message["role"] == "user":
+            parts.append(f"User asked: {_condense(message['content'], 160)}")
+        else:
+            parts.append(f"Assistant answered: {_condense(message['content'], 240)}")
+    return "- " + " ".join(parts)
+
+
+class HistoryWindow:
+    """
+    Rolling summary plus verbatim recent turns for one conversation. State is
+    incremental: `folded` leading messages are already in the summary. Pass
+    `summary` to continue a summary made elsewhere (e.g. by an API client).
+    """
+
+    def __init__(self, summary_budget=400, min_recent_messages=2, summary=""):
+        self.summary_budget = summary_budget
+        self.min_recent_messages = min_recent_messages
+        self.folded = 0
+        self.summary_lines = summary.split("\n") if summary else []
+
+    @property
+    def summary(self):
+        return "\n".join(self.summary_lines)
+
+    def reset(self):
+        self.folded = 0
+        self.summary_lines = []
+
+    def discard(self, count):
+        """
+        The first `count` messages were dropped from the conversation list
+        (e.g. to cap memory); only already-folded messages can be dropped.
+        Returns how many may actually be removed.
+        """
+        count = max(0, min(count, self.folded))
+        self.folded -= count
+        return count
+
+    def _fold(self, messages):
+        self.summary_lines.append(summarize_turn(messages))
+        self.folded += len(messages)
+        while len(self.summary_lines) > 1 and estimate_tokens(self.summary) > self.summary_budget:
+            self.summary_lines.pop(0)
+
+    def window(self, messages, budget):
+        """
+        Return (summary, recent_messages) for `messages` (the conversation so
+        far, without the new question) so that the recent messages plus the
+        summary fit in `budget` tokens where possible.
+        """
+        if len(messages) < self.folded:
+            # The conversation was cleared or replaced
+            self.reset()
+
+        start = self.folded
+        recent_tokens = sum(message_tokens(m) for m in messages[start:])
+        while (len(messages) - start > self.min_recent_messages
+               and recent_tokens + estimate_tokens(self.summary) > budget):
+            # Fold one exchange: up to and including the next assistant reply
+            end = start + 1
+            while end < len(messages) and messages[end]["role"] != "user":
+                end += 1
+            if len(messages) - end < self.min_recent_messages:
+                break
+            recent_tokens -= sum(message_tokens(m) for m in messages[start:end])
+            self._fold(messages[start:end])
+            start = end
+
+        recent = [{"role": m["role"], "content": m["content"]} for m in messages[self.folded:]]
+        return self.summary, recent
@@ -0,0 +1,88 @@
+"""
+Process-wide HTTP client shared by every outbound call.
+
+Streamlit reruns the script on every interaction, so module-level
+`requests.get/post` calls never reuse a connection and pay a fresh TCP+TLS
+handshake each time. get_session() returns one requests.Session per process
+(modules are imported once, so it survives reruns and is shared by all
+sessions) with:
+    - per-host keep-alive connection pools (HTTP_POOL_CONNECTIONS hosts,
+      HTTP_POOL_MAXSIZE connections per host),
+    - default (connect, read) timeouts (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+      for calls that do not pass their own,
+    - retries with exponential backoff and full jitter on connection errors
+      and 502/503/504, for idempotent methods only (GET, HEAD, ...), honouring
+      Retry-After. POST and PATCH are never retried automatically.
+"""
+import os
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUSES = (502, 503, 504)
+
+
+class JitteredRetry(Retry):
+    """urllib3 Retry with full jitter: each backoff is drawn from [0, exponential backoff]."""
+
+    def get_backoff_time(self):
+        return random.uniform(0, super().get_backoff_time())
+
+
+class PooledSession(requests.Session):
+    """requests.Session that applies a default timeout to every request."""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.default_timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.default_timeout)
+        return super().request(method, url, **kwargs)
+
+
+def create_session(pool_connections=None, pool_maxsize=None, retries=3, backoff_factor=0.5,
+                   connect_timeout=None, read_timeout=None):
+    """Build a pooled session; unspecified sizes and timeouts come from the environment."""
+    pool_connections = pool_connections or int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+    pool_maxsize = pool_maxsize or int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+    timeout = (
+        connect_timeout or float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+        read_timeout or float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+    )
+
+    retry = JitteredRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        # Hand the final response back so callers can inspect the status code
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+
+    session = PooledSession(timeout)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide pooled session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
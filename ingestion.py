@@ -0,0 +1,85 @@
+"""
+Versioned, incremental ingestion of the knowledge text.
+
+StorageHandler.save_text_data() splits the document into content-defined,
+hash-keyed chunks and diffs them against the previous version. This module
+follows that diff through the rest of the pipeline: only added (or never
+embedded) chunks are encoded and upserted, tombstoned chunks are deleted from
+the embeddings table and the search indexes, and everything else is skipped.
+
+Usage:
+    python ingestion.py --db vadilal_data.db vadilal_deepsearch.txt
+"""
+import time
+import argparse
+
+from embedder import embed_chunks, load_or_fit_embedder
+
+
+def text_chunk_id(chunk_hash):
+    """Embedding chunk id for a text_chunks row."""
+    return f"text:{chunk_hash[:16]}"
+
+
+def ingest_text(storage, content, embedder=None):
+    """
+    Store `content` as the new text data version and bring the embeddings in
+    line with it. Returns a report of the work done and skipped.
+    """
+    started = time.perf_counter()
+    diff = storage.save_text_data(content)
+
+    active = storage.get_text_chunks()
+
+    # Added chunks plus any active chunk that has no vector yet (first run,
+    # interrupted ingestion); everything else already has an up-to-date vector
+    embedded = storage.existing_chunk_ids(text_chunk_id(h) for h, _ in active)
+    pending = [(h, chunk) for h, chunk in active if text_chunk_id(h) not in embedded]
+
+    encoded = 0
+    if pending:
+        if embedder is None:
+            embedder = load_or_fit_embedder(storage, [chunk for _, chunk in active])
+        matrix, encoded = embed_chunks(storage, embedder, [chunk for _, chunk in pending])
+        storage.save_embeddings_bulk(
+            (text_chunk_id(h), chunk, matrix[i]) for i, (h, chunk) in enumerate(pending)
+        )
+
+    removed = storage.delete_embeddings(text_chunk_id(h) for h in diff["removed"])
+
+    total = diff["total"]
+    return {
+        "version": diff["version"],
+        "chunks": total,
+        "added": len(diff["added"]),
+        "removed": len(diff["removed"]),
+        "unchanged": diff["unchanged"],
+        "upserted": len(pending),
+        "encoded": encoded,
+        "embeddings_deleted": removed,
+        "skipped_ratio": (total - len(pending)) / total if total else 1.0,
+        "seconds": time.perf_counter() - started
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a new version of the knowledge text.")
+    parser.add_argument("file")
+    parser.add_argument("--db", default="vadilal_data.db")
+    args = parser.parse_args()
+
+    from storage_handler import StorageHandler
+    storage = StorageHandler(args.db)
+    with open(args.file, encoding="utf-8") as f:
+        report = ingest_text(storage, f.read())
+    storage.close()
+
+    print(f"version {report['version']}: {report['chunks']} chunks, "
+          f"+{report['added']} -{report['removed']} ={report['unchanged']}")
+    print(f"upserted {report['upserted']} ({report['encoded']} encoded), "
+          f"deleted {report['embeddings_deleted']}, skipped {report['skipped_ratio']:.0%} "
+          f"in {report['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Streaming clients for the LLM providers.
+
+`stream_openrouter` and `stream_anthropic` are generators that yield text
+deltas as the provider sends them over server-sent events (SSE), so callers
+can render the first tokens while the rest of the answer is still being
+generated. Errors before or during the stream are raised as ProviderError
+with a user-facing message. Pass a dict as `usage` to receive the token
+counts, including prompt-cache reads and writes (see empty_usage()).
+Closing the generator (for example when the Streamlit script is stopped)
+closes the HTTP connection and cancels the generation.
+"""
+import json
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from http_client import get_session
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+ANTHROPIC_URL = "https://api.anthropic.com/v1/messages"
+ANTHROPIC_VERSION = "2023-06-01"
+
+# (connect, read) timeouts: the read timeout bounds the gap between two
+# streamed events, not the whole generation
+STREAM_TIMEOUT = (10, 60)
+
+
+def empty_usage():
+    """Token counts reported by a streamed call."""
+    return {"input_tokens": 0, "output_tokens": 0, "cache_read_tokens": 0, "cache_write_tokens": 0}
+
+
+class ProviderError(Exception):
+    """
+    A provider call failed; str(error) is safe to show to the user.
+    `retry_after` is the provider's Retry-After in seconds, if it sent one.
+    """
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def describe_http_error(e):
+    """Turn a requests exception into a user-facing message."""
+    error_msg = f"API Error: {str(e)}"
+    response = getattr(e, "response", None)
+    if response is not None:
+        if response.status_code == 400:
+            error_msg = "Error 400: Bad request. Please check your API key and parameters."
+        elif response.status_code == 401:
+            error_msg = "Error 401: Authentication failed. Please check your API key."
+        elif response.status_code == 429:
+            error_msg = "Error 429: Too many requests. Please try again later."
+
+        # Try to get more details from response
+        try:
+            response_json = response.json()
+            error = response_json.get("error") if isinstance(response_json, dict) else None
+            if isinstance(error, dict) and "message" in error:
+                error_msg += f"\nDetails: {error['message']}"
+        except ValueError:
+            pass
+    return error_msg
+
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a streaming SSE response."""
+    response.encoding = "utf-8"
+    event = None
+    data = []
+    # chunk_size=None hands over data as soon as it arrives instead of waiting
+    # to fill a fixed-size buffer, which would delay the first tokens
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if not line:
+            # A blank line terminates the current event
+            if data:
+                yield event, "\n".join(data)
+            event = None
+            data = []
+            continue
+        if line.startswith(":"):
+            # Comment / keep-alive
+            continue
+
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "event":
+            event = value
+        elif field == "data":
+            data.append(value)
+
+    if data:
+        yield event, "\n".join(data)
+
+
+def _finish_stream(response):
+    """
+    Read what is left of a completed stream (normally just the chunked-encoding
+    terminator) so the connection goes back to the pool instead of being closed.
+    """
+    for _ in response.iter_content(chunk_size=None):
+        pass
+
+
+def _post_stream(url, headers, payload):
+    """POST a streaming request, raising ProviderError for HTTP failures."""
+    try:
+        response = get_session().post(url, headers=headers, json=payload, stream=True, timeout=STREAM_TIMEOUT)
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as e:
+        message = describe_http_error(e)
+        e.response.close()
+        raise ProviderError(message, e.response.status_code, parse_retry_after(e.response.headers.get("Retry-After"))) from e
+    except requests.exceptions.RequestException as e:
+        raise ProviderError(describe_http_error(e)) from e
+    return response
+
+
+def stream_openrouter(api_key, model, messages, temperature=0.7, max_tokens=1000,
+                      url=OPENROUTER_URL, usage=None):
+    """Stream a chat completion from OpenRouter, yielding text deltas."""
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "https://vadilal-chat-agent.streamlit.app/",
+        "X-Title": "Vadilal Assistant"
+    }
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": True,
+        # Ask for token counts (incl. cached prompt tokens) in the last chunk
+        "usage": {"include": True}
+    }
+
+    response = _post_stream(url, headers, payload)
+    with response:
+        try:
+            for _, data in iter_sse(response):
+                if data == "[DONE]":
+                    _finish_stream(response)
+                    return
+                chunk = json.loads(data)
+                if "error" in chunk:
+                    raise ProviderError(f"API Error: {chunk['error'].get('message', chunk['error'])}")
+                if usage is not None and chunk.get("usage"):
+                    counts = chunk["usage"]
+                    usage["input_tokens"] = counts.get("prompt_tokens", 0)
+                    usage["output_tokens"] = counts.get("completion_tokens", 0)
+                    usage["cache_read_tokens"] = (counts.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+                for choice in chunk.get("choices", []):
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        yield text
+        except requests.exceptions.RequestException as e:
+            raise ProviderError(f"Connection lost while streaming: {e}") from e
+        except ValueError as e:
+            raise ProviderError(f"Malformed streaming response: {e}") from e
+
+
+def stream_anthropic(api_key, model, system, messages, max_tokens=1000,
+                     url=ANTHROPIC_URL, usage=None):
+    """
+    Stream a message from the Anthropic Messages API, yielding text deltas.
+    `system` is a string or a list of text blocks (which may carry
+    cache_control breakpoints).
+    """
+    headers = {
+        "x-api-key": api_key,
+        "anthropic-version": ANTHROPIC_VERSION,
+        "content-type": "application/json"
+    }
+    payload = {
+        "model": model,
+        "system": system,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "stream": True
+    }
+
+    response = _post_stream(url, headers, payload)
+    with response:
+        try:
+            for event, data in iter_sse(response):
+                if event == "ping":
+                    continue
+                chunk = json.loads(data)
+                kind = chunk.get("type", event)
+                if kind == "content_block_delta":
+                    text = chunk.get("delta", {}).get("text")
+                    if text:
+                        yield text
+                elif kind in ("message_start", "message_delta") and usage is not None:
+                    counts = (chunk.get("message") or {}).get("usage") or chunk.get("usage") or {}
+                    for key, name in (("input_tokens", "input_tokens"), ("output_tokens", "output_tokens"),
+                                      ("cache_read_input_tokens", "cache_read_tokens"),
+                                      ("cache_creation_input_tokens", "cache_write_tokens")):
+                        if counts.get(key) is not None:
+                            usage[name] = counts[key]
+                elif kind == "error":
+                    error = chunk.get("error", {})
+                    raise ProviderError(f"API Error: {error.get('message', error)}")
+                elif kind == "message_stop":
+                    _finish_stream(response)
+                    return
+        except requests.exceptions.RequestException as e:
+            raise ProviderError(f"Connection lost while streaming: {e}") from e
+        except ValueError as e:
+            raise ProviderError(f"Malformed streaming response: {e}") from e
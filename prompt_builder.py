@@ -0,0 +1,116 @@
+"""
+Prompt assembly with a stable, cacheable prefix.
+
+Providers cache prompts by exact prefix, so everything that is the same from
+one question to the next comes first and everything that changes comes last:
+
+    prefix   persona + instructions + knowledge base        (cache breakpoint)
+    suffix   current date + summary of the earlier chat
+    history  recent turns verbatim                          (cache breakpoint)
+    question web search results (if any) + the user's question
+
+The prefix is byte-identical across questions and users whenever the same
+knowledge block is used (always, with the full knowledge base). On the
+Anthropic API (and Anthropic models on OpenRouter) the prefix and the end of
+the history carry `cache_control` breakpoints; other OpenRouter models get
+the same ordering as plain text, which OpenAI-style automatic prefix caching
+can use.
+"""
+from datetime import datetime
+
+PERSONA = """You are a helpful AI assistant for Vadilal Group, an Indian ice cream company.
+Answer questions based on the information about Vadilal below.
+If you don't know the answer, politely say so without making up information.
+When recent web search results are included with a question, prioritize them over the background
+information for anything recent, and mention that you found this information online."""
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def build_prompt(knowledge_context, question, history=(), summary="", web_results="", today=None):
+    """
+    Split a request into its stable and volatile parts. Returns a dict with
+    "prefix", "suffix", "history" and "question" (the final user message).
+    """
+    prefix = f"{PERSONA}\n\nVADILAL INFORMATION:\n{knowledge_context}"
+
+    today = today or datetime.now()
+    suffix = f"Current date: {today.strftime('%B %d, %Y')}"
+    if summary:
+        suffix += f"\n\nSUMMARY OF THE EARLIER CONVERSATION:\n{summary}"
+
+    if web_results:
+        question = (
+            f"RECENT WEB SEARCH RESULTS ABOUT VADILAL:\n{web_results}\n"
+            f"Use these results to supplement your knowledge, especially for recent information.\n\n"
+            f"Question: {question}"
+        )
+
+    return {
+        "prefix": prefix,
+        "suffix": suffix,
+        "history": [{"role": m["role"], "content": m["content"]} for m in history],
+        "question": question,
+    }
+
+
+def system_text(prompt):
+    """The full system prompt as one string."""
+    return f"{prompt['prefix']}\n\n{prompt['suffix']}"
+
+
+def cache_scope(prompt, web_results=""):
+    """
+    The system text plus the web search results given to build_prompt(), for
+    response-cache scopes. History and the question are keyed separately, so
+    the cache can normalise the question and match similar ones.
+    """
+    return f"{system_text(prompt)}\n\n{web_results}" if web_results else system_text(prompt)
+
+
+def _with_breakpoint(message):
+    """Copy of a message whose content ends with a cache breakpoint."""
+    return {
+        "role": message["role"],
+        "content": [{"type": "text", "text": message["content"], "cache_control": CACHE_CONTROL}]
+    }
+
+
+def _cached_messages(prompt):
+    messages = list(prompt["history"])
+    if messages:
+        # Caches prefix + history for the next turn of this conversation
+        messages[-1] = _with_breakpoint(messages[-1])
+    messages.append({"role": "user", "content": prompt["question"]})
+    return messages
+
+
+def anthropic_request(prompt):
+    """(system blocks, messages) for the Anthropic Messages API."""
+    system = [
+        {"type": "text", "text": prompt["prefix"], "cache_control": CACHE_CONTROL},
+        {"type": "text", "text": prompt["suffix"]},
+    ]
+    return system, _cached_messages(prompt)
+
+
+def supports_cache_control(model):
+    """OpenRouter forwards cache_control breakpoints to Anthropic models only."""
+    return (model or "").startswith("anthropic/")
+
+
+def openrouter_messages(prompt, model):
+    """Chat-completions messages for OpenRouter."""
+    if not supports_cache_control(model):
+        messages = [{"role": "system", "content": system_text(prompt)}] + prompt["history"]
+        messages.append({"role": "user", "content": prompt["question"]})
+        return messages
+
+    system = {
+        "role": "system",
+        "content": [
+            {"type": "text", "text": prompt["prefix"], "cache_control": CACHE_CONTROL},
+            {"type": "text", "text": prompt["suffix"]},
+        ]
+    }
+    return [system] + _cached_messages(prompt)
@@ -0,0 +1,269 @@
+"""
+Provider routing: health tracking, hedged requests, failover and circuit
+breaking across LLM providers (OpenRouter, Anthropic) and models.
+
+ProviderRouter.stream() takes candidates in order of preference, each a
+(provider, model, factory) triple where factory() returns the text stream:
+    - the first candidate whose circuit is not open is the primary,
+    - if the primary has not produced its first token after a hedge delay
+      (the `hedge_percentile` of its recent time-to-first-token, clamped to
+      [min_hedge_delay, max_hedge_delay]), the next candidate is started as
+      well; whichever sends a token first wins and the other is cancelled,
+    - if a candidate fails before its first token, the next one is started
+      immediately (failover); after the first token errors are final, since
+      part of the answer has already been passed on.
+Each (provider, model) keeps an EWMA of time-to-first-token and error rate,
+the recent TTFT samples for the percentile, and a circuit breaker that opens
+after `failure_threshold` consecutive upstream failures and lets one trial
+call through after `cooldown` seconds. Client errors (bad key, bad request)
+and local throttling are not held against a provider.
+
+A cancelled attempt stops at its next chunk; one still waiting for its first
+token keeps its connection until then (bounded by the read timeout).
+"""
+import time
+import queue
+import threading
+from collections import deque
+
+from llm_providers import ProviderError
+from scheduler import Throttled
+
+# Smoothing factor of the latency and error-rate averages
+EWMA_ALPHA = 0.2
+
+# Recent time-to-first-token samples kept per provider/model
+TTFT_SAMPLES = 200
+# Samples needed before the hedge delay follows the observed percentile
+MIN_SAMPLES = 10
+
+
+def is_upstream_failure(error):
+    """True for errors that say the provider is unhealthy (5xx, 429, connection failures)."""
+    if isinstance(error, Throttled):
+        return False
+    status = getattr(error, "status_code", None)
+    return status is None or status == 429 or status >= 500
+
+
+class ProviderHealth:
+    """Latency/error statistics and circuit breaker for one provider/model."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=3, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.ttft_ewma = None
+        self.error_rate = 0.0
+        self.samples = deque(maxlen=TTFT_SAMPLES)
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may be made now; in half-open state only one trial call at a time."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self, ttft):
+        with self._lock:
+            self.samples.append(ttft)
+            self.ttft_ewma = ttft if self.ttft_ewma is None else EWMA_ALPHA * ttft + (1 - EWMA_ALPHA) * self.ttft_ewma
+            self.error_rate *= 1 - EWMA_ALPHA
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * self.error_rate
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release(self):
+        """A call ended without telling anything about the provider (cancelled, client error)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def percentile(self, pct):
+        """`pct` percentile of the recent TTFT samples, or None with too few samples."""
+        with self._lock:
+            samples = sorted(self.samples)
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct))]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "ttft_ewma": round(self.ttft_ewma, 3) if self.ttft_ewma is not None else None,
+                "error_rate": round(self.error_rate, 3),
+                "samples": len(self.samples),
+            }
+
+
+class _Attempt:
+    """One candidate's stream, pumped on its own thread into the router's queue."""
+
+    def __init__(self, index, provider, model, factory, events):
+        self.index = index
+        self.provider = provider
+        self.model = model
+        self.started = time.monotonic()
+        self.cancelled = threading.Event()
+        threading.Thread(target=self._pump, args=(factory, events), daemon=True,
+                         name=f"route-{provider}").start()
+
+    def _pump(self, factory, events):
+        chunks = None
+        try:
+            chunks = factory()
+            for chunk in chunks:
+                if self.cancelled.is_set():
+                    break
+                events.put((self.index, "chunk", chunk))
+            events.put((self.index, "end", None))
+        except Exception as e:
+            events.put((self.index, "error", e))
+        finally:
+            if chunks is not None:
+                chunks.close()
+
+
+class ProviderRouter:
+    """
+    Hedging and failover across candidates, with per-provider/model health.
+    Thread-safe; share one per process.
+    """
+
+    def __init__(self, hedge_percentile=0.95, min_hedge_delay=0.5, max_hedge_delay=8.0,
+                 default_hedge_delay=2.5, failure_threshold=3, cooldown=30.0):
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._health = {}
+        self._lock = threading.Lock()
+
+    def health(self, provider, model):
+        with self._lock:
+            health = self._health.get((provider, model))
+            if health is None:
+                health = self._health[(provider, model)] = ProviderHealth(self.failure_threshold, self.cooldown)
+            return health
+
+    def hedge_delay(self, provider, model):
+        """Seconds to wait for the first token before starting a hedged request."""
+        observed = self.health(provider, model).percentile(self.hedge_percentile)
+        if observed is None:
+            return self.default_hedge_delay
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, observed))
+
+    def stream(self, candidates, route=None):
+        """
+        Yield the text of the first candidate to answer (see module
+        docstring). `candidates` is a list of (provider, model, factory);
+        pass a dict as `route` to receive the winner's "provider" and
+        "model" and whether the call was "hedged" or "failed_over".
+        """
+        route = route if route is not None else {}
+        route.update(provider=None, model=None, hedged=False, failed_over=False)
+        pending = list(candidates)
+        events = queue.Queue()
+        attempts = []
+        active = set()
+
+        def start_next():
+            """Start the next candidate whose circuit lets a call through; False if none is left."""
+            while pending:
+                provider, model, factory = pending.pop(0)
+                if self.health(provider, model).allow():
+                    active.add(len(attempts))
+                    attempts.append(_Attempt(len(attempts), provider, model, factory, events))
+                    return True
+            return False
+
+        if not start_next():
+            names = ", ".join(sorted({provider for provider, _, _ in candidates}))
+            raise ProviderError(f"{names} failed repeatedly and is paused for up to {self.cooldown:.0f} seconds. "
+                                f"Please try again shortly or add a key for another provider.", 503)
+
+        hedge_at = time.monotonic() + self.hedge_delay(attempts[0].provider, attempts[0].model)
+        winner = None
+        try:
+            while True:
+                timeout = None
+                if winner is None and pending:
+                    timeout = max(0.0, hedge_at - time.monotonic())
+                try:
+                    index, kind, value = events.get(timeout=timeout)
+                except queue.Empty:
+                    # The primary is slower than usual: race the next candidate against it
+                    if start_next():
+                        route["hedged"] = True
+                    continue
+
+                if winner is not None and index != winner:
+                    continue
+                attempt = attempts[index]
+                health = self.health(attempt.provider, attempt.model)
+
+                if kind == "chunk":
+                    if winner is None:
+                        winner = index
+                        route.update(provider=attempt.provider, model=attempt.model)
+                        health.record_success(time.monotonic() - attempt.started)
+                        for other in attempts:
+                            if other is not attempt and other.index in active:
+                                other.cancelled.set()
+                                self.health(other.provider, other.model).release()
+                        active.intersection_update({index})
+                    yield value
+                elif kind == "end":
+                    if winner is None:
+                        # Finished without any text; still a healthy response
+                        active.discard(index)
+                        route.update(provider=attempt.provider, model=attempt.model)
+                        health.record_success(time.monotonic() - attempt.started)
+                    return
+                else:
+                    active.discard(index)
+                    if is_upstream_failure(value):
+                        health.record_failure()
+                    else:
+                        health.release()
+                    if winner is not None:
+                        raise value
+                    if start_next():
+                        route["failed_over"] = True
+                        hedge_at = time.monotonic() + self.hedge_delay(attempts[-1].provider, attempts[-1].model)
+                    elif not active:
+                        raise value
+        finally:
+            for attempt in attempts:
+                attempt.cancelled.set()
+            if winner is None:
+                for index in active:
+                    self.health(attempts[index].provider, attempts[index].model).release()
+
+    def stats(self):
+        with self._lock:
+            items = list(self._health.items())
+        return {f"{provider}/{model}": health.snapshot() for (provider, model), health in items}
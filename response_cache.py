@@ -0,0 +1,156 @@
+"""
+Cache of finished LLM answers.
+
+An answer is stored under a hash of everything that shaped it: the model id,
+the (whitespace-normalised) system context, the conversation history sent
+with the question and the question itself. Lookups try:
+    1. an exact match on that hash,
+    2. optionally, the most similar earlier question asked with the same
+       model, context and history (cosine similarity of local hashing
+       embeddings >= `similarity_threshold`, and the same numbers, so
+       "FY 2023-24" never matches "FY 2022-23").
+Entries expire after `ttl` seconds and are tied to a knowledge-base version;
+when `knowledge_version()` changes, answers built on the old data are
+dropped. Entries live in the `response_cache` table of the app database, so
+hits skip the provider entirely and are shared by all sessions.
+"""
+import re
+import json
+import time
+import hashlib
+import threading
+
+import numpy as np
+
+from embedder import HashingEmbedder
+from search_cache import normalize_query
+
+# Answers older than this are generated again
+DEFAULT_TTL = 24 * 60 * 60
+
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+def _digest(*parts):
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+def normalize_context(text):
+    """Collapse whitespace so prompt-template indentation does not affect the key."""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def normalize_history(history):
+    """Canonical JSON of (role, normalised content) pairs."""
+    return json.dumps([(m["role"], normalize_context(m["content"])) for m in history or []])
+
+
+class ResponseCache:
+    """
+    Exact + similarity cache for LLM answers backed by a StorageHandler.
+    `knowledge_version` is a callable returning a string that changes whenever
+    the knowledge base does. Thread-safe.
+    """
+
+    def __init__(self, storage, knowledge_version, ttl=DEFAULT_TTL, similarity_threshold=None,
+                 max_entries=2000):
+        self.storage = storage
+        self.knowledge_version = knowledge_version
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        # Stateless (unfitted) hashing embedder: vectors never go stale
+        self.embedder = HashingEmbedder(n_features=2048, svd_dim=None)
+        self._lock = threading.Lock()
+        self._seen_version = None
+        self._counters = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _current_version(self):
+        """Current knowledge-base version; drops stale answers the first time it changes."""
+        version = self.knowledge_version()
+        with self._lock:
+            changed = version != self._seen_version
+            self._seen_version = version
+        if changed:
+            if self.storage.purge_response_cache(version, self.ttl):
+                self._count("invalidations")
+        return version
+
+    def _keys(self, model, system, history, prompt):
+        scope_key = _digest(model, normalize_context(system), normalize_history(history))
+        return _digest(scope_key, normalize_query(prompt)), scope_key
+
+    def lookup(self, model, system, history, prompt):
+        """
+        Return {"response", "match": "exact" | "similar", "score"} for a cached
+        answer to this exact request (or a close enough question), or None.
+        """
+        version = self._current_version()
+        cache_key, scope_key = self._keys(model, system, history, prompt)
+        min_created_at = time.time() - self.ttl
+
+        response = self.storage.get_cached_response(cache_key, version, min_created_at)
+        if response is not None:
+            self._count("exact_hits")
+            return {"response": response, "match": "exact", "score": 1.0}
+
+        if self.similarity_threshold:
+            candidates = self.storage.get_response_candidates(scope_key, version, min_created_at)
+            if candidates:
+                query = self.embedder.encode([normalize_query(prompt)])[0]
+                scores = np.vstack([vector for _, _, vector in candidates]) @ query
+                best = int(np.argmax(scores))
+                cached_prompt, response, _ = candidates[best]
+                # Numbers (years, amounts) must agree exactly
+                if (scores[best] >= self.similarity_threshold
+                        and NUMBER_PATTERN.findall(cached_prompt) == NUMBER_PATTERN.findall(normalize_query(prompt))):
+                    self._count("similar_hits")
+                    return {"response": response, "match": "similar", "score": float(scores[best])}
+
+        self._count("misses")
+        return None
+
+    def store(self, model, system, history, prompt, response):
+        """Cache a complete answer."""
+        version = self._current_version()
+        cache_key, scope_key = self._keys(model, system, history, prompt)
+        embedding = self.embedder.encode([normalize_query(prompt)])[0] if self.similarity_threshold else None
+        self.storage.save_cached_response(
+            cache_key, scope_key, model, normalize_query(prompt), response, embedding, version, self.max_entries
+        )
+        self._count("stores")
+
+    def stream(self, model, system, history, prompt, generate):
+        """
+        Yield a cached answer in one piece, or the chunks of `generate()` while
+        caching the full answer once the stream completes. Streams that fail
+        or are closed early are not cached.
+        """
+        hit = self.lookup(model, system, history, prompt)
+        if hit is not None:
+            yield hit["response"]
+            return
+
+        parts = []
+        chunks = generate()
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        finally:
+            chunks.close()
+        response = "".join(parts).strip()
+        if response:
+            self.store(model, system, history, prompt, response)
+
+    def stats(self):
+        """Counters plus the derived hit rate."""
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["exact_hits"] + stats["similar_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["similar_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,245 @@
+import math
+import re
+import zlib
+import hashlib
+from collections import Counter, defaultdict
+
+from context_compression import compress_documents, strip_footnotes, source_site, format_sources
+
+
+# Words that carry no signal for matching questions against the knowledge base
+STOPWORDS = frozenset("""
+a an and are as at be by can did do does for from had has have how i in is it its
+me my of on or our so than that the their them then there these they this to was
+we were what when where which who why will with would you your about tell please
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for prompt budgeting."""
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+
+def tokenize(text):
+    """Lowercase the text and split it into index terms, dropping stopwords."""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def chunk_text(text, max_tokens=180):
+    """
+    Split a document into chunks of roughly `max_tokens` tokens.
+    Consecutive short lines (Q&A entries, table cells) are grouped together and
+    long paragraphs are split on sentence boundaries.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append("\n".join(current))
+        current = []
+        current_tokens = 0
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        pieces = [line]
+        if estimate_tokens(line) > max_tokens:
+            pieces = SENTENCE_SPLIT.split(line)
+
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                flush()
+            current.append(piece)
+            current_tokens += piece_tokens
+
+    flush()
+    return chunks
+
+
+def stable_chunks(text, target_tokens=180, min_tokens=60, max_tokens=360):
+    """
+    Content-defined chunking for versioned ingestion. Lines (or sentences of
+    long lines) are the units; a chunk ends after a unit whose own hash says
+    so, with probability proportional to its size, so boundaries depend only
+    on nearby content. Editing one paragraph changes the chunks around it
+    while every other chunk keeps its exact text and hash.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    span = max(1, target_tokens - min_tokens)
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        units = [line]
+        if estimate_tokens(line) > max_tokens:
+            units = SENTENCE_SPLIT.split(line)
+
+        for unit in units:
+            unit_tokens = estimate_tokens(unit)
+            if current and current_tokens + unit_tokens > max_tokens:
+                chunks.append("\n".join(current))
+                current = []
+                current_tokens = 0
+
+            current.append(unit)
+            current_tokens += unit_tokens
+
+            threshold = min(1.0, unit_tokens / span)
+            if current_tokens >= min_tokens and zlib.crc32(unit.encode("utf-8")) / 2**32 < threshold:
+                chunks.append("\n".join(current))
+                current = []
+                current_tokens = 0
+
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class KnowledgeRetriever:
+    """
+    In-memory BM25 index over chunks of the Vadilal knowledge base.
+    Built once per process; `build_context` returns only the chunks relevant to a
+    question so the prompt does not carry the whole knowledge base every turn.
+    With `compress` (see context_compression.py) reference lists, footnote
+    markers and repeated sentences are left out of the chunks, and the
+    sources cited by the selected chunks are appended to the context instead.
+    """
+
+    def __init__(self, documents, chunk_tokens=180, k1=1.5, b=0.75, compress=True):
+        """
+        `documents` is an iterable of (source_name, text) pairs. Identical chunks
+        appearing in several sources are indexed once.
+        """
+        self.k1 = k1
+        self.b = b
+        self.chunks = []
+        self.references = {}
+        self.compression = {"references": 0, "duplicate_sentences": 0}
+
+        documents = list(documents)
+        # What the whole knowledge base costs uncompressed, for the reports
+        raw_chunks = {chunk for _, text in documents for chunk in chunk_text(text or "", chunk_tokens)}
+        self.raw_tokens = estimate_tokens("\n".join(raw_chunks))
+        if compress:
+            documents, self.references, self.compression = compress_documents(documents)
+        # Site each source is cited by, and the cost of its original reference line
+        self.reference_sites = {key: source_site(reference) for key, reference in self.references.items()}
+        self.raw_reference_tokens = {
+            key: estimate_tokens(f"{reference['title']}, accessed on {reference['date']}, {reference['url']}")
+            for key, reference in self.references.items()}
+
+        seen = set()
+        for source, text in documents:
+            for chunk in chunk_text(text or "", chunk_tokens):
+                content, footnotes = strip_footnotes(chunk)
+                digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+                if digest in seen:
+                    continue
+                seen.add(digest)
+                keys = [(source, n) for n in footnotes if (source, n) in self.references]
+                self.chunks.append({"source": source, "content": content, "references": keys,
+                                    "tokens": estimate_tokens(content), "raw_tokens": estimate_tokens(chunk)})
+
+        # Fallback context: every distinct chunk, in document order, and every cited source
+        self.full_text = self._with_sources("\n".join(chunk["content"] for chunk in self.chunks), self.chunks)
+        self._build_index()
+
+    def _cited(self, chunks):
+        """References cited by `chunks`, each once, in order."""
+        return list(dict.fromkeys(key for chunk in chunks for key in chunk["references"]))
+
+    def _with_sources(self, text, chunks):
+        sources = format_sources(self._cited(chunks), self.references)
+        return f"{text}\n\n{sources}" if sources else text
+
+    def _build_index(self):
+        """Build the inverted index (term -> [(chunk index, term frequency)])."""
+        self.postings = defaultdict(list)
+        self.doc_lengths = []
+
+        for idx, chunk in enumerate(self.chunks):
+            terms = tokenize(chunk["content"])
+            self.doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings[term].append((idx, tf))
+
+        n_docs = len(self.chunks)
+        self.avg_length = (sum(self.doc_lengths) / n_docs) if n_docs else 0.0
+        self.idf = {
+            term: math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+    def search(self, query, k=6):
+        """Return up to `k` (score, chunk index) pairs ranked by BM25 score."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for idx, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[idx] / self.avg_length)
+                scores[idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return [(score, idx) for idx, score in ranked[:k]]
+
+    def build_context(self, query, k=6, token_budget=1500):
+        """
+        Assemble the context for a question from the top-k chunks that fit in
+        `token_budget`. Falls back to the full knowledge base when nothing matches
+        or when retrieval is disabled (`k` or `token_budget` of 0).
+        """
+        return self.context(query, k, token_budget)["text"]
+
+    def context(self, query, k=6, token_budget=1500):
+        """
+        build_context() with a report: {"text", "tokens_before", "tokens_after",
+        "sources"}. `tokens_before` is what the same text would have cost
+        uncompressed (footnote markers, the full reference lines it cites and,
+        for the whole knowledge base, the reference lists and duplicates);
+        `tokens_after` is the size of "text" and `sources` the number of
+        source sites cited at its end.
+        """
+        hits = self.search(query, k) if k and token_budget else []
+
+        selected = []
+        sites = set()
+        used = 0
+        for _, idx in hits:
+            chunk = self.chunks[idx]
+            # The source sites a chunk brings along count against the budget too
+            new = {self.reference_sites[key] for key in chunk["references"]} - sites
+            cost = chunk["tokens"] + sum(estimate_tokens(site) for site in new)
+            if used + cost > token_budget:
+                continue
+            selected.append(idx)
+            sites |= new
+            used += cost
+
+        chunks = [self.chunks[idx] for idx in sorted(selected)] if selected else self.chunks
+        cited = self._cited(chunks)
+        if not selected:
+            text, tokens_before = self.full_text, self.raw_tokens
+        else:
+            # Keep document order so tables and Q&A pairs read naturally
+            text = self._with_sources("\n...\n".join(chunk["content"] for chunk in chunks), chunks)
+            tokens_before = sum(chunk["raw_tokens"] for chunk in chunks) \
+                + sum(self.raw_reference_tokens[key] for key in cited)
+        return {"text": text, "tokens_before": tokens_before, "tokens_after": estimate_tokens(text),
+                "sources": len({self.reference_sites[key] for key in cited})}
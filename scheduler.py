@@ -0,0 +1,366 @@
+"""
+Central scheduler for outbound provider calls (LLMs and web search).
+
+Every call to a rate-limited upstream goes through one RequestScheduler per
+process, which gives each provider a lane with:
+    - a token bucket (`rate` calls per second, bursts of up to `burst`), so
+      the process as a whole stays under the provider's limits instead of
+      every session firing at will,
+    - Retry-After handling: a 429 (or a 503 carrying Retry-After) pauses the
+      whole lane for the advertised time, and the call is retried if it had
+      not yet produced any output,
+    - a bounded queue: when more than `max_queue` callers are already
+      waiting, or the wait for a slot would exceed `max_wait` seconds, the
+      call fails fast with Throttled instead of piling up (backpressure).
+Identical calls that are in flight at the same time are coalesced: callers
+passing the same `key` share one upstream call. call() shares the result;
+stream() replays the chunks received so far to each joiner and then feeds
+all of them as new chunks arrive.
+"""
+import time
+import random
+import threading
+from concurrent.futures import Future
+
+from llm_providers import ProviderError, parse_retry_after
+
+# (calls per second, burst) per provider; OpenRouter's free tier allows 20
+# requests/minute per key, Anthropic's first tier 50/minute
+DEFAULT_LIMITS = {
+    "openrouter": (2.0, 10),
+    "anthropic": (0.8, 5),
+    "serpapi": (1.0, 5),
+    "duckduckgo": (0.5, 3),
+}
+FALLBACK_LIMIT = (1.0, 5)
+
+# Pause after a 429 that carries no Retry-After header
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class Throttled(ProviderError):
+    """A call was refused locally because the provider's lane is saturated."""
+
+    def __init__(self, provider, retry_after):
+        super().__init__(
+            f"Error 429: Too many requests to {provider} right now. "
+            f"Please try again in {max(1, round(retry_after))} seconds.",
+            status_code=429, retry_after=retry_after
+        )
+        self.provider = provider
+
+
+def retry_after_of(error):
+    """
+    How long the upstream asked us to back off for `error`, or None when the
+    error is not a rate limit. Understands ProviderError and requests'
+    HTTPError (anything with a `.response`).
+    """
+    if isinstance(error, Throttled):
+        return None
+    status = getattr(error, "status_code", None)
+    retry_after = getattr(error, "retry_after", None)
+    response = getattr(error, "response", None)
+    if response is not None:
+        status = response.status_code
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+    if status == 429:
+        return retry_after if retry_after is not None else DEFAULT_RETRY_AFTER
+    if status == 503:
+        return retry_after
+    return None
+
+
+class TokenBucket:
+    """
+    Token bucket that hands out reservations: reserve() takes a token now and
+    says how long to wait before using it, so waiting callers are served in
+    order. pause() empties the bucket and stops refilling for a while.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        # Refill time base; in the future while paused
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self, max_wait=None):
+        """Take a token and return the seconds to wait for it, or None (nothing taken) beyond `max_wait`."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self.updated - now) + max(0.0, (1 - self.tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self.tokens -= 1
+            return wait
+
+    def paused_for(self):
+        """Seconds left of the current pause."""
+        return max(0.0, self.updated - time.monotonic())
+
+    def pause(self, seconds):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = max(self.updated, now + seconds)
+
+
+class _Lane:
+    """Rate limit, queue bound and counters for one provider."""
+
+    def __init__(self, name, rate, burst, max_queue, max_wait):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.waiting = 0
+        self.lock = threading.Lock()
+        self.counters = {"calls": 0, "coalesced": 0, "throttled": 0, "rate_limited": 0, "retries": 0,
+                         "wait_seconds": 0.0}
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def acquire(self):
+        """Block until the lane admits one call; raises Throttled when saturated."""
+        with self.lock:
+            if self.waiting >= self.max_queue:
+                self.counters["throttled"] += 1
+                raise Throttled(self.name, self.bucket.paused_for() or 1 / self.bucket.rate)
+            self.waiting += 1
+        try:
+            wait = self.bucket.reserve(self.max_wait)
+            if wait is None:
+                self.count("throttled")
+                raise Throttled(self.name, self.max_wait)
+            time.sleep(wait)
+            # A 429 seen while we slept pauses everyone still waiting
+            while self.bucket.paused_for() > 0:
+                paused = self.bucket.paused_for()
+                wait += paused
+                time.sleep(paused)
+            self.count("wait_seconds", wait)
+            self.count("calls")
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+
+class _SharedStream:
+    """
+    One upstream generator shared by every consumer that joins while it runs.
+    Chunks are kept so late joiners start from the beginning; whichever
+    consumer runs out of buffered chunks pulls the next one from upstream.
+    The upstream is closed when the last consumer leaves early.
+    """
+
+    def __init__(self, source, on_finish):
+        self._source = source
+        self._on_finish = on_finish
+        self._chunks = []
+        self._done = False
+        self._error = None
+        self._pumping = False
+        self._consumers = 0
+        self._cond = threading.Condition()
+
+    def join(self):
+        """Register a consumer; False if the stream already ended or was abandoned."""
+        with self._cond:
+            if self._done:
+                return False
+            self._consumers += 1
+            return True
+
+    def _finish(self, error=None):
+        with self._cond:
+            self._done = True
+            self._error = error
+        self._on_finish()
+
+    def _next(self):
+        try:
+            chunk = next(self._source)
+        except StopIteration:
+            self._finish()
+        except Exception as e:
+            self._finish(e)
+        else:
+            with self._cond:
+                self._chunks.append(chunk)
+        finally:
+            with self._cond:
+                self._pumping = False
+                self._cond.notify_all()
+
+    def read(self):
+        """Generator over the shared chunks for one joined consumer."""
+        position = 0
+        try:
+            while True:
+                with self._cond:
+                    while position >= len(self._chunks) and self._pumping:
+                        self._cond.wait()
+                    if position < len(self._chunks):
+                        chunk = self._chunks[position]
+                    elif self._done:
+                        if self._error is not None:
+                            raise self._error
+                        return
+                    else:
+                        chunk = None
+                        self._pumping = True
+                if chunk is None:
+                    self._next()
+                    continue
+                position += 1
+                yield chunk
+        finally:
+            with self._cond:
+                self._consumers -= 1
+                abandoned = self._consumers == 0 and not self._done
+                if abandoned:
+                    self._done = True
+                    self._error = ProviderError("The request was cancelled.")
+            if abandoned:
+                self._source.close()
+                self._on_finish()
+
+
+class RequestScheduler:
+    """
+    Per-provider rate limiting, Retry-After handling, backpressure and
+    coalescing for outbound calls. `limits` overrides DEFAULT_LIMITS with
+    {provider: (calls per second, burst)}. Thread-safe; share one per process.
+    """
+
+    def __init__(self, limits=None, max_queue=32, max_wait=20.0, max_retries=2):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self._lanes = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def lane(self, provider):
+        with self._lock:
+            lane = self._lanes.get(provider)
+            if lane is None:
+                rate, burst = self.limits.get(provider, FALLBACK_LIMIT)
+                lane = self._lanes[provider] = _Lane(provider, rate, burst, self.max_queue, self.max_wait)
+            return lane
+
+    def _backoff(self, lane, error, attempt):
+        """Pause the lane for a rate-limit error; True if the call should be retried."""
+        retry_after = retry_after_of(error)
+        if retry_after is None:
+            return False
+        lane.count("rate_limited")
+        # Jitter keeps processes sharing an upstream limit from retrying in lockstep
+        lane.bucket.pause(retry_after + random.uniform(0, 0.1 * retry_after))
+        if attempt >= self.max_retries or retry_after > self.max_wait:
+            return False
+        lane.count("retries")
+        return True
+
+    def _run(self, provider, fn):
+        lane = self.lane(provider)
+        attempt = 0
+        while True:
+            lane.acquire()
+            try:
+                return fn()
+            except Exception as e:
+                if not self._backoff(lane, e, attempt):
+                    raise
+                attempt += 1
+
+    def _run_stream(self, provider, factory):
+        lane = self.lane(provider)
+        attempt = 0
+        while True:
+            lane.acquire()
+            started = False
+            chunks = factory()
+            try:
+                for chunk in chunks:
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                # Once output has been passed on, a retry would repeat it
+                if started or not self._backoff(lane, e, attempt):
+                    raise
+                attempt += 1
+            finally:
+                chunks.close()
+
+    def _release(self, key, entry):
+        with self._lock:
+            if self._inflight.get(key) is entry:
+                del self._inflight[key]
+
+    def call(self, provider, fn, key=None):
+        """Run `fn()` through the provider's lane; callers with the same `key` share one call."""
+        if key is None:
+            return self._run(provider, fn)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            self.lane(provider).count("coalesced")
+            return future.result()
+        try:
+            result = self._run(provider, fn)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._release(key, future)
+
+    def stream(self, provider, factory, key=None):
+        """
+        Generator over the chunks of `factory()` (a zero-argument callable
+        returning a generator), run through the provider's lane. Consumers
+        with the same `key` share one upstream stream.
+        """
+        if key is None:
+            yield from self._run_stream(provider, factory)
+            return
+        with self._lock:
+            shared = self._inflight.get(key)
+            coalesced = shared is not None and shared.join()
+            if not coalesced:
+                shared = _SharedStream(self._run_stream(provider, factory), lambda: self._release(key, shared))
+                shared.join()
+                self._inflight[key] = shared
+        if coalesced:
+            self.lane(provider).count("coalesced")
+        yield from shared.read()
+
+    def stats(self):
+        """Counters per provider, plus how many callers are waiting for a slot."""
+        with self._lock:
+            lanes = list(self._lanes.values())
+        stats = {}
+        for lane in lanes:
+            with lane.lock:
+                stats[lane.name] = {**lane.counters, "waiting": lane.waiting}
+            stats[lane.name]["wait_seconds"] = round(stats[lane.name]["wait_seconds"], 3)
+        return stats
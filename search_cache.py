@@ -0,0 +1,133 @@
+"""
+Two-tier cache for web search results.
+
+Results are keyed by provider and normalised query, so "What is Vadilal's
+revenue?" and "what is vadilal's revenue" share one entry:
+    1. an in-process LRU dict (bounded by `max_entries`), shared by every
+       session of the Streamlit server,
+    2. the `search_cache` table in the SQLite database (bounded by
+       `max_db_entries`), which survives restarts and is shared between
+       processes using the same database.
+Both tiers expire entries after `ttl` seconds. Values may be any
+JSON-serialisable object (formatted text or lists of result dicts). Hit and
+miss counters are kept per tier and reported by stats().
+"""
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Results older than this are searched again
+DEFAULT_TTL = 6 * 60 * 60
+
+
+def normalize_query(query):
+    """Lower-case, collapse whitespace and drop trailing punctuation."""
+    query = re.sub(r"\s+", " ", query or "").strip().lower()
+    return query.rstrip("?!.,;: ")
+
+
+def cache_key(provider, query):
+    """Stable key for a (provider, query) pair."""
+    return hashlib.sha1(f"{provider}\x00{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+
+class SearchCache:
+    """
+    TTL + LRU cache in front of the search providers. `storage` is an optional
+    StorageHandler used as the persistent second tier; without it only the
+    in-process tier is used. Thread-safe.
+    """
+
+    def __init__(self, storage=None, ttl=DEFAULT_TTL, max_entries=256, max_db_entries=5000):
+        self.storage = storage
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_db_entries = max_db_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _remember(self, key, result, created_at):
+        """Insert into the in-process tier as most recently used, evicting the LRU entry if full."""
+        with self._lock:
+            self._entries[key] = (result, created_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def get(self, provider, query):
+        """Return the cached result for `query` at `provider`, or None."""
+        key = cache_key(provider, query)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return entry[0]
+                del self._entries[key]
+
+        if self.storage is not None:
+            row = self.storage.get_search_result(key, now - self.ttl)
+            if row is not None:
+                try:
+                    result = json.loads(row[0])
+                except ValueError:
+                    # Unreadable row: treat as a miss, the next put() overwrites it
+                    result = None
+                if result is not None:
+                    self._remember(key, result, row[1])
+                    self._count("db_hits")
+                    return result
+
+        self._count("misses")
+        return None
+
+    def put(self, provider, query, result):
+        """Cache `result` for `query` at `provider` in both tiers."""
+        key = cache_key(provider, query)
+        self._remember(key, result, time.time())
+        if self.storage is not None:
+            self.storage.save_search_result(key, provider, normalize_query(query), json.dumps(result), self.max_db_entries)
+        self._count("stores")
+
+    def get_or_fetch(self, provider, query, fetch, cacheable=None):
+        """
+        Return the cached result, or call `fetch()` and cache what it returns.
+        Results for which `cacheable(result)` is false (errors, empty answers)
+        are returned but not stored.
+        """
+        result = self.get(provider, query)
+        if result is not None:
+            return result
+
+        result = fetch()
+        if result and (cacheable is None or cacheable(result)):
+            self.put(provider, query, result)
+        return result
+
+    def clear(self):
+        """Drop the in-process tier and expired rows of the persistent tier."""
+        with self._lock:
+            self._entries.clear()
+        if self.storage is not None:
+            self.storage.purge_search_cache(self.ttl)
+
+    def stats(self):
+        """Counters plus the derived hit rate and current in-process size."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._entries)
+        lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["db_hits"]) / lookups if lookups else 0.0
+        return stats
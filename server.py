@@ -0,0 +1,392 @@
+"""
+HTTP/JSON API over the query engine (asyncio, standard library only).
+
+Endpoints:
+    GET  /health              liveness and load
+    GET  /models              providers and their models
+    GET  /stats               cache counters and recent traces
+    GET  /metrics             span histograms and counters (Prometheus text format)
+    POST /v1/answer           answer as one JSON object
+    POST /v1/answer/stream    engine events as server-sent events
+
+Request body for both answer endpoints:
+    {"question": "...", "provider": "openrouter" | "anthropic", "api_key": "...",
+     "model": "<model id>", "history": [{"role", "content"}, ...], "history_summary": "",
+     "web_search": false, "serp_api_key": null, "token_budget": 1500,
+     "fallbacks": [{"provider", "api_key", "model"}, ...]}
+
+The server keeps no session state, so it has no HistoryWindow of its own:
+`history` holds the turns to send verbatim and `history_summary` the rolling
+summary of the older turns the client folded out of them
+(api_client.EngineClient folds with the session's HistoryWindow). A
+client that sends its full history and no summary gets it windowed afresh
+on every request.
+
+Connections are multiplexed on the event loop; the answer pipeline (blocking
+HTTP calls) runs on worker threads. At most `max_concurrency` answers run at
+once and up to `max_pending` more wait for a slot; beyond that requests are
+rejected with 503 and Retry-After. A client that disconnects mid-stream
+cancels its provider call.
+
+Usage:
+    python server.py --port 8080 --workers 4 --max-concurrency 32
+"""
+import json
+import asyncio
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import QueryEngine, MODEL_OPTIONS, PROVIDERS, RETRIEVAL_TOKEN_BUDGET, equivalent_model
+from history import HistoryWindow
+
+MAX_BODY_BYTES = 1 << 20
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class BadRequest(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_answer_request(body):
+    """Validate an answer request body; returns stream_answer() keyword arguments."""
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        raise BadRequest("body must be JSON")
+    if not isinstance(data, dict):
+        raise BadRequest("body must be a JSON object")
+
+    question = (data.get("question") or "").strip()
+    if not question:
+        raise BadRequest("question is required")
+    provider = data.get("provider", "openrouter")
+    if provider not in PROVIDERS:
+        raise BadRequest(f"provider must be one of {', '.join(PROVIDERS)}")
+    if not data.get("api_key"):
+        raise BadRequest("api_key is required")
+    model = data.get("model") or next(iter(MODEL_OPTIONS[provider].values()))
+
+    history = data.get("history") or []
+    if not isinstance(history, list) or not all(
+        isinstance(m, dict) and m.get("role") in ("user", "assistant") and isinstance(m.get("content"), str)
+        for m in history
+    ):
+        raise BadRequest("history must be a list of {role: user|assistant, content} objects")
+    summary = data.get("history_summary") or ""
+    if not isinstance(summary, str):
+        raise BadRequest("history_summary must be a string")
+
+    try:
+        token_budget = int(data.get("token_budget", RETRIEVAL_TOKEN_BUDGET))
+    except (TypeError, ValueError):
+        raise BadRequest("token_budget must be an integer")
+
+    fallbacks = data.get("fallbacks") or []
+    if not isinstance(fallbacks, list) or not all(
+        isinstance(f, dict) and f.get("provider") in PROVIDERS and f.get("api_key") for f in fallbacks
+    ):
+        raise BadRequest("fallbacks must be a list of {provider, api_key, model} objects")
+    fallbacks = [
+        {"provider": f["provider"], "api_key": f["api_key"],
+         "model": f.get("model") or equivalent_model(model, provider, f["provider"])}
+        for f in fallbacks
+    ]
+
+    return {
+        "question": question,
+        "provider": provider,
+        "api_key": data["api_key"],
+        "model": model,
+        "history": history,
+        "history_window": HistoryWindow(summary=summary),
+        "enable_web_search": bool(data.get("web_search")),
+        "serp_api_key": data.get("serp_api_key"),
+        "token_budget": token_budget,
+        "fallbacks": fallbacks,
+    }
+
+
+class EngineServer:
+    """asyncio HTTP/1.1 server (keep-alive, chunked streaming) for one QueryEngine."""
+
+    def __init__(self, engine, max_concurrency=16, max_pending=64):
+        self.engine = engine
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="answer")
+        self._slots = None
+        self._waiting = 0
+        self._active = 0
+
+    async def serve(self, host="127.0.0.1", port=8080, reuse_port=False):
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        server = await asyncio.start_server(self._handle_connection, host, port, reuse_port=reuse_port or None)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._dispatch(writer, method, path, body, keep_alive)
+                if not keep_alive:
+                    break
+        except BadRequest as e:
+            await self._send_json(writer, e.status, {"error": str(e)}, keep_alive=False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split()
+        except ValueError:
+            raise BadRequest("malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise BadRequest("invalid content-length")
+        if length < 0:
+            raise BadRequest("invalid content-length")
+        if length > MAX_BODY_BYTES:
+            raise BadRequest("request body too large", 413)
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _dispatch(self, writer, method, path, body, keep_alive):
+        routes = {
+            ("GET", "/health"): self._health,
+            ("GET", "/models"): self._models,
+            ("GET", "/stats"): self._stats,
+            ("GET", "/metrics"): self._metrics,
+            ("POST", "/v1/answer"): self._answer,
+            ("POST", "/v1/answer/stream"): self._answer_stream,
+        }
+        handler = routes.get((method, path))
+        if handler is None:
+            status = 405 if any(route_path == path for _, route_path in routes) else 404
+            await self._send_json(writer, status, {"error": f"{method} {path} not supported"}, keep_alive=keep_alive)
+            return
+        try:
+            await handler(writer, body, keep_alive)
+        except BadRequest as e:
+            await self._send_json(writer, e.status, {"error": str(e)}, keep_alive=keep_alive)
+
+    async def _health(self, writer, body, keep_alive):
+        await self._send_json(writer, 200, {"status": "ok", "active": self._active, "waiting": self._waiting},
+                              keep_alive=keep_alive)
+
+    async def _models(self, writer, body, keep_alive):
+        await self._send_json(writer, 200, MODEL_OPTIONS, keep_alive=keep_alive)
+
+    async def _stats(self, writer, body, keep_alive):
+        await self._send_json(writer, 200, self.engine.stats(), keep_alive=keep_alive)
+
+    async def _metrics(self, writer, body, keep_alive):
+        payload = self.engine.prometheus().encode("utf-8")
+        await self._start_response(writer, 200, {
+            "Content-Type": "text/plain; version=0.0.4; charset=utf-8",
+            "Content-Length": str(len(payload)),
+        }, keep_alive)
+        writer.write(payload)
+        await writer.drain()
+
+    async def _acquire_slot(self):
+        """Wait for an answer slot; False if too many requests are already waiting."""
+        if self._slots.locked() and self._waiting >= self.max_pending:
+            return False
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._active += 1
+        return True
+
+    def _release_slot(self):
+        self._active -= 1
+        self._slots.release()
+
+    async def _overloaded(self, writer, keep_alive):
+        await self._send_json(writer, 503, {"error": "server busy, retry shortly"}, {"Retry-After": "1"},
+                              keep_alive=keep_alive)
+
+    async def _events(self, kwargs):
+        """Run engine.stream_answer() on a worker thread and yield its events."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def pump():
+            events = self.engine.stream_answer(**kwargs)
+            try:
+                for event in events:
+                    loop.call_soon_threadsafe(queue.put_nowait, event)
+                    if cancelled.is_set():
+                        break
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, {"type": "error", "message": f"Internal error: {e}"})
+            finally:
+                # Closes the provider stream if the client went away
+                events.close()
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        loop.run_in_executor(self._executor, pump)
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+        finally:
+            cancelled.set()
+
+    async def _answer(self, writer, body, keep_alive):
+        kwargs = parse_answer_request(body)
+        if not await self._acquire_slot():
+            await self._overloaded(writer, keep_alive)
+            return
+        result = {"answer": "", "sources": {}, "context": None, "facts": None, "faq": None, "route": None,
+                  "usage": None, "error": None}
+        try:
+            events = self._events(kwargs)
+            try:
+                async for event in events:
+                    if event["type"] in ("sources", "context", "facts", "usage"):
+                        result[event["type"]] = event[event["type"]]
+                    elif event["type"] == "faq":
+                        result["faq"] = event["question"]
+                    elif event["type"] == "route":
+                        result["route"] = {key: value for key, value in event.items() if key != "type"}
+                    elif event["type"] == "error":
+                        result["error"] = event["message"]
+                    elif event["type"] == "done":
+                        result["answer"] = event["answer"]
+            finally:
+                await events.aclose()
+        finally:
+            self._release_slot()
+        await self._send_json(writer, 200, result, keep_alive=keep_alive)
+
+    async def _answer_stream(self, writer, body, keep_alive):
+        kwargs = parse_answer_request(body)
+        if not await self._acquire_slot():
+            await self._overloaded(writer, keep_alive)
+            return
+        try:
+            await self._start_response(writer, 200, {
+                "Content-Type": "text/event-stream",
+                "Cache-Control": "no-cache",
+                "Transfer-Encoding": "chunked",
+            }, keep_alive)
+            events = self._events(kwargs)
+            try:
+                async for event in events:
+                    await self._write_chunk(writer, f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+            finally:
+                await events.aclose()
+            await self._write_chunk(writer, b"")
+        finally:
+            self._release_slot()
+
+    async def _start_response(self, writer, status, headers, keep_alive):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    async def _write_chunk(self, writer, payload):
+        """Write one chunk of a chunked response; an empty payload ends it."""
+        writer.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, headers=None, keep_alive=True):
+        body = json.dumps(payload).encode("utf-8")
+        await self._start_response(writer, status, {
+            "Content-Type": "application/json",
+            "Content-Length": str(len(body)),
+            **(headers or {})
+        }, keep_alive)
+        writer.write(body)
+        await writer.drain()
+
+
+def serve(host, port, max_concurrency, max_pending, reuse_port=False, db_path=None, provider_urls=None):
+    """Run one server process until interrupted."""
+    engine = QueryEngine(**({"db_path": db_path} if db_path else {}), provider_urls=provider_urls)
+    server = EngineServer(engine, max_concurrency, max_pending)
+    try:
+        asyncio.run(server.serve(host, port, reuse_port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON API for the Vadilal assistant.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=1, help="server processes sharing the port")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="answers in flight per process")
+    parser.add_argument("--max-pending", type=int, default=64, help="answers waiting for a slot per process")
+    parser.add_argument("--db", default=None)
+    parser.add_argument("--openrouter-url", default=None, help="override the OpenRouter endpoint (e.g. a stub)")
+    parser.add_argument("--anthropic-url", default=None, help="override the Anthropic endpoint (e.g. a stub)")
+    parser.add_argument("--serpapi-url", default=None, help="override the SerpAPI endpoint (e.g. a stub)")
+    parser.add_argument("--duckduckgo-url", default=None, help="override the DuckDuckGo endpoint (e.g. a stub)")
+    args = parser.parse_args()
+
+    provider_urls = {name: url for name, url in (("openrouter", args.openrouter_url),
+                                                 ("anthropic", args.anthropic_url),
+                                                 ("serpapi", args.serpapi_url),
+                                                 ("duckduckgo", args.duckduckgo_url)) if url}
+    if args.workers <= 1:
+        serve(args.host, args.port, args.max_concurrency, args.max_pending, db_path=args.db,
+              provider_urls=provider_urls)
+        return
+
+    # One event loop per process; the kernel spreads connections via SO_REUSEPORT
+    workers = [
+        multiprocessing.Process(
+            target=serve,
+            args=(args.host, args.port, args.max_concurrency, args.max_pending, True, args.db, provider_urls)
+        )
+        for _ in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,172 @@
 import os
 import json
+import time
 import base64
+import queue
+import hashlib
 import sqlite3
+import weakref
+import threading
+from concurrent.futures import Future
+import numpy as np
 import streamlit as st
-from io import BytesIO
-import requests
+
+import embedding_snapshot
+from http_client import get_session
+from ann_index import IVFIndex
+from retrieval import stable_chunks
+from tracing import timed
+
+# Number of full text_data versions kept (chunks keep their own history)
+TEXT_HISTORY = 5
+
+# Connection tuning: WAL lets readers run alongside the writer, NORMAL sync is
+# durable across application crashes with one fsync per checkpoint
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Upper bound for INTEGER PRIMARY KEY values (first page of keyset paging)
+MAX_ROW_ID = 2 ** 63 - 1
+
+UPSERT_EMBEDDING_SQL = """
+INSERT INTO embeddings (chunk_id, chunk_content, embedding, dim) VALUES (?, ?, ?, ?)
+ON CONFLICT(chunk_id) DO UPDATE SET
+    chunk_content = excluded.chunk_content,
+    embedding = excluded.embedding,
+    dim = excluded.dim
+"""
+
+
+class _Connection(sqlite3.Connection):
+    """sqlite3 connection that can be tracked with weak references."""
+
+
+class _WriteQueue:
+    """
+    Single background thread that owns the write connection and applies queued
+    write functions one at a time, each in its own transaction.
+    """
+    
+    def __init__(self, connect):
+        self._connect = connect
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            fn, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with conn:
+                    result = fn(conn)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+        conn.close()
+    
+    def submit(self, fn):
+        """Queue `fn(connection)`; returns a Future with its result."""
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+    
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
 
 class StorageHandler:
     """
     Handles persistent storage for Streamlit Cloud deployment.
     Uses SQLite database for storing uploaded text data and embeddings.
+    Embeddings are stored as packed float32 blobs alongside their dimension;
+    search() reads them through a memory-mapped snapshot exported from SQLite,
+    or through an IVF approximate index persisted next to the database.
+    
+    Safe to share between threads (e.g. Streamlit sessions): every thread reads
+    through its own connection, so readers run concurrently under WAL, and all
+    writes are serialised through a single writer thread.
     """
     
-    def __init__(self):
+    def __init__(self, db_path='vadilal_data.db', use_snapshot=True, use_ann=False, ann_nprobe=8):
         # Create database if it doesn't exist
-        self.conn = sqlite3.connect('vadilal_data.db', check_same_thread=False)
-        self.cursor = self.conn.cursor()
-        self._create_tables()
+        self.db_path = db_path
+        if db_path == ':memory:':
+            # Per-thread connections must all see the same in-memory database
+            self._uri = f"file:vadilal-{id(self)}?mode=memory&cache=shared"
+        else:
+            self._uri = None
+        self._local = threading.local()
+        # Set by the owner (QueryEngine) to time reads and writes, see tracing.py
+        self.tracer = None
+        self._connections = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
+        self._writer = _WriteQueue(self._connect)
+        # Guards the shared search structures below
+        self._index_lock = threading.RLock()
+        # Normalised embedding matrix used by search(), rebuilt after writes;
+        # the generation counter keeps a rebuild racing a write from being cached
+        self._matrix_cache = None
+        self._matrix_generation = 0
+        self._matrix_lock = threading.Lock()
+        # Memory-mapped snapshots per dimension (not available for in-memory databases)
+        self.use_snapshot = use_snapshot and db_path != ':memory:'
+        self._snapshots = {}
+        # Approximate nearest-neighbour indexes per dimension, kept in sync by save_embeddings()
+        self.use_ann = use_ann and db_path != ':memory:'
+        self.ann_nprobe = ann_nprobe
+        self._ann_indexes = {}
+        self._ann_dirty = set()
+        self.run_write(self._create_tables)
+    
+    def _connect(self):
+        """Open a new tuned connection to the database."""
+        if self._uri:
+            conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False, factory=_Connection)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, factory=_Connection)
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    @property
+    def conn(self):
+        """Read connection owned by the calling thread (opened on first use)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            # Enforce the read/write split: writes must go through run_write()
+            conn.execute("PRAGMA query_only=1")
+            with self._connections_lock:
+                self._connections.add(conn)
+        return conn
+    
+    @timed("storage.write")
+    def run_write(self, fn):
+        """
+        Run `fn(connection)` on the writer thread inside a transaction and return
+        its result. Writes from all threads are applied one at a time, in order.
+        """
+        return self._writer.submit(fn).result()
     
-    def _create_tables(self):
+    def _create_tables(self, conn):
         """Create necessary tables if they don't exist."""
+        cursor = conn.cursor()
         # Table for storing text data
-        self.cursor.execute('''
+        cursor.execute('''
         CREATE TABLE IF NOT EXISTS text_data (
             id INTEGER PRIMARY KEY,
             content TEXT NOT NULL,
@@ -29,80 +174,790 @@ class StorageHandler:
         )
         ''')
         
+        # Content-hashed chunks of the text data; removed chunks are tombstoned
+        # with the version that dropped them instead of being deleted
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS text_chunks (
+            chunk_hash TEXT PRIMARY KEY,
+            content TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            added_version INTEGER NOT NULL,
+            removed_version INTEGER
+        )
+        ''')
+        
         # Table for storing vector embeddings
-        self.cursor.execute('''
+        cursor.execute('''
         CREATE TABLE IF NOT EXISTS embeddings (
             id INTEGER PRIMARY KEY,
             chunk_id TEXT NOT NULL,
             chunk_content TEXT NOT NULL,
             embedding BLOB NOT NULL,
+            dim INTEGER,
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
         )
         ''')
         
-        self.conn.commit()
+        # Cache of computed vectors keyed by chunk content hash and embedding model
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            content_hash TEXT NOT NULL,
+            model_id TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            PRIMARY KEY (content_hash, model_id)
+        )
+        ''')
+        
+        # Shared web search results keyed by provider + normalised query;
+        # accessed_at drives LRU eviction
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS search_cache (
+            cache_key TEXT PRIMARY KEY,
+            provider TEXT NOT NULL,
+            query TEXT NOT NULL,
+            result TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_accessed ON search_cache (accessed_at)")
+        
+        # Finished LLM answers keyed by model + context + history + prompt.
+        # scope_key groups entries that only differ in the question, for
+        # similarity lookups; kb_version ties each answer to the knowledge base
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS response_cache (
+            cache_key TEXT PRIMARY KEY,
+            scope_key TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt TEXT NOT NULL,
+            response TEXT NOT NULL,
+            embedding BLOB,
+            kb_version TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_scope ON response_cache (scope_key, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_accessed ON response_cache (accessed_at)")
+        
+        # Chat transcripts, one row per message; ids increase in conversation
+        # order, so pages are read by id within a session
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages (session_id, id)")
+        
+        # Precomputed answers to the curated FAQ (faq.py), each tied to the
+        # knowledge version it was generated from
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS faq_answers (
+            question TEXT PRIMARY KEY,
+            answer TEXT NOT NULL,
+            model TEXT NOT NULL,
+            kb_version TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        ''')
+        
+        # Figures parsed from the knowledge tables (financial_facts.py), one
+        # row per metric and period; `display` keeps the text as published
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS financial_facts (
+            metric TEXT NOT NULL,
+            period TEXT NOT NULL,
+            value REAL NOT NULL,
+            display TEXT NOT NULL,
+            unit TEXT NOT NULL,
+            basis TEXT NOT NULL,
+            approximate INTEGER NOT NULL,
+            source TEXT NOT NULL,
+            PRIMARY KEY (metric, period)
+        )
+        ''')
+        
+        # Time series of traced requests and their spans (tracing.py); the
+        # trace itself is the row whose name is the trace's name
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS trace_spans (
+            id INTEGER PRIMARY KEY,
+            trace_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            started_at REAL NOT NULL,
+            duration REAL NOT NULL,
+            attributes TEXT NOT NULL
+        )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_trace_spans_started ON trace_spans (started_at)")
+        
+        # Change counter for the embeddings table, bumped by triggers so any
+        # writer invalidates exported snapshots
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS storage_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO storage_meta (key, value) VALUES ('embeddings_version', 0)")
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS embeddings_version_{event.lower()} AFTER {event} ON embeddings
+            BEGIN
+                UPDATE storage_meta SET value = value + 1 WHERE key = 'embeddings_version';
+            END
+            ''')
+        
+        self._migrate_embeddings(cursor)
+        
+        # Upserts key on chunk_id; keep the newest row of any legacy duplicates
+        cursor.execute(
+            "DELETE FROM embeddings WHERE id NOT IN (SELECT MAX(id) FROM embeddings GROUP BY chunk_id)"
+        )
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_embeddings_chunk_id ON embeddings (chunk_id)")
+    
+    def _migrate_embeddings(self, cursor):
+        """Convert legacy base64/JSON embedding rows to packed float32 blobs."""
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(embeddings)")]
+        if "dim" not in columns:
+            cursor.execute("ALTER TABLE embeddings ADD COLUMN dim INTEGER")
+        
+        # Legacy rows are the ones without a recorded dimension
+        cursor.execute("SELECT id, embedding FROM embeddings WHERE dim IS NULL")
+        legacy_rows = cursor.fetchall()
+        for row_id, embedding_binary in legacy_rows:
+            vector = np.asarray(json.loads(base64.b64decode(embedding_binary)), dtype=np.float32)
+            cursor.execute(
+                "UPDATE embeddings SET embedding = ?, dim = ? WHERE id = ?",
+                (vector.tobytes(), vector.shape[0], row_id)
+            )
+        
+        return len(legacy_rows)
+    
+    @staticmethod
+    def _pack_embedding(embedding):
+        """Return (float32 blob, dimension) for a vector-like embedding."""
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        return vector.tobytes(), vector.shape[0]
     
     def save_text_data(self, content):
-        """Save text data to database."""
-        # Clear previous data
-        self.cursor.execute("DELETE FROM text_data")
+        """
+        Save a new version of the text data. The document is split into
+        content-defined chunks keyed by hash and diffed against the current
+        version: new chunks are added, missing ones tombstoned and unchanged
+        ones left alone. Returns a report dict with the version number, the
+        added (hash, content) pairs, the removed hashes and the unchanged count.
+        """
+        chunks = {}
+        for position, chunk in enumerate(stable_chunks(content)):
+            chunks.setdefault(hashlib.sha256(chunk.encode("utf-8")).hexdigest(), (position, chunk))
         
-        # Insert new data
-        self.cursor.execute("INSERT INTO text_data (content) VALUES (?)", (content,))
-        self.conn.commit()
-        return True
+        def write(conn):
+            latest = conn.execute("SELECT id, content FROM text_data ORDER BY id DESC LIMIT 1").fetchone()
+            if latest and latest[1] == content:
+                version = latest[0]
+            else:
+                version = conn.execute("INSERT INTO text_data (content) VALUES (?)", (content,)).lastrowid
+                conn.execute(
+                    "DELETE FROM text_data WHERE id NOT IN (SELECT id FROM text_data ORDER BY id DESC LIMIT ?)",
+                    (TEXT_HISTORY,)
+                )
+            
+            active = dict(conn.execute(
+                "SELECT chunk_hash, position FROM text_chunks WHERE removed_version IS NULL"
+            ).fetchall())
+            added = [(h, chunk) for h, (_, chunk) in chunks.items() if h not in active]
+            removed = [h for h in active if h not in chunks]
+            moved = [(position, h) for h, (position, _) in chunks.items() if h in active and active[h] != position]
+            
+            # Chunks that come back after being tombstoned are revived in place
+            conn.executemany(
+                """
+                INSERT INTO text_chunks (chunk_hash, content, position, added_version) VALUES (?, ?, ?, ?)
+                ON CONFLICT(chunk_hash) DO UPDATE SET
+                    position = excluded.position,
+                    added_version = excluded.added_version,
+                    removed_version = NULL
+                """,
+                [(h, chunk, chunks[h][0], version) for h, chunk in added]
+            )
+            conn.executemany("UPDATE text_chunks SET position = ? WHERE chunk_hash = ?", moved)
+            conn.executemany(
+                "UPDATE text_chunks SET removed_version = ? WHERE chunk_hash = ?",
+                [(version, h) for h in removed]
+            )
+            
+            return {
+                "version": version,
+                "added": added,
+                "removed": removed,
+                "unchanged": len(chunks) - len(added),
+                "total": len(chunks)
+            }
+        
+        return self.run_write(write)
+    
+    def get_text_chunks(self):
+        """Return the current version's chunks as (chunk_hash, content) pairs in document order."""
+        return self.conn.execute(
+            "SELECT chunk_hash, content FROM text_chunks WHERE removed_version IS NULL ORDER BY position"
+        ).fetchall()
     
     def get_text_data(self):
         """Retrieve text data from database."""
-        self.cursor.execute("SELECT content FROM text_data ORDER BY timestamp DESC LIMIT 1")
-        result = self.cursor.fetchone()
+        result = self.conn.execute("SELECT content FROM text_data ORDER BY id DESC LIMIT 1").fetchone()
         if result:
             return result[0]
         return None
     
     def save_embeddings(self, chunk_id, chunk_content, embedding):
         """Save embedding to database."""
-        # Convert embedding to binary
-        embedding_binary = base64.b64encode(json.dumps(embedding).encode())
+        self.save_embeddings_bulk([(chunk_id, chunk_content, embedding)])
+        return True
+    
+    def save_embeddings_bulk(self, items, batch_size=10000):
+        """
+        Upsert many (chunk_id, chunk_content, embedding) items in a single
+        transaction, `batch_size` rows per executemany call. Returns the number
+        of items written.
+        """
+        items = iter(items)
+        
+        def write(conn):
+            count = 0
+            ann_rows = {}
+            # Index state is checked against the version before this transaction;
+            # writes are serialised, so no other write can slip in between
+            version = self._embeddings_version(conn)
+            ann_in_sync = {}
+            
+            while True:
+                batch = []
+                for chunk_id, chunk_content, embedding in items:
+                    embedding_binary, dim = self._pack_embedding(embedding)
+                    batch.append((chunk_id, chunk_content, embedding_binary, dim))
+                    if len(batch) >= batch_size:
+                        break
+                if not batch:
+                    break
+                
+                if self.use_ann:
+                    for row in batch:
+                        dim = row[3]
+                        if dim not in ann_in_sync:
+                            ann_in_sync[dim] = self._ann_in_sync(dim, version)
+                        if ann_in_sync[dim]:
+                            ann_rows.setdefault(dim, []).append((row[0], row[2]))
+                
+                conn.executemany(UPSERT_EMBEDDING_SQL, batch)
+                count += len(batch)
+            
+            return count, ann_rows, self._embeddings_version(conn)
         
-        # Check if chunk exists
-        self.cursor.execute("SELECT id FROM embeddings WHERE chunk_id = ?", (chunk_id,))
-        result = self.cursor.fetchone()
+        count, ann_rows, version = self.run_write(write)
         
-        if result:
-            # Update existing embedding
-            self.cursor.execute(
-                "UPDATE embeddings SET chunk_content = ?, embedding = ? WHERE chunk_id = ?", 
-                (chunk_content, embedding_binary, chunk_id)
+        with self._index_lock:
+            self._matrix_cache = None
+            self._matrix_generation += 1
+            for dim, rows in ann_rows.items():
+                vectors = np.frombuffer(b"".join(blob for _, blob in rows), dtype=np.float32).reshape(len(rows), dim)
+                self._ann_insert(dim, [chunk_id for chunk_id, _ in rows], vectors, version)
+        return count
+    
+    def delete_embeddings(self, chunk_ids):
+        """Delete embeddings by chunk id and drop them from in-sync indexes. Returns the number deleted."""
+        chunk_ids = list(chunk_ids)
+        if not chunk_ids:
+            return 0
+        
+        def write(conn):
+            version = self._embeddings_version(conn)
+            in_sync = [dim for dim in list(self._ann_indexes) if self._ann_in_sync(dim, version)] if self.use_ann else []
+            deleted = conn.executemany("DELETE FROM embeddings WHERE chunk_id = ?", [(c,) for c in chunk_ids]).rowcount
+            return deleted, in_sync, self._embeddings_version(conn)
+        
+        deleted, in_sync, version = self.run_write(write)
+        
+        with self._index_lock:
+            self._matrix_cache = None
+            self._matrix_generation += 1
+            for dim in in_sync:
+                self._ann_indexes[dim].remove(chunk_ids)
+                self._ann_indexes[dim].version = version
+                self._ann_dirty.add(dim)
+        return deleted
+    
+    def existing_chunk_ids(self, chunk_ids):
+        """Return the subset of `chunk_ids` that have a stored embedding."""
+        chunk_ids = list(chunk_ids)
+        found = set()
+        for start in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            found.update(row[0] for row in self.conn.execute(
+                f"SELECT chunk_id FROM embeddings WHERE chunk_id IN ({placeholders})", batch
+            ))
+        return found
+    
+    def get_cached_embeddings(self, model_id, content_hashes):
+        """Return {content_hash: vector} for the hashes already embedded with `model_id`."""
+        cached = {}
+        hashes = list(content_hashes)
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                f"SELECT content_hash, embedding FROM embedding_cache WHERE model_id = ? AND content_hash IN ({placeholders})",
+                [model_id] + batch
+            ).fetchall()
+            for content_hash, embedding_binary in rows:
+                cached[content_hash] = np.frombuffer(embedding_binary, dtype=np.float32)
+        return cached
+    
+    def save_cached_embeddings(self, model_id, entries):
+        """Store (content_hash, vector) pairs computed with `model_id`."""
+        rows = [(content_hash, model_id, self._pack_embedding(vector)[0]) for content_hash, vector in entries]
+        self.run_write(lambda conn: conn.executemany(
+            "INSERT OR REPLACE INTO embedding_cache (content_hash, model_id, embedding) VALUES (?, ?, ?)", rows
+        ))
+        return True
+    
+    @timed("storage.get_search_result")
+    def get_search_result(self, cache_key, min_created_at):
+        """
+        Return (result, created_at) for a cached search no older than
+        `min_created_at`, or None. Hits are marked as recently used in the
+        background so the read never waits for the writer.
+        """
+        row = self.conn.execute(
+            "SELECT result, created_at FROM search_cache WHERE cache_key = ? AND created_at >= ?",
+            (cache_key, min_created_at)
+        ).fetchone()
+        if row is not None:
+            self._touch("search_cache", cache_key)
+        return row
+    
+    def _touch(self, table, cache_key):
+        """Mark a cache row as recently used without waiting for the writer."""
+        now = time.time()
+        self._writer.submit(lambda conn: conn.execute(
+            f"UPDATE {table} SET accessed_at = ? WHERE cache_key = ?", (now, cache_key)
+        ))
+    
+    def save_search_result(self, cache_key, provider, query, result, max_entries=5000):
+        """Store a search result, evicting the least recently used rows beyond `max_entries`."""
+        now = time.time()
+        
+        def write(conn):
+            conn.execute(
+                """
+                INSERT INTO search_cache (cache_key, provider, query, result, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    result = excluded.result,
+                    created_at = excluded.created_at,
+                    accessed_at = excluded.accessed_at
+                """,
+                (cache_key, provider, query, result, now, now)
             )
-        else:
-            # Insert new embedding
-            self.cursor.execute(
-                "INSERT INTO embeddings (chunk_id, chunk_content, embedding) VALUES (?, ?, ?)",
-                (chunk_id, chunk_content, embedding_binary)
+            conn.execute(
+                "DELETE FROM search_cache WHERE cache_key IN "
+                "(SELECT cache_key FROM search_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (max_entries,)
+            )
+        
+        self.run_write(write)
+        return True
+    
+    def purge_search_cache(self, max_age):
+        """Delete cached searches older than `max_age` seconds. Returns the number removed."""
+        cutoff = time.time() - max_age
+        return self.run_write(
+            lambda conn: conn.execute("DELETE FROM search_cache WHERE created_at < ?", (cutoff,)).rowcount
+        )
+    
+    @timed("storage.text_version")
+    def text_version(self):
+        """Id of the latest text_data version (0 if none), changes on every new save."""
+        return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM text_data").fetchone()[0]
+    
+    @timed("storage.get_cached_response")
+    def get_cached_response(self, cache_key, kb_version, min_created_at):
+        """Return a cached LLM answer for `cache_key` that is still valid, or None."""
+        row = self.conn.execute(
+            "SELECT response FROM response_cache WHERE cache_key = ? AND kb_version = ? AND created_at >= ?",
+            (cache_key, kb_version, min_created_at)
+        ).fetchone()
+        if row is None:
+            return None
+        self._touch("response_cache", cache_key)
+        return row[0]
+    
+    @timed("storage.get_response_candidates")
+    def get_response_candidates(self, scope_key, kb_version, min_created_at, limit=500):
+        """Return (prompt, response, vector) for the newest valid answers in a scope."""
+        rows = self.conn.execute(
+            """
+            SELECT prompt, response, embedding FROM response_cache
+            WHERE scope_key = ? AND kb_version = ? AND created_at >= ? AND embedding IS NOT NULL
+            ORDER BY created_at DESC LIMIT ?
+            """,
+            (scope_key, kb_version, min_created_at, limit)
+        ).fetchall()
+        return [(prompt, response, np.frombuffer(blob, dtype=np.float32)) for prompt, response, blob in rows]
+    
+    def save_cached_response(self, cache_key, scope_key, model, prompt, response, embedding, kb_version,
+                             max_entries=2000):
+        """Store an LLM answer, evicting the least recently used rows beyond `max_entries`."""
+        now = time.time()
+        blob = self._pack_embedding(embedding)[0] if embedding is not None else None
+        
+        def write(conn):
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO response_cache
+                    (cache_key, scope_key, model, prompt, response, embedding, kb_version, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (cache_key, scope_key, model, prompt, response, blob, kb_version, now, now)
+            )
+            conn.execute(
+                "DELETE FROM response_cache WHERE cache_key IN "
+                "(SELECT cache_key FROM response_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (max_entries,)
             )
         
-        self.conn.commit()
+        self.run_write(write)
         return True
     
+    def purge_response_cache(self, kb_version, max_age):
+        """Delete answers from other knowledge-base versions or older than `max_age` seconds."""
+        cutoff = time.time() - max_age
+        return self.run_write(lambda conn: conn.execute(
+            "DELETE FROM response_cache WHERE kb_version != ? OR created_at < ?", (kb_version, cutoff)
+        ).rowcount)
+    
+    def append_chat_message(self, session_id, role, content):
+        """Add a message to a chat session; returns its id."""
+        now = time.time()
+        return self.run_write(lambda conn: conn.execute(
+            "INSERT INTO chat_messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+            (session_id, role, content, now)
+        ).lastrowid)
+    
+    @timed("storage.get_chat_messages")
+    def get_chat_messages(self, session_id, limit, before_id=None):
+        """
+        Return up to `limit` messages of a session, oldest first, as dicts with
+        "id", "role" and "content". Without `before_id` these are the latest
+        messages; with it, the ones just before that message (keyset paging,
+        so each page costs the same however long the conversation is).
+        """
+        rows = self.conn.execute(
+            """
+            SELECT id, role, content FROM chat_messages
+            WHERE session_id = ? AND id < ?
+            ORDER BY id DESC LIMIT ?
+            """,
+            (session_id, before_id if before_id is not None else MAX_ROW_ID, limit)
+        ).fetchall()
+        return [{"id": row_id, "role": role, "content": content} for row_id, role, content in reversed(rows)]
+    
+    def count_chat_messages(self, session_id):
+        """Number of stored messages in a session."""
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM chat_messages WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+    
+    def delete_chat_session(self, session_id):
+        """Delete all messages of a session. Returns the number removed."""
+        return self.run_write(lambda conn: conn.execute(
+            "DELETE FROM chat_messages WHERE session_id = ?", (session_id,)
+        ).rowcount)
+    
+    def purge_chat_sessions(self, max_age):
+        """Delete sessions with no message in the last `max_age` seconds. Returns the number of messages removed."""
+        cutoff = time.time() - max_age
+        return self.run_write(lambda conn: conn.execute(
+            """
+            DELETE FROM chat_messages WHERE session_id IN
+                (SELECT session_id FROM chat_messages GROUP BY session_id HAVING MAX(created_at) < ?)
+            """,
+            (cutoff,)
+        ).rowcount)
+    
+    def save_financial_facts(self, source, facts):
+        """Replace the facts parsed from `source` with `facts` (dicts as produced by financial_facts.extract_facts)."""
+        rows = [(f["metric"], f["period"], f["value"], f["display"], f["unit"], f["basis"], int(f["approximate"]), source)
+                for f in facts]
+        
+        def write(conn):
+            conn.execute("DELETE FROM financial_facts WHERE source = ?", (source,))
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO financial_facts
+                    (metric, period, value, display, unit, basis, approximate, source)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows
+            )
+        
+        self.run_write(write)
+    
+    def get_financial_facts(self):
+        """Every stored fact as a dict, ordered by metric and period."""
+        rows = self.conn.execute(
+            "SELECT metric, period, value, display, unit, basis, approximate FROM financial_facts ORDER BY metric, period"
+        ).fetchall()
+        return [{"metric": metric, "period": period, "value": value, "display": display, "unit": unit,
+                 "basis": basis, "approximate": bool(approximate)}
+                for metric, period, value, display, unit, basis, approximate in rows]
+    
+    def save_faq_answer(self, question, answer, model, kb_version):
+        """Store the answer to an FAQ question, replacing the one built on an earlier version."""
+        now = time.time()
+        self.run_write(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO faq_answers (question, answer, model, kb_version, created_at) VALUES (?, ?, ?, ?, ?)",
+            (question, answer, model, kb_version, now)
+        ))
+    
+    @timed("storage.get_faq_answers")
+    def get_faq_answers(self, kb_version):
+        """{question: answer} for the FAQ answers built on `kb_version`."""
+        return dict(self.conn.execute(
+            "SELECT question, answer FROM faq_answers WHERE kb_version = ?", (kb_version,)
+        ).fetchall())
+    
+    def save_trace_spans(self, rows):
+        """
+        Queue (trace_id, name, started_at, duration, attributes) rows for the
+        writer without waiting, so tracing never holds up a request.
+        """
+        rows = [(trace_id, name, started_at, duration, json.dumps(attributes, default=str))
+                for trace_id, name, started_at, duration, attributes in rows]
+        self._writer.submit(lambda conn: conn.executemany(
+            "INSERT INTO trace_spans (trace_id, name, started_at, duration, attributes) VALUES (?, ?, ?, ?, ?)", rows
+        ))
+    
+    def get_trace_spans(self, since, name=None, limit=1000):
+        """Spans started after `since` (oldest first), optionally only those called `name`."""
+        query = "SELECT trace_id, name, started_at, duration, attributes FROM trace_spans WHERE started_at >= ?"
+        params = [since]
+        if name is not None:
+            query += " AND name = ?"
+            params.append(name)
+        rows = self.conn.execute(query + " ORDER BY started_at LIMIT ?", params + [limit]).fetchall()
+        return [{"trace_id": trace_id, "name": span_name, "started_at": started_at, "duration": duration,
+                 "attributes": json.loads(attributes)}
+                for trace_id, span_name, started_at, duration, attributes in rows]
+    
+    def purge_trace_spans(self, max_age):
+        """Delete spans older than `max_age` seconds. Returns the number removed."""
+        cutoff = time.time() - max_age
+        return self.run_write(lambda conn: conn.execute(
+            "DELETE FROM trace_spans WHERE started_at < ?", (cutoff,)
+        ).rowcount)
+    
+    def embeddings_version(self):
+        """Counter that changes whenever the embeddings table is modified."""
+        return self._embeddings_version(self.conn)
+    
+    @staticmethod
+    def _embeddings_version(conn):
+        row = conn.execute("SELECT value FROM storage_meta WHERE key = 'embeddings_version'").fetchone()
+        return row[0] if row else 0
+    
     def get_embeddings(self):
-        """Retrieve all embeddings from database."""
-        self.cursor.execute("SELECT chunk_id, chunk_content, embedding FROM embeddings")
-        results = self.cursor.fetchall()
+        """Retrieve all embeddings from database (vectors as float32 NumPy arrays)."""
+        results = self.conn.execute("SELECT chunk_id, chunk_content, embedding FROM embeddings").fetchall()
         
         embeddings = {}
         for chunk_id, chunk_content, embedding_binary in results:
-            embedding = json.loads(base64.b64decode(embedding_binary))
             embeddings[chunk_id] = {
                 "content": chunk_content,
-                "embedding": embedding
+                "embedding": np.frombuffer(embedding_binary, dtype=np.float32)
             }
         
         return embeddings
     
+    def _load_matrix(self, dim):
+        """
+        Load every embedding of dimension `dim` into one contiguous float32 matrix
+        with L2-normalised rows. Cached until the next write.
+        """
+        cache = self._matrix_cache
+        if cache is not None and cache["dim"] == dim:
+            return cache
+        
+        # One thread rebuilds while concurrent searches wait for its result
+        with self._matrix_lock:
+            cache = self._matrix_cache
+            if cache is not None and cache["dim"] == dim:
+                return cache
+            generation = self._matrix_generation
+            cache = self._build_matrix(dim)
+            with self._index_lock:
+                if generation == self._matrix_generation:
+                    self._matrix_cache = cache
+            return cache
+    
+    def _build_matrix(self, dim):
+        rows = self.conn.execute(
+            "SELECT chunk_id, chunk_content, embedding FROM embeddings WHERE dim = ? ORDER BY id", (dim,)
+        ).fetchall()
+        
+        if rows:
+            matrix = np.frombuffer(b"".join(row[2] for row in rows), dtype=np.float32).reshape(len(rows), dim)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix = matrix / norms
+        else:
+            matrix = np.empty((0, dim), dtype=np.float32)
+        
+        return {
+            "dim": dim,
+            "chunk_ids": [row[0] for row in rows],
+            "contents": [row[1] for row in rows],
+            "matrix": matrix
+        }
+    
+    @timed("storage.search")
+    def search(self, query_vector, k=5, nprobe=None, exact=False):
+        """
+        Return the `k` stored chunks most similar to `query_vector` by cosine
+        similarity, best first, as dicts with chunk_id, content and score.
+        With use_ann the search is approximate unless `exact` is set; `nprobe`
+        overrides the number of IVF lists scanned (recall vs. latency).
+        """
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        if self.use_ann and not exact:
+            with self._index_lock:
+                index = self._get_ann_index(query.shape[0])
+                hits = index.search(query, k, nprobe or self.ann_nprobe)
+            return self._with_contents(hits)
+        if self.use_snapshot:
+            return self._search_snapshot(query, k)
+        
+        data = self._load_matrix(query.shape[0])
+        matrix = data["matrix"]
+        if matrix.shape[0] == 0 or k <= 0:
+            return []
+        
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        
+        scores = matrix @ query
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        return [
+            {"chunk_id": data["chunk_ids"][i], "content": data["contents"][i], "score": float(scores[i])}
+            for i in top
+        ]
+    
+    def _search_snapshot(self, query, k):
+        """search() backed by the memory-mapped snapshot; content comes from SQLite."""
+        dim = query.shape[0]
+        with self._index_lock:
+            current = self._snapshots.get(dim)
+            snapshot = embedding_snapshot.open_snapshot(self, dim, current=current)
+            if current is not None and snapshot is not current:
+                current.close()
+            self._snapshots[dim] = snapshot
+            hits = snapshot.search(query, k)
+        
+        return self._with_contents(hits)
+    
+    def _with_contents(self, hits):
+        """Turn (chunk_id, score) pairs into result dicts with chunk text from SQLite."""
+        if not hits:
+            return []
+        
+        placeholders = ",".join("?" * len(hits))
+        contents = dict(self.conn.execute(
+            f"SELECT chunk_id, chunk_content FROM embeddings WHERE chunk_id IN ({placeholders})",
+            [chunk_id for chunk_id, _ in hits]
+        ).fetchall())
+        return [
+            {"chunk_id": chunk_id, "content": contents.get(chunk_id, ""), "score": score}
+            for chunk_id, score in hits
+        ]
+    
+    def ann_index_path(self, dim):
+        """Location of the persisted IVF index for embeddings of dimension `dim`."""
+        return f"{self.db_path}.{dim}d.ivf.npz"
+    
+    def _ann_in_sync(self, dim, version=None):
+        """True if the loaded (or persisted) index reflects table version `version` (default: current)."""
+        if version is None:
+            version = self.embeddings_version()
+        with self._index_lock:
+            index = self._ann_indexes.get(dim)
+            if index is None and os.path.exists(self.ann_index_path(dim)):
+                index = self._ann_indexes[dim] = IVFIndex.load(self.ann_index_path(dim))
+            return index is not None and index.version == version
+    
+    def _ann_insert(self, dim, chunk_ids, vectors, version):
+        """Apply a write that went through this handler to the in-sync index."""
+        index = self._ann_indexes[dim]
+        index.add(chunk_ids, vectors)
+        index.version = version
+        if index.needs_retrain:
+            # Repartition on the next search once the corpus has outgrown the centroids
+            index.version = None
+        self._ann_dirty.add(dim)
+    
+    def _get_ann_index(self, dim):
+        """Return the IVF index for `dim`, rebuilding it from SQLite if it is stale."""
+        if self._ann_in_sync(dim):
+            return self._ann_indexes[dim]
+        
+        # Read the version first: a write landing in between only makes the
+        # index look stale and triggers another rebuild
+        version = self.embeddings_version()
+        rows = self.conn.execute(
+            "SELECT chunk_id, embedding FROM embeddings WHERE dim = ? ORDER BY id", (dim,)
+        ).fetchall()
+        vectors = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32).reshape(len(rows), dim)
+        
+        index = IVFIndex(dim, nprobe=self.ann_nprobe)
+        index.train([row[0] for row in rows], vectors)
+        index.version = version
+        self._ann_indexes[dim] = index
+        self.save_ann_indexes(dims=[dim])
+        return index
+    
+    def save_ann_indexes(self, dims=None):
+        """Persist modified IVF indexes next to the database."""
+        with self._index_lock:
+            for dim in list(dims if dims is not None else self._ann_dirty):
+                if dim in self._ann_indexes:
+                    self._ann_indexes[dim].save(self.ann_index_path(dim))
+                self._ann_dirty.discard(dim)
+    
     def close(self):
-        """Close database connection."""
-        self.conn.close()
+        """Close all database connections and stop the writer thread."""
+        with self._index_lock:
+            if self.use_ann:
+                self.save_ann_indexes()
+            for snapshot in self._snapshots.values():
+                snapshot.close()
+            self._snapshots = {}
+        
+        self._writer.close()
+        with self._connections_lock:
+            for conn in list(self._connections):
+                conn.close()
+            self._connections = weakref.WeakSet()
+        self._local = threading.local()
 
 # Alternative: GitHub Gist-based storage (if you prefer this over SQLite)
 class GistStorageHandler:
@@ -151,7 +1006,7 @@ class GistStorageHandler:
                     }
                 }
                 
-                response = requests.post(
+                response = get_session().post(
                     "https://api.github.com/gists",
                     headers=headers,
                     json=data
@@ -185,7 +1040,7 @@ class GistStorageHandler:
             }
         }
         
-        response = requests.patch(
+        response = get_session().patch(
             f"https://api.github.com/gists/{self.gist_id}",
             headers=headers,
             json=data
@@ -203,7 +1058,7 @@ class GistStorageHandler:
             "Accept": "application/vnd.github.v3+json"
         }
         
-        response = requests.get(
+        response = get_session().get(
             f"https://api.github.com/gists/{self.gist_id}",
             headers=headers
         )
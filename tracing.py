@@ -0,0 +1,315 @@
+"""
+Lightweight tracing for the answer pipeline and storage.
+
+A trace covers one request (QueryEngine.stream_answer()) and holds spans for
+its stages: knowledge retrieval and each web search, history windowing,
+prompt building, the provider call, plus every StorageHandler operation run
+on the request's thread while it is open. Spans carry attributes such as
+prompt bytes, token counts and cache outcomes.
+
+Finished traces go to a ring buffer (summary() feeds the sidebar panel and
+/stats) and, when the tracer has a storage handler, to the `trace_spans`
+table as a time series, one row per trace and per span, written in batches
+(at most every FLUSH_INTERVAL seconds) so a request never waits on SQLite. Every duration also
+lands in a per-name histogram, and count() keeps labelled counters (tokens,
+prompt bytes, answer outcomes); prometheus() exports both in the Prometheus
+text format.
+
+Disabled (TRACING=0), trace() hands out a shared no-op trace and observe()
+and count() return at once, so instrumented code pays an attribute check.
+"""
+import os
+import time
+import uuid
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the duration histogram buckets
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Finished traces kept in memory, and duration samples kept per span name
+DEFAULT_CAPACITY = 200
+
+# Finished traces are written to storage at most this often (seconds), or
+# sooner once FLUSH_ROWS rows are waiting; summary() and prometheus() (the
+# sidebar, /stats and /metrics) also write out what is waiting when idle
+FLUSH_INTERVAL = 1.0
+FLUSH_ROWS = 1000
+
+# Rows of the trace_spans table older than this are deleted at start-up
+TRACE_RETENTION = 7 * 24 * 60 * 60
+
+METRIC_PREFIX = "vadilal"
+COUNTER_HELP = {
+    "answers": "Answers by how they were produced.",
+    "tokens": "Provider tokens by kind.",
+    "prompt_bytes": "Bytes of prompt text sent to providers.",
+    "context_tokens": "Estimated knowledge context tokens before and after compression.",
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class _NullTrace:
+    """Stand-in trace while tracing is disabled; every method does nothing."""
+
+    enabled = False
+    id = None
+
+    @contextmanager
+    def span(self, name, **attributes):
+        yield attributes
+
+    def add_span(self, name, duration, **attributes):
+        pass
+
+    def set(self, **attributes):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class Trace:
+    """One request: its attributes and the spans recorded while it ran."""
+
+    enabled = True
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attributes = dict(attributes)
+        self.started_at = time.time()
+        self.duration = None
+        self.spans = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time the block as a span; the yielded dict takes further attributes."""
+        started = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self.add_span(name, time.perf_counter() - started, **attributes)
+
+    def add_span(self, name, duration, **attributes):
+        """Record a span that has already been timed (ending now)."""
+        offset = time.perf_counter() - self._started - duration
+        with self._lock:
+            self.spans.append({"name": name, "offset": offset, "duration": duration, "attributes": attributes})
+        self.tracer._record(name, duration)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class Tracer:
+    """
+    Collects traces, per-name duration histograms and labelled counters.
+    `storage` (a StorageHandler) persists finished traces; call flush()
+    before closing it. Thread-safe; share one per process.
+    """
+
+    def __init__(self, enabled=None, capacity=DEFAULT_CAPACITY, storage=None, retention=TRACE_RETENTION):
+        if enabled is None:
+            enabled = os.getenv("TRACING", "1") != "0"
+        self.enabled = enabled
+        self.storage = storage
+        self.capacity = capacity
+        self._traces = deque(maxlen=capacity)
+        self._samples = {}
+        self._histograms = {}
+        self._counters = {}
+        self._pending = []
+        self._flushed_at = time.monotonic()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if enabled and storage is not None:
+            storage.purge_trace_spans(retention)
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        """
+        Open a trace for the block and make it the current one on this
+        thread (observe() adds spans to it). Yields the Trace, or NULL_TRACE
+        when disabled.
+        """
+        if not self.enabled:
+            yield NULL_TRACE
+            return
+        trace = Trace(self, name, attributes)
+        previous = getattr(self._local, "trace", None)
+        self._local.trace = trace
+        try:
+            yield trace
+        except GeneratorExit:
+            # The consumer stopped reading the answer
+            trace.set(outcome="cancelled")
+            raise
+        except Exception as e:
+            trace.set(outcome="error", error=type(e).__name__)
+            raise
+        finally:
+            self._local.trace = previous
+            self._finish(trace)
+
+    def current(self):
+        """The trace open on this thread, or NULL_TRACE."""
+        return getattr(self._local, "trace", None) or NULL_TRACE
+
+    def observe(self, name, duration, **attributes):
+        """Record a timed operation; it becomes a span of the current trace if there is one."""
+        if not self.enabled:
+            return
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            trace.add_span(name, duration, **attributes)
+        else:
+            self._record(name, duration)
+
+    def count(self, name, amount=1, **labels):
+        """Add `amount` to the counter `name` with these labels."""
+        if not self.enabled or not amount:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def _record(self, name, duration):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0}
+                self._samples[name] = deque(maxlen=self.capacity)
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    histogram["buckets"][i] += 1
+                    break
+            histogram["sum"] += duration
+            histogram["count"] += 1
+            self._samples[name].append(duration)
+
+    def _finish(self, trace):
+        trace.duration = time.perf_counter() - trace._started
+        self._record(trace.name, trace.duration)
+        with self._lock:
+            self._traces.append(trace)
+        if self.storage is None:
+            return
+        rows = [(trace.id, trace.name, trace.started_at, trace.duration, trace.attributes)]
+        rows += [(trace.id, span["name"], trace.started_at + span["offset"], span["duration"], span["attributes"])
+                 for span in trace.spans]
+        with self._lock:
+            self._pending += rows
+            due = len(self._pending) >= FLUSH_ROWS or time.monotonic() - self._flushed_at >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Hand the finished traces not yet stored to the storage writer."""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            self._flushed_at = time.monotonic()
+        if rows and self.storage is not None:
+            self.storage.save_trace_spans(rows)
+
+    def summary(self, recent=5):
+        """
+        Per-name count and p50/p95 of the recent durations (ms), plus the
+        last `recent` traces with their spans, for the diagnostics panel.
+        """
+        self.flush()
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            traces = list(self._traces)[-recent:]
+            counts = {name: histogram["count"] for name, histogram in self._histograms.items()}
+        spans = {}
+        for name, values in samples.items():
+            if values:
+                spans[name] = {"count": counts[name], "p50_ms": round(values[len(values) // 2] * 1000, 2),
+                               "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 2)}
+        return {
+            "enabled": self.enabled,
+            "spans": spans,
+            "recent": [{
+                "name": trace.name,
+                "started_at": trace.started_at,
+                "duration_ms": round(trace.duration * 1000, 2),
+                "attributes": trace.attributes,
+                "spans": [(span["name"], round(span["duration"] * 1000, 2)) for span in trace.spans],
+            } for trace in reversed(traces)],
+        }
+
+    def prometheus(self, families=()):
+        """
+        Histograms and counters in the Prometheus text exposition format.
+        `families` adds (name, "counter" | "gauge", help, [(labels dict,
+        value), ...]) metrics kept elsewhere.
+        """
+        self.flush()
+        with self._lock:
+            histograms = {name: {"buckets": list(h["buckets"]), "sum": h["sum"], "count": h["count"]}
+                          for name, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        name = f"{METRIC_PREFIX}_span_duration_seconds"
+        lines = [f"# HELP {name} Duration of traced requests, pipeline stages and storage operations.",
+                 f"# TYPE {name} histogram"]
+        for span in sorted(histograms):
+            histogram = histograms[span]
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, histogram["buckets"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels([('span', span), ('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_labels([('span', span), ('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{name}_sum{_labels([('span', span)])} {histogram['sum']:.6f}")
+            lines.append(f"{name}_count{_labels([('span', span)])} {histogram['count']}")
+
+        for counter in sorted({counter for counter, _ in counters}):
+            name = f"{METRIC_PREFIX}_{counter}_total"
+            lines.append(f"# HELP {name} {COUNTER_HELP.get(counter, counter.replace('_', ' ').capitalize() + '.')}")
+            lines.append(f"# TYPE {name} counter")
+            for (other, labels), value in sorted(counters.items()):
+                if other == counter:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+
+        for family, kind, help_text, samples in families:
+            name = f"{METRIC_PREFIX}_{family}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(sorted(labels.items()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def timed(name):
+    """
+    Decorator for methods of objects with a `tracer` attribute: the call is
+    timed as `name` when the tracer is enabled.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            tracer = self.tracer
+            if tracer is None or not tracer.enabled:
+                return method(self, *args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                tracer.observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
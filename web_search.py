@@ -0,0 +1,196 @@
+"""
+Web search providers and the concurrent retrieval stage.
+
+Providers return lists of result dicts ({"title", "url", "snippet", "source"}):
+    serpapi_results      SerpAPI Google results (needs an API key)
+    duckduckgo_results   DuckDuckGo HTML results (no key)
+
+gather() runs any number of sources (web providers, local knowledge-base
+retrieval, ...) at the same time, the remote ones on a shared thread pool,
+each with its own deadline. A source that fails or misses its deadline is
+reported and skipped, so the stage takes as long as the slowest source that
+answers in time, not the sum of all of them. Local sources run on the
+calling thread, so they never queue behind searches that are still running
+on the pool. merge_results() then dedupes the web results by URL
+and title similarity and ranks them by reciprocal-rank fusion.
+"""
+import re
+import time
+from difflib import SequenceMatcher
+from urllib.parse import urlsplit, parse_qs, unquote
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from http_client import get_session
+
+SERPAPI_URL = "https://serpapi.com/search"
+DUCKDUCKGO_URL = "https://html.duckduckgo.com/html/"
+
+# Seconds each source may take before the answer goes ahead without it
+SOURCE_DEADLINES = {
+    "serpapi": 8.0,
+    "duckduckgo": 6.0,
+}
+
+# Reciprocal-rank fusion constant; larger values flatten the rank differences
+RRF_K = 60
+TITLE_SIMILARITY = 0.85
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="search")
+
+
+def serpapi_results(query, api_key, num_results=5, timeout=15, url=SERPAPI_URL):
+    """Search Google through SerpAPI. Raises on HTTP or API errors."""
+    params = {
+        "q": f"Vadilal Industries {query}",
+        "api_key": api_key,
+        "num": str(num_results)
+    }
+    response = get_session().get(url, params=params, timeout=timeout)
+    response.raise_for_status()
+    results = response.json()
+    if "error" in results:
+        raise RuntimeError(f"SERP API Error: {results['error']}")
+
+    return [
+        {
+            "title": result.get("title", "No title"),
+            "url": result.get("link", ""),
+            "snippet": result.get("snippet", "No description available"),
+            "source": "serpapi"
+        }
+        for result in (results.get("organic_results") or [])[:num_results]
+    ]
+
+
+def _duckduckgo_url(href):
+    """DuckDuckGo wraps result links in a redirect; return the target URL."""
+    if not href:
+        return ""
+    target = parse_qs(urlsplit(href).query).get("uddg")
+    return unquote(target[0]) if target else href
+
+
+def duckduckgo_results(query, num_results=5, timeout=10, url=DUCKDUCKGO_URL):
+    """Scrape DuckDuckGo's HTML results page. Raises on HTTP errors."""
+    from bs4 import BeautifulSoup
+
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    }
+    response = get_session().get(
+        url, params={"q": f"Vadilal Industries {query} latest information"},
+        headers=headers, timeout=timeout
+    )
+    response.raise_for_status()
+    soup = BeautifulSoup(response.text, 'html.parser')
+
+    results = []
+    for result in soup.find_all('div', class_='result__body')[:num_results]:
+        title_elem = result.find('a', class_='result__a')
+        snippet_elem = result.find('a', class_='result__snippet')
+        results.append({
+            "title": title_elem.text.strip() if title_elem else "No title found",
+            "url": _duckduckgo_url(title_elem.get("href")) if title_elem else "",
+            "snippet": snippet_elem.text.strip() if snippet_elem else "No snippet found",
+            "source": "duckduckgo"
+        })
+    return results
+
+
+def gather(sources, deadlines=None, inline=()):
+    """
+    Run `sources` ({name: zero-argument callable}) concurrently. Returns
+    {name: {"status": "ok" | "timeout" | "error", "result", "error", "seconds"}}.
+    Sources still running at their deadline keep running in the background
+    (their own HTTP timeouts bound them) but are not waited for. Sources named
+    in `inline` run on the calling thread meanwhile, without a deadline.
+    """
+    deadlines = {**SOURCE_DEADLINES, **(deadlines or {})}
+    started = time.monotonic()
+    futures = {name: _executor.submit(_timed, fn) for name, fn in sources.items() if name not in inline}
+
+    outcomes = {name: _timed(fn) for name, fn in sources.items() if name in inline}
+    # Waiting in deadline order means no source waits past its own deadline
+    for name in sorted(futures, key=lambda name: deadlines.get(name, 10.0)):
+        remaining = deadlines.get(name, 10.0) - (time.monotonic() - started)
+        try:
+            outcomes[name] = futures[name].result(timeout=max(0.0, remaining))
+        except FutureTimeoutError:
+            outcomes[name] = {"status": "timeout", "result": None, "error": None,
+                              "seconds": time.monotonic() - started}
+    return outcomes
+
+
+def _timed(fn):
+    """Run one source and describe the outcome."""
+    started = time.monotonic()
+    try:
+        result = fn()
+    except Exception as e:
+        return {"status": "error", "result": None, "error": str(e), "seconds": time.monotonic() - started}
+    return {"status": "ok", "result": result, "error": None, "seconds": time.monotonic() - started}
+
+
+def normalize_url(url):
+    """Scheme-, www- and trailing-slash-insensitive form of a URL for deduplication."""
+    parts = urlsplit((url or "").strip().lower())
+    host = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    return f"{host}{parts.path.rstrip('/')}"
+
+
+def _normalize_title(title):
+    # Drop site suffixes like " - Economic Times" / " | Vadilal"
+    title = re.split(r"\s+[|\-–—]\s+", title or "")[0]
+    return re.sub(r"[^a-z0-9 ]+", "", title.lower()).strip()
+
+
+def merge_results(result_lists, limit=8):
+    """
+    Merge ranked result lists from several providers. Results with the same
+    URL or a near-identical title are merged (keeping the longest snippet and
+    every source); the merged set is ordered by reciprocal-rank fusion.
+    """
+    merged = []
+    for results in result_lists:
+        for rank, result in enumerate(results or []):
+            score = 1.0 / (RRF_K + rank + 1)
+            url = normalize_url(result.get("url"))
+            title = _normalize_title(result.get("title"))
+
+            match = None
+            for entry in merged:
+                if url and url == entry["_url"]:
+                    match = entry
+                    break
+                if title and SequenceMatcher(None, title, entry["_title"]).ratio() >= TITLE_SIMILARITY:
+                    match = entry
+                    break
+
+            if match is None:
+                merged.append({**result, "sources": [result.get("source")], "score": score,
+                               "_url": url, "_title": title})
+                continue
+            match["score"] += score
+            if result.get("source") not in match["sources"]:
+                match["sources"].append(result.get("source"))
+            if len(result.get("snippet") or "") > len(match.get("snippet") or ""):
+                match["snippet"] = result["snippet"]
+            if not match.get("url"):
+                match["url"] = result.get("url")
+
+    merged.sort(key=lambda entry: entry["score"], reverse=True)
+    return [{k: v for k, v in entry.items() if not k.startswith("_")} for entry in merged[:limit]]
+
+
+def format_results(results):
+    """Render merged results as the text block used in the system prompt."""
+    if not results:
+        return ""
+    formatted = "Here are the latest search results about Vadilal:\n\n"
+    for i, result in enumerate(results):
+        formatted += f"RESULT {i+1}:\nTitle: {result['title']}\nInfo: {result['snippet']}\n"
+        if result.get("url"):
+            formatted += f"URL: {result['url']}\n"
+        formatted += "\n"
+    return formatted
+